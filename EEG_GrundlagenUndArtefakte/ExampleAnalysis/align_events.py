@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+In this file, I align the trials of the Oddball (the csv file written by
+OddballExperiment/main.py) to the triggers in the EEG (the events mne finds
+in the Status channel, 41 is the deviant and 42 the standard), e.g.
+
+    python align_events.py VP1.csv LK_1_post1.bdf VP2.csv LK_2_post1.bdf
+
+Every pair of files is aligned in a process of its own. The two clocks have
+different origins and run at slightly different rates, so the EEG time of a
+trial is modelled as t_eeg = offset + (1 + drift)*t_behaviour:
+
+1. A first guess of the offset comes from the cross-correlation of the event
+   trains of the two streams (one train per code, binned, correlated via
+   FFT), once for the first and once for the last minutes of the session;
+   the two offsets give a first guess of the drift.
+2. Every trial is matched to the nearest trigger and vice versa
+   (searchsorted); only mutual nearest neighbours closer than tolerance are
+   pairs.
+3. offset and drift are fitted to the pairs (least squares, outliers
+   removed) and 2. is repeated with the fit.
+
+The trials are aligned by their times, not as sequences of trigger codes
+(e.g. Needleman-Wunsch on the codes): there are only two codes and most
+trials are standards, so long stretches of the code sequence are the same
+and a gap (a missing trigger) could be put in many places of them equally
+well, while the times of the trials pin every trigger down to one trial.
+The codes are still used: the cross-correlation in 1. is done per code,
+and matched pairs with different codes are counted (n_wrong_code). Matching
+by time is also O(n log n) instead of O(n*m).
+
+The per-trial latency is the deviation of the trigger from the fit, i.e. a
+constant latency ends up in the offset. Trials without a trigger are
+missing, triggers without a trial are extra. The table of every session is
+written next to the csv file (<name>_alignment.csv).
+
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# %% Reading the two streams
+
+def read_behaviour(csv_filepath, code_deviant = 41, code_standard = 42,
+                   time_column = 'tPresentation'):
+    """The times (in s) and trigger codes of the trials in the csv file of
+    the Oddball; rows without a time (e.g. the count) are skipped. If the
+    csv has a column stimclass (more than two classes), pass a dict
+    class name -> code as code_deviant."""
+    times, codes = [], []
+    with open(csv_filepath, newline = '', encoding = 'utf-8') as f:
+        for row in csv.DictReader(f):
+            if not row.get(time_column):
+                continue
+            times.append(float(row[time_column]))
+            if isinstance(code_deviant, dict):
+                codes.append(code_deviant[row['stimclass']])
+            else:
+                codes.append(code_standard if int(float(row['standard'])) else code_deviant)
+    return np.array(times), np.array(codes, dtype = np.int64)
+
+
+def read_triggers(eeg_filepath, codes = (41, 42)):
+    """The times (in s from the first sample) and codes of the triggers in a
+    bdf or fif file (only the Status channel is read)."""
+    import mne # only here, the alignment itself needs numpy only
+    if eeg_filepath.endswith('.bdf'):
+        raw = mne.io.read_raw_bdf(eeg_filepath, preload = False, verbose = 'error')
+    else:
+        raw = mne.io.read_raw_fif(eeg_filepath, preload = False, verbose = 'error')
+    events = mne.find_events(raw, stim_channel = 'Status', verbose = 'error')
+    events = events[np.isin(events[:, 2], codes)]
+    return (events[:, 0] - raw.first_samp)/raw.info['sfreq'], events[:, 2]
+
+
+# %% Aligning them
+
+def _event_trains(times, codes, all_codes, t_start, n_bins, bin_size):
+    """One binned train per code, as the rfft of length 2*n_bins."""
+    trains = np.zeros((len(all_codes), n_bins))
+    bins = ((times - t_start)/bin_size).astype(np.int64)
+    inside = (bins >= 0) & (bins < n_bins)
+    code_index = np.searchsorted(all_codes, codes)
+    np.add.at(trains, (code_index[inside], bins[inside]), 1.)
+    return np.fft.rfft(trains, n = 2*n_bins, axis = 1)
+
+
+def coarse_offset(t_beh, codes_beh, t_eeg, codes_eeg, bin_size = .02):
+    """The offset t_eeg - t_beh at which the event trains of both streams
+    (summed over the codes) correlate most."""
+    all_codes = np.union1d(codes_beh, codes_eeg)
+    t_start = min(t_beh.min(), t_eeg.min())
+    n_bins = int(np.ceil((max(t_beh.max(), t_eeg.max()) - t_start)/bin_size)) + 1
+    n_bins = 1 << int(np.ceil(np.log2(n_bins))) # fast FFT sizes
+    spectrum_beh = _event_trains(t_beh, codes_beh, all_codes, t_start, n_bins, bin_size)
+    spectrum_eeg = _event_trains(t_eeg, codes_eeg, all_codes, t_start, n_bins, bin_size)
+    # correlation[lag] = sum over t of beh[t]*eeg[t + lag] (negative lags wrap around)
+    correlation = np.fft.irfft((np.conj(spectrum_beh)*spectrum_eeg).sum(axis = 0), n = 2*n_bins)
+    lag = int(np.argmax(correlation))
+    if lag >= n_bins:
+        lag -= 2*n_bins
+    return lag*bin_size
+
+
+def match_nearest(t_pred, t_eeg, tolerance):
+    """Indices (i_beh, i_eeg) of the pairs of mutual nearest neighbours of
+    t_pred and t_eeg (both sorted) which are closer than tolerance."""
+    if len(t_pred) == 0 or len(t_eeg) == 0:
+        return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64)
+
+    def nearest(a, b):
+        if len(b) == 1:
+            return np.zeros(len(a), dtype = np.int64)
+        j = np.clip(np.searchsorted(b, a), 1, len(b) - 1)
+        return np.where(np.abs(a - b[j - 1]) <= np.abs(a - b[j]), j - 1, j)
+    beh_to_eeg = nearest(t_pred, t_eeg)
+    eeg_to_beh = nearest(t_eeg, t_pred)
+    i_beh = np.flatnonzero(eeg_to_beh[beh_to_eeg] == np.arange(len(t_pred)))
+    i_eeg = beh_to_eeg[i_beh]
+    close = np.abs(t_eeg[i_eeg] - t_pred[i_beh]) < tolerance
+    return i_beh[close], i_eeg[close]
+
+
+def fit_clock(t_beh, t_eeg, n_iterations = 3):
+    """offset and drift of t_eeg = offset + (1 + drift)*t_beh, fitted
+    without the pairs which deviate more than 5 median absolute deviations
+    (but at least 1 ms) from the fit."""
+    use = np.ones(len(t_beh), dtype = bool)
+    for _ in range(n_iterations):
+        slope, offset = np.polyfit(t_beh[use], t_eeg[use], 1)
+        residuals = t_eeg - (offset + slope*t_beh)
+        mad = np.median(np.abs(residuals[use] - np.median(residuals[use])))
+        use = np.abs(residuals) <= max(5*1.4826*mad, .001)
+    return offset, slope - 1
+
+
+def align(t_beh, codes_beh, t_eeg, codes_eeg, tolerance = .5, chunk_duration = 300.):
+    """Align the trials (t_beh, codes_beh) to the triggers (t_eeg, codes_eeg).
+    tolerance (s) must be less than half the shortest interval between two
+    trials. Returns a summary dict and the table of the trials (a
+    structured array)."""
+    order_beh, order_eeg = np.argsort(t_beh, kind = 'stable'), np.argsort(t_eeg, kind = 'stable')
+    t_beh, codes_beh = t_beh[order_beh], codes_beh[order_beh]
+    t_eeg, codes_eeg = t_eeg[order_eeg], codes_eeg[order_eeg]
+
+    # 1. first guess from the beginning and the end of the session
+    first = t_beh < t_beh[0] + chunk_duration
+    last = t_beh > t_beh[-1] - chunk_duration
+    offset_first = coarse_offset(t_beh[first], codes_beh[first], t_eeg, codes_eeg)
+    offset_last = coarse_offset(t_beh[last], codes_beh[last], t_eeg, codes_eeg)
+    centre_first, centre_last = t_beh[first].mean(), t_beh[last].mean()
+    if centre_last - centre_first > chunk_duration:
+        drift = (offset_last - offset_first)/(centre_last - centre_first)
+    else:
+        drift = 0.
+    offset = offset_first - drift*centre_first
+
+    # 2. and 3. match, fit and match again
+    for _ in range(2):
+        i_beh, i_eeg = match_nearest(offset + (1 + drift)*t_beh, t_eeg, tolerance)
+        assert len(i_beh) >= 2, 'Too few trials could be matched to triggers.'
+        offset, drift = fit_clock(t_beh[i_beh], t_eeg[i_eeg])
+    i_beh, i_eeg = match_nearest(offset + (1 + drift)*t_beh, t_eeg, tolerance)
+
+    table = np.zeros(len(t_beh), dtype = [
+        ('trial', np.int64), ('t_behaviour', np.float64), ('code', np.int64),
+        ('t_eeg', np.float64), ('code_eeg', np.int64), ('latency_ms', np.float64)])
+    table['trial'] = order_beh
+    table['t_behaviour'] = t_beh
+    table['code'] = codes_beh
+    table['t_eeg'] = np.nan
+    table['latency_ms'] = np.nan
+    table['code_eeg'] = -1
+    table['t_eeg'][i_beh] = t_eeg[i_eeg]
+    table['code_eeg'][i_beh] = codes_eeg[i_eeg]
+    table['latency_ms'][i_beh] = (t_eeg[i_eeg] - (offset + (1 + drift)*t_beh[i_beh]))*1000
+    # i_beh indexes the trials in the order of time, so before the sort
+    latencies = table['latency_ms'][i_beh] if len(i_beh) else np.zeros(1)
+    table.sort(order = 'trial')
+
+    wrong_code = int(np.count_nonzero(codes_eeg[i_eeg] != codes_beh[i_beh]))
+    summary = dict(n_trials = len(t_beh), n_triggers = len(t_eeg),
+                   n_matched = len(i_beh), n_missing = len(t_beh) - len(i_beh),
+                   n_extra = len(t_eeg) - len(i_eeg), n_wrong_code = wrong_code,
+                   offset_s = float(offset), drift_ppm = float(drift*1e6),
+                   drift_ms_per_hour = float(drift*3600*1000),
+                   latency_sd_ms = float(np.std(latencies)),
+                   latency_max_abs_ms = float(np.max(np.abs(latencies))))
+    return summary, table
+
+
+def align_files(csv_filepath, eeg_filepath, tolerance = .5):
+    """Align one session and write its table as <csv name>_alignment.csv."""
+    t_beh, codes_beh = read_behaviour(csv_filepath)
+    t_eeg, codes_eeg = read_triggers(eeg_filepath, codes = np.unique(codes_beh))
+    summary, table = align(t_beh, codes_beh, t_eeg, codes_eeg, tolerance = tolerance)
+
+    table_filepath = os.path.splitext(csv_filepath)[0] + '_alignment.csv'
+    np.savetxt(table_filepath, table, delimiter = ',', header = ','.join(table.dtype.names),
+               comments = '', fmt = ['%d', '%.6f', '%d', '%.6f', '%d', '%.3f'])
+    summary['session'] = os.path.basename(csv_filepath)
+    return summary
+
+
+# %% Many sessions in parallel
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs = '+', help = 'pairs of csv and bdf (or fif) files')
+    parser.add_argument('--tolerance', type = float, default = .5,
+                        help = 'max distance in s between a trial and its trigger')
+    parser.add_argument('--workers', type = int, default = None, help = 'default: n of CPUs')
+    args = parser.parse_args()
+    assert len(args.files) % 2 == 0, 'Pass pairs of csv and bdf files.'
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers = args.workers) as executor:
+        summaries = list(executor.map(align_files, args.files[0::2], args.files[1::2],
+                                      [args.tolerance]*(len(args.files)//2)))
+
+    for s in summaries:
+        print('{session}: {n_matched}/{n_trials} trials matched, {n_missing} missing, '
+              '{n_extra} extra, {n_wrong_code} with the wrong code; drift {drift_ppm:.1f} ppm '
+              '({drift_ms_per_hour:.1f} ms/h), latency sd {latency_sd_ms:.2f} ms, '
+              'max {latency_max_abs_ms:.2f} ms'.format(**s))
+    print('{} sessions in {:.1f} s'.format(len(summaries), time.perf_counter() - t0))
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+In this file, I run pipeline.py for every recording (every bdf file) in the
+Data folder on a pool of processes, e.g. for all participants of a course:
+
+    python batch_pipeline.py
+    python batch_pipeline.py --pattern "LK_*_post1.bdf" --workers 4 --max-gb-per-worker 6
+
+Every recording is analysed in a new process of its own (at most --workers
+at a time), and only the evokeds and the drop statistics come back from it,
+so the peak memory in the summary is the one of that recording. The
+resident memory (RSS) of every process is checked every half second; a
+process which needs more than --max-gb-per-worker is killed and its
+recording fails, instead of making the computer swap (on Linux, elsewhere
+only with psutil). The default n of processes is chosen so that all of them
+fit into the memory of the computer.
+
+A recording which fails (an exception, or its process was killed or died)
+does not stop the batch: its error is written to the summary. The results
+go to the output folder (default: Data/batch):
+
+- <name>-ave.fif: the evokeds (standard, deviant, diff) of every recording
+- grand_average-ave.fif: the grand averages over all recordings
+- batch_summary.csv: one row per recording with the status, the drop
+  statistics, the wall time and the peak memory
+
+The ICA components to exclude have to be chosen per recording; without a
+params file (--params) none are excluded. The params file is a json dict
+recording name -> parameters (like pipeline.DEFAULT_PARAMS, only the ones
+which differ), '*' applies to all recordings:
+
+    {"*": {"epochs": {"reject": {"eeg": 150e-6}}},
+     "LK_1_post1": {"ica": {"exclude": [1, 9]}}}
+
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import mne
+
+import pipeline
+from stage_cache import StageCache
+
+try:
+    import resource # not on Windows
+except ImportError:
+    resource = None
+
+try:
+    import psutil # optional, to check the memory of the processes where there is no /proc
+except ImportError:
+    psutil = None
+
+
+def physical_memory():
+    """The memory of the computer in bytes (None if unknown)."""
+    try:
+        return os.sysconf('SC_PHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_workers(max_bytes_per_worker):
+    """As many processes as there are CPUs and as fit into the memory."""
+    workers = os.cpu_count() or 1
+    memory = physical_memory()
+    if memory is not None and max_bytes_per_worker:
+        workers = min(workers, max(1, int(memory//max_bytes_per_worker)))
+    return workers
+
+
+def _init_worker():
+    """Initializer of the process of a recording."""
+    mne.set_log_level('error')
+
+
+def _rss(pid):
+    """The resident memory of the process pid in bytes (None if unknown)."""
+    try:
+        if os.path.exists('/proc/{}/status'.format(pid)):
+            with open('/proc/{}/status'.format(pid)) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1])*1024
+        elif psutil is not None:
+            return psutil.Process(pid).memory_info().rss
+    except Exception: # the process has ended
+        pass
+    return None
+
+
+def _kill(pid):
+    try:
+        if psutil is not None:
+            psutil.Process(pid).kill()
+        else:
+            os.kill(pid, signal.SIGKILL)
+    except Exception: # the process has ended
+        pass
+
+
+def _peak_rss():
+    """The peak resident memory of this process in bytes."""
+    if resource is None:
+        return float('nan')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss*1024 # kB on linux
+
+
+def params_for(name, params_file_content):
+    """The parameters of the recording name from the content of the params
+    file ('*' first, then the ones of name); without any, no ICA
+    components are excluded."""
+    params = {'ica': {'exclude': []}}
+    for key in ['*', name]:
+        for stage, stage_params in params_file_content.get(key, {}).items():
+            params.setdefault(stage, {}).update(stage_params)
+    return params
+
+
+def process_recording(bdf_filepath, out_folder, params, cache_folder = None,
+                      cache_bytes = 20e9):
+    """Run the pipeline for one recording and save its evokeds. Never
+    raises: a failure is returned as status 'failed' with the error."""
+    name = os.path.splitext(os.path.basename(bdf_filepath))[0]
+    t0 = time.perf_counter()
+    row = dict(name = name)
+    try:
+        cache = StageCache(cache_folder, max_bytes = cache_bytes) if cache_folder else None
+        result = pipeline.run_pipeline(bdf_filepath, params = params, cache = cache,
+                                       verbose = False)
+        evokeds_filepath = os.path.join(out_folder, name + '-ave.fif')
+        mne.write_evokeds(evokeds_filepath, list(result['evokeds'].values()))
+        row.update(status = 'ok', error = '', **result['drop_stats'])
+        row['cached'] = '+'.join(result['cached'])
+        row.update({'t_' + stage: round(t, 3) for stage, t in result['stage_times'].items()})
+        evokeds = result['evokeds']
+        del result # the epochs are not needed any more
+    except Exception as e:
+        row.update(status = 'failed', error = '{}: {}'.format(type(e).__name__, e),
+                   traceback = traceback.format_exc())
+        evokeds = None
+    row['wall_time'] = round(time.perf_counter() - t0, 3)
+    row['peak_rss_mb'] = round(_peak_rss()/1e6, 1)
+    return row, evokeds
+
+
+def run_recording(bdf_filepath, out_folder, params, cache_folder = None, cache_bytes = 20e9,
+                  max_bytes = 4e9, interval = .5):
+    """process_recording in a new process, which is killed when its
+    resident memory exceeds max_bytes (checked every interval s)."""
+    t0 = time.perf_counter()
+    peak, killed = 0, False
+    with ProcessPoolExecutor(max_workers = 1, initializer = _init_worker) as executor:
+        pid = executor.submit(os.getpid).result() # the process which runs the recording
+        future = executor.submit(process_recording, bdf_filepath, out_folder, params,
+                                 cache_folder, cache_bytes)
+        while True:
+            try:
+                return future.result(timeout = interval)
+            except TimeoutError:
+                rss = _rss(pid)
+                if rss is not None:
+                    peak = max(peak, rss)
+                    if max_bytes and rss > max_bytes and not killed:
+                        _kill(pid)
+                        killed = True
+            except BrokenProcessPool: # the process was killed, by us or e.g. by the OS
+                if killed:
+                    error = 'More than {:.1f} GB of memory were needed.'.format(max_bytes/1e9)
+                else:
+                    error = 'The process died (out of memory?).'
+                row = dict(name = _name(bdf_filepath), status = 'failed', error = error,
+                           wall_time = round(time.perf_counter() - t0, 3),
+                           peak_rss_mb = round(peak/1e6, 1))
+                return row, None
+
+
+def run_batch(bdf_filepaths, out_folder, params_file_content = None, workers = None,
+              max_bytes_per_worker = 4e9, cache_folder = None, cache_bytes = 20e9):
+    """run_recording for every file, workers at a time. Returns the rows of
+    the summary and the evokeds (dict name -> dict condition -> Evoked) of
+    the recordings which did not fail."""
+    os.makedirs(out_folder, exist_ok = True)
+    params_file_content = params_file_content or {}
+    if workers is None:
+        workers = default_workers(max_bytes_per_worker)
+    if max_bytes_per_worker and psutil is None and not os.path.exists('/proc/self/status'):
+        print('The memory of the processes is not limited (install psutil).')
+    rows, evokeds = {}, {}
+
+    # the threads only start the processes and wait for them
+    with ThreadPoolExecutor(max_workers = min(workers, len(bdf_filepaths))) as executor:
+        futures = {executor.submit(run_recording, fp, out_folder,
+                                   params_for(_name(fp), params_file_content),
+                                   cache_folder, cache_bytes, max_bytes_per_worker): fp
+                   for fp in bdf_filepaths}
+        for future in as_completed(futures):
+            fp = futures[future]
+            row, recording_evokeds = future.result()
+            rows[fp] = row
+            if recording_evokeds is not None:
+                evokeds[row['name']] = recording_evokeds
+            print('{name}: {status} {error}({wall_time:.1f} s)'.format(
+                **dict(row, error = row['error'] + ' ' if row['error'] else '')))
+    return [rows[fp] for fp in bdf_filepaths], evokeds
+
+
+def save_summary(rows, evokeds, out_folder):
+    """batch_summary.csv, the tracebacks of the failed recordings
+    (batch_errors.log) and the grand averages of evokeds."""
+    columns = {}
+    for row in rows:
+        columns.update(dict.fromkeys(column for column in row if column != 'traceback'))
+    with open(os.path.join(out_folder, 'batch_summary.csv'), 'w', newline = '') as f:
+        writer = csv.DictWriter(f, list(columns), extrasaction = 'ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(out_folder, 'batch_errors.log'), 'w') as f:
+        for row in rows:
+            if row['status'] != 'ok':
+                f.write('{}\n{}\n'.format(row['name'], row.get('traceback', row['error'])))
+    if evokeds:
+        conditions = list(next(iter(evokeds.values())))
+        grand_averages = [mne.grand_average([recording[condition] for recording in evokeds.values()])
+                          for condition in conditions]
+        for grand_average, condition in zip(grand_averages, conditions):
+            grand_average.comment = condition
+        mne.write_evokeds(os.path.join(out_folder, 'grand_average-ave.fif'), grand_averages)
+
+
+def _name(bdf_filepath):
+    return os.path.splitext(os.path.basename(bdf_filepath))[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-folder', default = pipeline.default_data_folder())
+    parser.add_argument('--pattern', default = '*.bdf', help = 'glob of the bdf files in the data folder')
+    parser.add_argument('--out-folder', default = None, help = 'default: <data folder>/batch')
+    parser.add_argument('--params', default = None, help = 'json file with the parameters per recording')
+    parser.add_argument('--workers', type = int, default = None,
+                        help = 'default: n of CPUs, but only as many as fit into the memory')
+    parser.add_argument('--max-gb-per-worker', type = float, default = 4.)
+    parser.add_argument('--cache', default = None, help = 'folder of the stage cache')
+    parser.add_argument('--cache-gb', type = float, default = 20.)
+    args = parser.parse_args()
+
+    bdf_filepaths = sorted(glob.glob(os.path.join(args.data_folder, args.pattern)))
+    assert bdf_filepaths, 'No files match {} in {}.'.format(args.pattern, args.data_folder)
+    out_folder = args.out_folder or os.path.join(args.data_folder, 'batch')
+    params_file_content = {}
+    if args.params:
+        with open(args.params) as f:
+            params_file_content = json.load(f)
+
+    t0 = time.perf_counter()
+    rows, evokeds = run_batch(bdf_filepaths, out_folder, params_file_content,
+                              workers = args.workers,
+                              max_bytes_per_worker = args.max_gb_per_worker*1e9,
+                              cache_folder = args.cache, cache_bytes = args.cache_gb*1e9)
+    save_summary(rows, evokeds, out_folder)
+    n_failed = sum(row['status'] != 'ok' for row in rows)
+    print('{} recordings ({} failed) in {:.1f} s; the summary is in {}'.format(
+        len(rows), n_failed, time.perf_counter() - t0, out_folder))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+In this file, I do the re-referencing and filtering of 1_Analysis_raw.py
+on data which do not have to fit into the memory, e.g. recordings of
+several hours at a high sampling rate on a laptop.
+
+1_Analysis_raw.py loads _cropped_raw.fif into memory and keeps three full
+copies of it (raw, raw_ref and raw_filt). In the memmap mode, the data are
+loaded into a temporary file instead (mne reads into a np.memmap if preload
+is a file name) and changed in place: the mean of the mastoids is
+subtracted a few channels at a time (pipeline.subtract_reference;
+set_eeg_reference would copy all EEG channels) and filter works one
+channel at a time. The mastoids are not dropped (which would copy the
+data), but made misc channels. The pages of the memmap count to
+the resident memory while they are used, but the operating system can
+write them back to the file and free them whenever it needs the memory; the
+memory which cannot be freed like that is the anonymous memory.
+
+Both modes write _filt_raw.fif and report the peak resident memory (RSS)
+and, on Linux, the peak anonymous memory. Each mode runs in a process of
+its own, so the peaks do not influence each other:
+
+    python memmap_filter.py LK_1_post1                # both modes
+    python memmap_filter.py LK_1_post1 --mode memmap
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mne
+
+import pipeline
+import streaming_crop
+
+
+# %% Measuring the memory
+
+class MemoryMonitor:
+    """The peak RSS of the process (from getrusage) and, on Linux, the peak
+    anonymous memory, sampled every interval s on a thread, while in a with
+    block."""
+
+    def __init__(self, interval = .05):
+        self.interval = interval
+        self.peak_anon = float('nan')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if os.path.exists('/proc/self/status'):
+            self.peak_anon = 0
+            self._thread = threading.Thread(target = self._sample, daemon = True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.peak_rss = streaming_crop.peak_rss()
+
+    def _sample(self):
+        while True:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('RssAnon:'):
+                        self.peak_anon = max(self.peak_anon, int(line.split()[1])*1024)
+            if self._stop.wait(self.interval):
+                return
+
+
+# %% Loading into a memmap
+
+def read_fif_memmapped(fif_filepath, memmap_folder = None):
+    """The raw data of the fif file in a temporary memmap in memmap_folder
+    (default: the folder of the file)."""
+    return pipeline.read_memmapped(lambda preload: mne.io.read_raw_fif(
+        fif_filepath, preload = preload, verbose = 'error'),
+        memmap_folder or os.path.dirname(os.path.abspath(fif_filepath)))
+
+
+def read_cropped_memmapped(bdf_filepath, memmap_folder, buffer_size_sec = 10., **crop_params):
+    """The bdf file cropped like in 0_Crop_bdf.py and loaded into a memmap:
+    the cropped part is streamed into a temporary fif file (see
+    streaming_crop.py), which is read into the memmap."""
+    fd, cropped_filepath = tempfile.mkstemp(suffix = '_raw.fif', dir = memmap_folder)
+    os.close(fd)
+    try:
+        streaming_crop.crop_bdf(bdf_filepath, cropped_filepath,
+                                buffer_size_sec = buffer_size_sec, **crop_params)
+        return read_fif_memmapped(cropped_filepath, memmap_folder)
+    finally:
+        os.remove(cropped_filepath)
+
+
+# %% The two modes
+
+def filter_preload(fif_filepath, out_filepath, ref_channels, montage, l_freq, h_freq):
+    """Like 1_Analysis_raw.py: everything in memory, with the copies."""
+    raw = mne.io.read_raw_fif(fif_filepath, preload = True, verbose = 'error')
+    raw_ref = raw.copy().set_eeg_reference(ref_channels, verbose = 'error')
+    raw_ref.drop_channels(ref_channels)
+    raw_ref.set_montage(mne.channels.make_standard_montage(montage))
+    raw_filt = raw_ref.copy()
+    raw_filt.load_data().filter(l_freq = l_freq, h_freq = h_freq, verbose = 'error')
+    raw_filt.save(out_filepath, overwrite = True, verbose = 'error')
+
+
+def filter_memmap(fif_filepath, out_filepath, ref_channels, montage, l_freq, h_freq,
+                  memmap_folder = None):
+    """In place on a memmap."""
+    raw = read_fif_memmapped(fif_filepath, memmap_folder)
+    pipeline.filter_raw(raw, ref_channels, montage, l_freq, h_freq, drop_ref_channels = False)
+    raw.save(out_filepath, overwrite = True, verbose = 'error')
+
+
+def run_mode(mode, fif_filepath, out_filepath, memmap_folder = None):
+    """Filter in mode ('preload' or 'memmap') with the parameters of
+    pipeline.DEFAULT_PARAMS. Returns the wall time and the peaks of the
+    memory."""
+    params = pipeline.DEFAULT_PARAMS['filter']
+    t0 = time.perf_counter()
+    with MemoryMonitor() as monitor:
+        if mode == 'preload':
+            filter_preload(fif_filepath, out_filepath, **params)
+        else:
+            filter_memmap(fif_filepath, out_filepath, memmap_folder = memmap_folder, **params)
+    return dict(mode = mode, wall_time = time.perf_counter() - t0,
+                peak_rss = monitor.peak_rss, peak_anon = monitor.peak_anon)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_filename', nargs = '?', default = 'LK_1_post1',
+                        help = 'the recording in the Data folder (reads <name>_cropped_raw.fif)')
+    parser.add_argument('--data-folder', default = pipeline.default_data_folder())
+    parser.add_argument('--mode', choices = ['both', 'preload', 'memmap'], default = 'both')
+    parser.add_argument('--memmap-folder', default = None,
+                        help = 'folder of the temporary file (default: the Data folder)')
+    args = parser.parse_args()
+
+    fif_filepath = os.path.join(args.data_folder, args.data_filename + '_cropped_raw.fif')
+    out_filepath = os.path.join(args.data_folder, args.data_filename + '_filt_raw.fif')
+    file_size = os.path.getsize(fif_filepath)
+    modes = ['preload', 'memmap'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        # a new process for every mode, so the peaks are its own
+        with ProcessPoolExecutor(max_workers = 1) as executor:
+            result = executor.submit(run_mode, mode, fif_filepath, out_filepath,
+                                     args.memmap_folder).result()
+        print('{mode:>8}: {wall_time:6.1f} s, peak RSS {rss:7.0f} MB, peak anonymous '
+              'memory {anon:7.0f} MB ({size:.0f} MB cropped fif)'.format(
+                  rss = result['peak_rss']/1e6, anon = result['peak_anon']/1e6,
+                  size = file_size/1e6, **result))
+    if not sys.platform.startswith('linux'):
+        print('(The peak anonymous memory is only measured on Linux.)')
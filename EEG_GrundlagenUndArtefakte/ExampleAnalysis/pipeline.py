@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+In this file, I run the steps of the example analysis (0_Crop_bdf.py to
+3_Analysis_evoked.py) one after the other in one process:
+
+    crop -> re-reference, montage and filter -> epochs and ICA -> evoked
+
+Each step gets the result of the step before as an object in memory, so the
+fif files the scripts pass on to each other (_cropped_raw.fif,
+_filt_raw.fif, _epo.fif) are not written and read back. They are still
+written with --write-intermediates, e.g. to look at them with the scripts:
+
+    python pipeline.py LK_1_post1
+    python pipeline.py LK_1_post1 --write-intermediates
+
+With --cache, the result of every step is also stored in a stage cache
+(see stage_cache.py), and a second run only recomputes the steps whose
+parameters (or input) have changed:
+
+    python pipeline.py LK_1_post1 --cache ../../Data/stage_cache
+
+The parameters of the steps are the ones of the scripts (DEFAULT_PARAMS).
+The plots of the scripts are left out, and the copies the scripts make to
+compare the data before and after a step as well: every step changes the
+data it gets in place. The wall time of every step is printed.
+
+"""
+
+import argparse
+import atexit
+import copy
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import mne
+import numpy as np
+
+from stage_cache import StageCache
+
+# the parameters of the scripts
+DEFAULT_PARAMS = dict(
+    crop = dict(codes = [41, 42], margin = 4., # s before the first and after the last event
+                rename = {'EXG5': 'M1', 'EXG6': 'M2'},
+                exclude = ['EXG1', 'EXG2', 'EXG3', 'EXG4', 'EXG7', 'EXG8',
+                           'GSR1', 'GSR2', 'Erg1', 'Erg2', 'Resp', 'Plet', 'Temp']),
+    filter = dict(ref_channels = ['M1', 'M2'], montage = 'biosemi64',
+                  l_freq = 0.1, h_freq = None),
+    epochs = dict(event_id = {'deviant': 41, 'standard': 42}, tmin = -0.2, tmax = 0.8,
+                  reject = dict(eeg = 200e-6), baseline = (-0.2, 0), n_picks = 63),
+    ica = dict(max_pca_components = 20, random_state = 99, max_iter = 800,
+               exclude = [1, 9]), # the components excluded after looking at them for LK_1_post1
+    evoked = dict(h_freq = 40),
+    )
+
+STAGES = ['crop', 'filter', 'epochs', 'evoked']
+
+
+def default_data_folder():
+    """The Data folder of the project (like in the scripts)."""
+    return os.path.join(Path(__file__).parent.parent.parent, 'Data')
+
+
+def merge_params(params = None):
+    """DEFAULT_PARAMS updated with the (partial) dict of dicts params."""
+    merged = copy.deepcopy(DEFAULT_PARAMS)
+    for stage, stage_params in (params or {}).items():
+        merged[stage].update(stage_params)
+    return merged
+
+
+# %% The steps
+
+def read_bdf(bdf_filepath, memmap_folder = None):
+    return read_memmapped(lambda preload: mne.io.read_raw_bdf(
+        bdf_filepath, preload = preload, verbose = 'error'), memmap_folder)
+
+
+def read_memmapped(read, memmap_folder = None):
+    """read(preload) with preload = True or, with memmap_folder, with the
+    data in a temporary file in that folder (a np.memmap), so they do not
+    have to fit into the memory. The temporary file is removed right away
+    where the open file can be removed (not on Windows: at exit)."""
+    if memmap_folder is None:
+        return read(True)
+    fd, memmap_filepath = tempfile.mkstemp(suffix = '.dat', dir = memmap_folder)
+    os.close(fd)
+    try:
+        return read(memmap_filepath)
+    finally:
+        try:
+            os.remove(memmap_filepath)
+        except OSError:
+            atexit.register(lambda: os.path.exists(memmap_filepath) and os.remove(memmap_filepath))
+
+
+def crop(raw, codes, margin, rename, exclude):
+    """0_Crop_bdf.py: crop raw (in place) to the events with the codes plus
+    margin s and keep only the EEG channels, the mastoids and the Status
+    channel."""
+    events = mne.find_events(raw, stim_channel = 'Status', verbose = 'error')
+    events_relevant = events[np.isin(events[:, 2], codes)]
+    t_event_first = (events_relevant[:, 0].min() - raw.first_samp)/raw.info['sfreq']
+    t_event_last = (events_relevant[:, 0].max() - raw.first_samp)/raw.info['sfreq']
+    raw.crop(tmin = max(t_event_first - margin, 0),
+             tmax = min(t_event_last + margin, raw.times[-1]))
+    raw.rename_channels(mapping = rename)
+    raw.pick(picks = 'all', exclude = [ch for ch in exclude if ch in raw.ch_names])
+    return raw
+
+
+def filter_raw(raw, ref_channels, montage, l_freq, h_freq, drop_ref_channels = True):
+    """1_Analysis_raw.py: re-reference raw (in place) to ref_channels, drop
+    them, set the montage and filter. Dropping channels copies the data;
+    without drop_ref_channels (for data in a memmap) the ref_channels are
+    kept as misc channels instead, which the montage and the epochs
+    ignore, and the reference is subtracted with subtract_reference, as
+    set_eeg_reference copies all EEG channels."""
+    raw.load_data()
+    if drop_ref_channels:
+        raw.set_eeg_reference(ref_channels, verbose = 'error')
+        raw.drop_channels(ref_channels)
+    else:
+        # the EEG channels set_eeg_reference would re-reference
+        picks = mne.pick_types(raw.info, eeg = True, meg = False, ref_meg = False)
+        subtract_reference(raw._data, [raw.ch_names.index(ch) for ch in ref_channels], picks)
+        raw.set_eeg_reference([], verbose = 'error') # marks the custom reference
+        raw.set_channel_types({ch: 'misc' for ch in ref_channels})
+    raw.set_montage(mne.channels.make_standard_montage(montage))
+    raw.filter(l_freq = l_freq, h_freq = h_freq, verbose = 'error')
+    return raw
+
+
+def subtract_reference(data, ref_idx, picks, block_size = 8):
+    """Subtract the mean of the rows ref_idx of data (channels x times) from
+    the rows picks in place, at most block_size consecutive rows at a time
+    (slices, i.e. views). Besides the reference (one row) nothing is
+    allocated; data[picks] -= ref (what set_eeg_reference does) copies
+    all rows picks."""
+    ref = np.zeros(data.shape[1])
+    for i in ref_idx:
+        ref += data[i]
+    ref /= len(ref_idx)
+    picks = np.sort(picks)
+    start = 0
+    while start < len(picks):
+        stop = start + 1
+        while stop < len(picks) and stop - start < block_size and picks[stop] == picks[stop - 1] + 1:
+            stop += 1
+        data[picks[start]:picks[stop - 1] + 1] -= ref
+        start = stop
+
+
+def epochs_ica(raw, event_id, tmin, tmax, reject, baseline, n_picks, ica_params):
+    """2_Analysis_epoched.py: epochs with threshold rejection, ICA fitted to
+    them and the components ica_params['exclude'] removed. Returns the
+    epochs, the ica and the drop statistics."""
+    # the first n_picks channels without the mastoids, as if they had been
+    # dropped (without copying the data)
+    picks = [ch for ch in raw.ch_names if ch not in ('M1', 'M2')][0:n_picks]
+    events = mne.find_events(raw, stim_channel = 'Status', verbose = 'error')
+    epochs = mne.Epochs(raw, events, event_id = event_id, tmin = tmin, tmax = tmax,
+                        reject = reject, preload = True, baseline = baseline,
+                        picks = picks, verbose = 'error')
+    drop_stats = dict(n_events = int(np.isin(events[:, 2], list(event_id.values())).sum()),
+                      n_epochs = len(epochs),
+                      drop_percentage = float(epochs.drop_log_stats()))
+    drop_stats.update({'n_' + condition: len(epochs[condition]) for condition in event_id})
+
+    ica_params = dict(ica_params)
+    exclude = ica_params.pop('exclude')
+    ica = mne.preprocessing.ICA(verbose = 'error', **ica_params)
+    ica.fit(epochs)
+    ica.exclude = list(exclude)
+    ica.apply(epochs)
+    return epochs, ica, drop_stats
+
+
+def evoked(epochs, h_freq):
+    """3_Analysis_evoked.py: the low-pass filtered evokeds of the standards
+    and the deviants and their difference."""
+    evoked_standard = epochs['standard'].average().filter(l_freq = None, h_freq = h_freq,
+                                                          verbose = 'error')
+    evoked_deviant = epochs['deviant'].average().filter(l_freq = None, h_freq = h_freq,
+                                                        verbose = 'error')
+    evoked_diff = mne.combine_evoked([evoked_standard, -evoked_deviant], weights = 'equal')
+    return dict(standard = evoked_standard, deviant = evoked_deviant, diff = evoked_diff)
+
+
+# %% Saving and loading the result of every step (for the stage cache)
+
+def _save_stage(stage, result, folder):
+    if stage in ('crop', 'filter'):
+        result.save(os.path.join(folder, stage + '_raw.fif'))
+    elif stage == 'epochs':
+        epochs, ica, drop_stats = result
+        epochs.save(os.path.join(folder, 'epochs-epo.fif'))
+        ica.save(os.path.join(folder, 'ica-ica.fif'))
+        with open(os.path.join(folder, 'drop_stats.json'), 'w') as f:
+            json.dump(drop_stats, f)
+    else:
+        evokeds, drop_stats = result
+        mne.write_evokeds(os.path.join(folder, 'evoked-ave.fif'), list(evokeds.values()))
+        with open(os.path.join(folder, 'drop_stats.json'), 'w') as f:
+            json.dump(dict(drop_stats, conditions = list(evokeds)), f)
+
+
+def _load_stage(stage, folder, memmap_folder = None):
+    if stage in ('crop', 'filter'):
+        return read_memmapped(lambda preload: mne.io.read_raw_fif(
+            os.path.join(folder, stage + '_raw.fif'), preload = preload, verbose = 'error'),
+            memmap_folder)
+    with open(os.path.join(folder, 'drop_stats.json')) as f:
+        drop_stats = json.load(f)
+    if stage == 'epochs':
+        epochs = mne.read_epochs(os.path.join(folder, 'epochs-epo.fif'), preload = True,
+                                 verbose = 'error')
+        ica = mne.preprocessing.read_ica(os.path.join(folder, 'ica-ica.fif'), verbose = 'error')
+        return epochs, ica, drop_stats
+    evokeds = mne.read_evokeds(os.path.join(folder, 'evoked-ave.fif'), verbose = 'error')
+    return dict(zip(drop_stats.pop('conditions'), evokeds)), drop_stats
+
+
+# %% The whole pipeline
+
+def run_pipeline(bdf_filepath, params = None, write_intermediates = False,
+                 out_folder = None, cache = None, streaming_crop = False,
+                 memmap_folder = None, verbose = True):
+    """Run all steps for one recording. params updates DEFAULT_PARAMS (see
+    merge_params). With write_intermediates, the results of the steps are
+    saved in out_folder (default: the folder of the bdf file) with the names
+    the scripts use. cache is a stage_cache.StageCache: the run starts after
+    the last step whose result is cached and stores the results of the
+    steps it computes. With streaming_crop, the bdf file is not loaded as a
+    whole, only the cropped part of the channels which are kept (see
+    streaming_crop.py). With memmap_folder, the raw data are not loaded into
+    memory, but into a temporary file in memmap_folder (see
+    memmap_filter.py); the re-reference and the filter work in place on it.
+    The crop is then always streamed.
+    Returns a dict with the evokeds, the epochs and the
+    ica (None if the evokeds came from the cache), the drop statistics, the
+    wall time of every step (stage_times) and the steps loaded from the
+    cache."""
+    params = merge_params(params)
+    name = os.path.splitext(os.path.basename(bdf_filepath))[0]
+    out_folder = out_folder or os.path.dirname(bdf_filepath)
+    stage_times = {}
+
+    # in the memmap mode the mastoids are kept (as misc channels), so the
+    # filtered data differ and the flag is part of the parameters of the step
+    filter_params = dict(params['filter'], drop_ref_channels = memmap_folder is None)
+
+    # the steps, each on the result of the one before
+    steps = dict(
+        crop = lambda raw: crop(raw, **params['crop']),
+        filter = lambda raw: filter_raw(raw, **filter_params),
+        epochs = lambda raw: epochs_ica(raw, ica_params = params['ica'], **params['epochs']),
+        evoked = lambda result: (evoked(result[0], **params['evoked']), result[2]),
+        )
+    intermediates = dict(
+        crop = lambda raw, fn: raw.save(fn + '_cropped_raw.fif', overwrite = True),
+        filter = lambda raw, fn: raw.save(fn + '_filt_raw.fif', overwrite = True),
+        epochs = lambda result, fn: result[0].save(fn + '_epo.fif', overwrite = True),
+        evoked = lambda result, fn: mne.write_evokeds(fn + '-ave.fif', list(result[0].values())),
+        )
+
+    # start after the last step which is in the cache
+    first_stage, result, cached = 0, None, []
+    if cache is not None:
+        t0 = time.perf_counter()
+        keys = cache.stage_keys(cache.file_key(bdf_filepath), [
+            ('crop', params['crop']), ('filter', filter_params),
+            ('epochs', [params['epochs'], params['ica']]), ('evoked', params['evoked'])])
+        stage_times['hash'] = time.perf_counter() - t0
+        for i in reversed(range(len(STAGES))):
+            if cache.has(STAGES[i], keys[STAGES[i]]):
+                t0 = time.perf_counter()
+                result = cache.load(STAGES[i], keys[STAGES[i]],
+                                    lambda folder: _load_stage(STAGES[i], folder, memmap_folder))
+                if result is None: # evicted by another process in the meantime
+                    continue
+                stage_times['load_' + STAGES[i]] = time.perf_counter() - t0
+                first_stage, cached = i + 1, [STAGES[i]]
+                break
+
+    if first_stage == 0 and memmap_folder is not None:
+        # crop before loading (cropping loaded data copies them out of the
+        # memmap) and load the cropped data into a memmap
+        import memmap_filter # imports this module
+        steps['crop'] = lambda _: memmap_filter.read_cropped_memmapped(
+            bdf_filepath, memmap_folder, **params['crop'])
+    elif first_stage == 0 and streaming_crop:
+        # the crop only decides which samples and channels are read later
+        import streaming_crop as streaming # imports this module
+        steps['crop'] = lambda _: streaming.read_cropped(bdf_filepath, **params['crop'])
+    elif first_stage == 0:
+        t0 = time.perf_counter()
+        result = read_bdf(bdf_filepath, memmap_folder)
+        stage_times['read'] = time.perf_counter() - t0
+
+    epochs_result = result if first_stage == 3 else None
+    for stage in STAGES[first_stage:]:
+        t0 = time.perf_counter()
+        result = steps[stage](result) # the result of the step before is not kept
+        stage_times[stage] = time.perf_counter() - t0
+        if stage == 'epochs':
+            epochs_result = result
+        if write_intermediates:
+            t0 = time.perf_counter()
+            intermediates[stage](result, os.path.join(out_folder, name))
+            stage_times['write_' + stage] = time.perf_counter() - t0
+        if cache is not None:
+            t0 = time.perf_counter()
+            cache.store(stage, keys[stage], lambda folder: _save_stage(stage, result, folder))
+            stage_times['cache_' + stage] = time.perf_counter() - t0
+    evokeds, drop_stats = result
+
+    if verbose:
+        print('{}: '.format(name) + ', '.join(
+            '{} {:.2f} s'.format(stage, t) for stage, t in stage_times.items()) +
+            ' (total {:.2f} s)'.format(sum(stage_times.values())))
+    epochs, ica = epochs_result[:2] if epochs_result is not None else (None, None)
+    return dict(name = name, evokeds = evokeds, epochs = epochs, ica = ica,
+                drop_stats = drop_stats, stage_times = stage_times, cached = cached)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_filename', nargs = '?', default = 'LK_1_post1',
+                        help = 'name of the bdf file in the Data folder (without .bdf)')
+    parser.add_argument('--data-folder', default = default_data_folder())
+    parser.add_argument('--write-intermediates', action = 'store_true',
+                        help = 'save the result of every step like the scripts do')
+    parser.add_argument('--streaming-crop', action = 'store_true',
+                        help = 'load only the cropped part of the bdf file')
+    parser.add_argument('--memmap-folder', default = None,
+                        help = 'load the raw data into a temporary file in this folder')
+    parser.add_argument('--cache', default = None,
+                        help = 'folder of the stage cache (default: no cache)')
+    parser.add_argument('--cache-gb', type = float, default = 20.,
+                        help = 'max size of the stage cache')
+    args = parser.parse_args()
+    assert os.path.isdir(args.data_folder), ('There is no Data folder '
+        'where the script assumes there should be one. Pass the folder where you '
+        'saved the data with --data-folder.')
+
+    cache = StageCache(args.cache, max_bytes = args.cache_gb*1e9) if args.cache else None
+    run_pipeline(os.path.join(args.data_folder, args.data_filename + '.bdf'),
+                 write_intermediates = args.write_intermediates, cache = cache,
+                 streaming_crop = args.streaming_crop, memmap_folder = args.memmap_folder)
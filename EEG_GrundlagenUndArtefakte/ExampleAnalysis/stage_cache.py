@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+In this file, I cache the results of the steps of pipeline.py on disk, so a
+run only recomputes the steps whose input or parameters have changed.
+
+Every result is stored under a key which is the hash of the name of the
+step, its parameters and its input. The input of the first step is the bdf
+file (hashed by its content), the input of every other step is the key of
+the step before, so the keys of all steps are known before anything is
+computed: changing e.g. the reject criteria of the epochs changes the keys
+of the epochs and the evoked, but not the ones of crop and filter, and the
+run starts from the cached filtered data.
+
+Every entry is a folder <step>-<key> in the cache folder. It is written to
+a temporary folder first and renamed when it is complete, so an
+interrupted run (or another process of batch processing) never sees half
+an entry. Reading an entry touches it; when the cache is bigger than
+max_bytes, the entries which have not been used for the longest time are
+removed (LRU). Another process can evict an entry between has and load;
+load then returns None and the step is computed again.
+
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# change to invalidate all entries (e.g. when the code of a step changes)
+CACHE_VERSION = 1
+
+
+def _hash(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys = True, default = str).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class StageCache:
+
+    def __init__(self, folder, max_bytes = 20e9):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok = True)
+        self._file_hashes_filepath = os.path.join(folder, 'file_hashes.json')
+
+    # %% Keys
+
+    def file_key(self, filepath, block_size = 16*1024**2):
+        """sha1 of the content of the file; remembered per path, size and
+        modification time, so a big recording is only read once."""
+        stat = os.stat(filepath)
+        signature = '{}|{}|{}'.format(os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+        file_hashes = self._read_file_hashes()
+        if signature not in file_hashes:
+            digest = hashlib.sha1()
+            with open(filepath, 'rb') as f:
+                for block in iter(lambda: f.read(block_size), b''):
+                    digest.update(block)
+            file_hashes = self._read_file_hashes() # another process may have added some
+            file_hashes[signature] = digest.hexdigest()
+            tmp_filepath = '{}.{}.tmp'.format(self._file_hashes_filepath, os.getpid())
+            with open(tmp_filepath, 'w') as f:
+                json.dump(file_hashes, f, indent = 1)
+            os.replace(tmp_filepath, self._file_hashes_filepath)
+        return file_hashes[signature]
+
+    def stage_keys(self, input_key, stages):
+        """The keys of the steps stages (a list of (name, params)) which
+        are run one after the other on the input with input_key."""
+        keys = {}
+        for stage, params in stages:
+            input_key = keys[stage] = _hash(CACHE_VERSION, stage, params, input_key)
+        return keys
+
+    # %% Entries
+
+    def path(self, stage, key):
+        return os.path.join(self.folder, '{}-{}'.format(stage, key))
+
+    def has(self, stage, key):
+        return os.path.isdir(self.path(stage, key))
+
+    def load(self, stage, key, loader):
+        """loader(folder of the entry), after marking the entry as used.
+        Returns None if the entry is missing, e.g. because another process
+        has evicted it since has(stage, key)."""
+        path = self.path(stage, key)
+        try:
+            os.utime(path)
+            return loader(path)
+        except FileNotFoundError:
+            return None
+
+    def store(self, stage, key, saver):
+        """saver(folder) writes the result into the (empty) folder; then the
+        entry is added and old entries are evicted."""
+        path = self.path(stage, key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        shutil.rmtree(tmp_path, ignore_errors = True)
+        os.makedirs(tmp_path)
+        try:
+            saver(tmp_path)
+            if os.path.isdir(path): # the same result was stored by another process
+                shutil.rmtree(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors = True)
+            raise
+        self.evict(keep = path)
+
+    def entries(self):
+        """(last used, size in bytes, folder) of every entry, oldest first."""
+        entries = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if not os.path.isdir(path) or name.endswith('.tmp'):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, fn)) for fn in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep = None):
+        """Remove the least recently used entries (but not keep) until the
+        cache is at most max_bytes. Returns the n of bytes removed."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total - removed <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors = True)
+            removed += size
+        return removed
+
+    def _read_file_hashes(self):
+        try:
+            with open(self._file_hashes_filepath) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', help = 'the cache folder')
+    parser.add_argument('--max-gb', type = float, default = None,
+                        help = 'evict the least recently used entries down to this size')
+    args = parser.parse_args()
+
+    cache = StageCache(args.folder, max_bytes = (args.max_gb or float('inf'))*1e9)
+    if args.max_gb is not None:
+        print('Removed {:.2f} GB.'.format(cache.evict()/1e9))
+    for last_used, size, path in cache.entries():
+        print('{}  {:8.1f} MB  {}'.format(time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used)),
+                                        size/1e6, os.path.basename(path)))
+    print('{:.2f} GB in total'.format(cache.size()/1e9))
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+In this file, I crop a bdf file like 0_Crop_bdf.py, but without loading the
+whole recording into memory first:
+
+1. Only the Status channel is decoded to find the first and the last
+   event with the codes 41 and 42: the file is memory-mapped and of every
+   data record only the bytes of the Status channel are read, block by
+   block.
+2. The recording is opened without preload, cropped to the events +-4 s
+   and the channels which are not needed are dropped (both only change
+   which samples and channels will be read).
+3. Raw.save reads the remaining samples and channels in buffers of
+   buffer_size_sec and appends every buffer to the fif file.
+
+So the peak memory depends on the size of a block and a buffer, not on the
+length of the recording. With --preload, the file is cropped like in
+0_Crop_bdf.py instead, to compare; the peak memory (RSS) of the process is
+printed in both cases:
+
+    python streaming_crop.py LK_1_post1
+    python streaming_crop.py LK_1_post1 --preload
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import mne
+import numpy as np
+
+import pipeline
+
+try:
+    import resource # not on Windows
+except ImportError:
+    resource = None
+
+
+# %% Reading the Status channel
+
+def read_bdf_header(bdf_filepath):
+    """The fields of the header of a bdf file which are needed to find the
+    samples of a channel."""
+    with open(bdf_filepath, 'rb') as f:
+        fixed = f.read(256)
+        n_channels = int(fixed[252:256])
+        channel_fields = f.read(256*n_channels)
+
+    def field(offset, width):
+        """One field of every channel, offset in units of n_channels bytes."""
+        start = offset*n_channels
+        return [channel_fields[start + i*width:start + (i + 1)*width].decode('latin-1').strip()
+                for i in range(n_channels)]
+
+    header = dict(header_bytes = int(fixed[184:192]), n_records = int(fixed[236:244]),
+                  record_duration = float(fixed[244:252]), n_channels = n_channels,
+                  labels = field(0, 16),
+                  n_samples = [int(n) for n in field(16 + 80 + 8 + 8*4 + 80, 8)])
+    record_bytes = 3*sum(header['n_samples'])
+    if header['n_records'] < 0: # the recording was not closed properly
+        header['n_records'] = (os.path.getsize(bdf_filepath) - header['header_bytes'])//record_bytes
+    header['record_bytes'] = record_bytes
+    return header
+
+
+def find_status_events(bdf_filepath, stim_channel = 'Status', mask = 0xFFFF,
+                       block_records = 600):
+    """The events (sample, previous value, value) of the Status channel,
+    i.e. every sample at which the (masked) value increases, like
+    mne.find_events with its defaults (consecutive = 'increasing',
+    initial_event = False), which 0_Crop_bdf.py uses: a change to a lower
+    value other than 0 is not an event, and neither is a value other than 0
+    at the first sample. Only the Status channel is read, block_records
+    data records at a time. The lower 16 bits of the Status channel are the
+    triggers."""
+    header = read_bdf_header(bdf_filepath)
+    channel = header['labels'].index(stim_channel)
+    n_samples = header['n_samples'][channel]
+    offset = 3*sum(header['n_samples'][:channel])
+    records = np.memmap(bdf_filepath, dtype = np.uint8, mode = 'r', offset = header['header_bytes'],
+                        shape = (header['n_records'], header['record_bytes']))
+
+    events = []
+    previous = None
+    for first in range(0, header['n_records'], block_records):
+        raw_bytes = np.asarray(records[first:first + block_records, offset:offset + 3*n_samples])
+        raw_bytes = raw_bytes.reshape(-1, 3).astype(np.int32)
+        status = (raw_bytes[:, 0] | raw_bytes[:, 1] << 8 | raw_bytes[:, 2] << 16) & mask
+        if previous is None: # no event at the first sample
+            previous = status[0]
+        before = np.concatenate(([previous], status[:-1]))
+        onsets = np.flatnonzero(status > before)
+        events.append(np.column_stack((onsets + first*n_samples, before[onsets], status[onsets])))
+        previous = status[-1]
+    del records
+    sfreq = n_samples/header['record_duration']
+    return np.concatenate(events).astype(np.int64), sfreq, header['n_records']*n_samples
+
+
+# %% Cropping
+
+def crop_window(events, sfreq, n_times, codes, margin):
+    """tmin and tmax (s) from margin s before the first to margin s after
+    the last event with one of the codes."""
+    events_relevant = events[np.isin(events[:, 2], codes)]
+    assert len(events_relevant), 'There are no events with the codes {}.'.format(codes)
+    t_event_first = events_relevant[:, 0].min()/sfreq
+    t_event_last = events_relevant[:, 0].max()/sfreq
+    return float(max(t_event_first - margin, 0)), float(min(t_event_last + margin, (n_times - 1)/sfreq))
+
+
+def read_cropped(bdf_filepath, codes, margin, rename, exclude):
+    """The recording cropped to the events and without the channels
+    exclude, not loaded yet: the samples which are left are only read when
+    the data are loaded or saved."""
+    events, sfreq, n_times = find_status_events(bdf_filepath)
+    tmin, tmax = crop_window(events, sfreq, n_times, codes, margin)
+    raw = mne.io.read_raw_bdf(bdf_filepath, preload = False, verbose = 'error')
+    raw.crop(tmin = tmin, tmax = tmax)
+    raw.rename_channels(mapping = rename)
+    raw.pick(picks = 'all', exclude = [ch for ch in exclude if ch in raw.ch_names])
+    return raw
+
+
+def crop_bdf(bdf_filepath, fif_filepath, buffer_size_sec = 10., **crop_params):
+    """Write the cropped recording to fif_filepath buffer by buffer."""
+    params = dict(pipeline.DEFAULT_PARAMS['crop'], **crop_params)
+    raw = read_cropped(bdf_filepath, **params)
+    raw.save(fif_filepath, buffer_size_sec = buffer_size_sec, overwrite = True, verbose = 'error')
+    return raw
+
+
+def crop_bdf_preload(bdf_filepath, fif_filepath, **crop_params):
+    """Like 0_Crop_bdf.py: load everything, crop and save."""
+    params = dict(pipeline.DEFAULT_PARAMS['crop'], **crop_params)
+    raw = pipeline.crop(pipeline.read_bdf(bdf_filepath), **params)
+    raw.save(fif_filepath, overwrite = True, verbose = 'error')
+    return raw
+
+
+def peak_rss():
+    """The peak resident memory of this process in bytes."""
+    if resource is None:
+        return float('nan')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss*1024 # kB on linux
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_filename', nargs = '?', default = 'LK_1_post1',
+                        help = 'name of the bdf file in the Data folder (without .bdf)')
+    parser.add_argument('--data-folder', default = pipeline.default_data_folder())
+    parser.add_argument('--preload', action = 'store_true',
+                        help = 'load the whole file first (like 0_Crop_bdf.py)')
+    parser.add_argument('--buffer-size-sec', type = float, default = 10.)
+    args = parser.parse_args()
+
+    bdf_filepath = os.path.join(args.data_folder, args.data_filename + '.bdf')
+    fif_filepath = os.path.join(args.data_folder, args.data_filename + '_cropped_raw.fif')
+    t0 = time.perf_counter()
+    if args.preload:
+        raw = crop_bdf_preload(bdf_filepath, fif_filepath)
+    else:
+        raw = crop_bdf(bdf_filepath, fif_filepath, buffer_size_sec = args.buffer_size_sec)
+    print('Cropped to {:.1f} s, {} channels in {:.1f} s ({}); peak RSS {:.0f} MB'.format(
+        raw.times[-1], len(raw.ch_names), time.perf_counter() - t0,
+        'preload' if args.preload else 'streaming', peak_rss()/1e6))
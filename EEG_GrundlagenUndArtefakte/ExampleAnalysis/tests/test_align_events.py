@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+Tests of align_events.py on synthetic sessions with a drift, missing and
+extra triggers.
+"""
+
+import numpy as np
+import pytest
+
+import align_events
+
+
+def synthetic_session(seed, n_trials = 600, offset = 12.3, drift = 50e-6, jitter = .0005,
+                      missing = (), n_extra = 0):
+    """The trials (times, codes) and the triggers of a session, and the
+    deviation of every trigger from the clock model (nan if missing)."""
+    rng = np.random.RandomState(seed)
+    t_beh = np.cumsum(rng.uniform(1., 1.5, n_trials))
+    codes_beh = np.where(rng.random_sample(n_trials) < .18, 41, 42)
+    deviations = rng.normal(0, jitter, n_trials)
+    t_eeg = offset + (1 + drift)*t_beh + deviations
+    keep = np.ones(n_trials, dtype = bool)
+    keep[list(missing)] = False
+    deviations[~keep] = np.nan
+    # extra triggers halfway between two trials
+    extra = rng.choice(n_trials - 1, n_extra, replace = False)
+    t_extra = (t_eeg[extra] + t_eeg[extra + 1])/2
+    t_eeg = np.concatenate((t_eeg[keep], t_extra))
+    codes_eeg = np.concatenate((codes_beh[keep], np.full(n_extra, 42)))
+    return t_beh, codes_beh, t_eeg, codes_eeg, deviations
+
+
+def test_drift_and_missing_trials():
+    missing = [0, 17, 300, 301, 599]
+    t_beh, codes_beh, t_eeg, codes_eeg, deviations = synthetic_session(
+        1, missing = missing, n_extra = 3)
+    summary, table = align_events.align(t_beh, codes_beh, t_eeg, codes_eeg)
+
+    assert summary['n_matched'] == 595
+    assert summary['n_missing'] == 5 and summary['n_extra'] == 3
+    assert summary['n_wrong_code'] == 0
+    assert summary['offset_s'] == pytest.approx(12.3, abs = .001)
+    assert summary['drift_ppm'] == pytest.approx(50, abs = 2)
+    assert summary['latency_sd_ms'] == pytest.approx(.5, abs = .1)
+    assert np.array_equal(table['trial'], np.arange(600))
+    assert np.array_equal(np.flatnonzero(np.isnan(table['t_eeg'])), missing)
+    # a constant latency ends up in the offset
+    matched = ~np.isnan(deviations)
+    latencies = table['latency_ms'][matched]
+    assert np.allclose(latencies - latencies.mean(),
+                       (deviations[matched] - deviations[matched].mean())*1000, atol = .05)
+
+
+def test_trials_not_in_the_order_of_time():
+    t_beh, codes_beh, t_eeg, codes_eeg, deviations = synthetic_session(2, missing = [5, 50])
+    order = np.random.RandomState(0).permutation(len(t_beh))
+    summary, table = align_events.align(t_beh[order], codes_beh[order], t_eeg, codes_eeg)
+
+    assert summary['n_missing'] == 2
+    # the table is in the order of the input, the summary only uses matched trials
+    assert np.array_equal(table['t_behaviour'], t_beh[order])
+    assert np.array_equal(np.isnan(table['latency_ms']), np.isnan(deviations[order]))
+    assert np.isfinite(summary['latency_max_abs_ms']) and summary['latency_max_abs_ms'] < 3
+
+
+def test_match_nearest_single_trigger():
+    i_beh, i_eeg = align_events.match_nearest(np.array([1., 2., 3.]), np.array([2.1]), .5)
+    assert i_beh.tolist() == [1] and i_eeg.tolist() == [0]
+    i_beh, i_eeg = align_events.match_nearest(np.array([1.]), np.array([.8, 5.]), .5)
+    assert i_beh.tolist() == [0] and i_eeg.tolist() == [0]
+    i_beh, i_eeg = align_events.match_nearest(np.array([1.]), np.zeros(0), .5)
+    assert len(i_beh) == len(i_eeg) == 0
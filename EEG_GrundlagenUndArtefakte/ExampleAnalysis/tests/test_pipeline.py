@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+Tests of pipeline.py: the re-reference in place for data in a memmap.
+"""
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+pytest.importorskip('mne') # pipeline imports mne
+import pipeline
+
+
+def peak_allocated(func, *args):
+    """The peak of the memory allocated (by numpy, too) while func runs."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def memmapped(folder, n_channels = 12, n_times = 50000):
+    data = np.memmap(str(folder/'raw.dat'), dtype = np.float64, mode = 'w+',
+                     shape = (n_channels, n_times))
+    data[:] = np.random.RandomState(0).standard_normal(data.shape)
+    return data
+
+
+def test_subtract_reference(tmp_path):
+    data = memmapped(tmp_path)
+    # the last row is not EEG (e.g. Status), the rows 9 and 10 are the mastoids
+    picks, ref_idx = np.arange(11), [9, 10]
+    expected = np.array(data)
+    expected[picks] -= expected[ref_idx].mean(axis = 0)
+    pipeline.subtract_reference(data, ref_idx, picks[::-1], block_size = 4)
+    assert np.allclose(data, expected)
+
+
+@pytest.mark.parametrize('block_size', [1, 4, 12])
+def test_subtract_reference_allocates_one_row(tmp_path, block_size):
+    data = memmapped(tmp_path)
+    row = data.shape[1]*data.itemsize
+    picks = np.arange(11)
+    peak = peak_allocated(pipeline.subtract_reference, data, [9, 10], picks, block_size)
+    assert peak < 1.5*row
+    # the fancy index of set_eeg_reference copies every row it changes
+    ref = np.array(data[[9, 10]].mean(axis = 0))
+    def fancy():
+        data[picks] -= ref
+    assert peak_allocated(fancy) > len(picks)*row
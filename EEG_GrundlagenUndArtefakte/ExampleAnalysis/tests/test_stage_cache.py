@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: LKirst
+
+Tests of stage_cache.py: the keys of the steps and the eviction.
+"""
+
+import os
+import time
+
+from stage_cache import StageCache
+
+
+def write(folder, size):
+    """A saver which writes size bytes."""
+    with open(os.path.join(folder, 'result.bin'), 'wb') as f:
+        f.write(b'\0'*size)
+
+
+def read(folder):
+    with open(os.path.join(folder, 'result.bin'), 'rb') as f:
+        return len(f.read())
+
+
+def test_file_key_is_the_content(tmp_path):
+    cache = StageCache(str(tmp_path/'cache'))
+    a, b = tmp_path/'a.bdf', tmp_path/'b.bdf'
+    a.write_bytes(b'recording')
+    b.write_bytes(b'recording')
+    assert cache.file_key(str(a)) == cache.file_key(str(b))
+    b.write_bytes(b'other recording')
+    assert cache.file_key(str(a)) != cache.file_key(str(b))
+
+
+def test_stage_keys_depend_on_the_steps_before(tmp_path):
+    cache = StageCache(str(tmp_path))
+    stages = [('crop', dict(margin = 4)), ('filter', dict(l_freq = .1)),
+              ('epochs', [dict(tmin = -.2), dict(exclude = [])]), ('evoked', {})]
+    keys = cache.stage_keys('input', stages)
+    assert keys == cache.stage_keys('input', stages)
+    changed = cache.stage_keys('input', stages[:2] + [('epochs', [dict(tmin = -.1), dict(exclude = [])])]
+                               + stages[3:])
+    assert [keys[s] == changed[s] for s in ['crop', 'filter', 'epochs', 'evoked']] == \
+        [True, True, False, False]
+    other_input = cache.stage_keys('other input', stages)
+    assert not set(keys.values()) & set(other_input.values())
+
+
+def test_store_and_load(tmp_path):
+    cache = StageCache(str(tmp_path))
+    cache.store('crop', 'k', lambda folder: write(folder, 10))
+    assert cache.has('crop', 'k') and cache.load('crop', 'k', read) == 10
+    assert not cache.has('crop', 'other')
+    assert [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')] == []
+
+
+def test_load_of_an_evicted_entry(tmp_path):
+    cache = StageCache(str(tmp_path))
+    cache.store('crop', 'k', lambda folder: write(folder, 10))
+    assert cache.has('crop', 'k')
+    # another process evicts the entry between has and load
+    StageCache(str(tmp_path), max_bytes = 0).evict()
+    assert cache.load('crop', 'k', read) is None
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = StageCache(str(tmp_path), max_bytes = float('inf'))
+    now = time.time()
+    for i, key in enumerate(['a', 'b', 'c', 'd']):
+        cache.store('filter', key, lambda folder: write(folder, 100))
+        os.utime(cache.path('filter', key), (now - 100 + i, now - 100 + i))
+    assert cache.size() == 400
+    cache.load('filter', 'a', read) # a is now the most recently used
+    cache.max_bytes = 250
+    assert cache.evict(keep = cache.path('filter', 'b')) == 200
+    assert [cache.has('filter', key) for key in 'abcd'] == [True, True, False, False]
+    assert cache.size() == 200
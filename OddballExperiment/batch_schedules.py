@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Python 3.6
+
+Generate the Oddball schedules of many subjects and sessions in advance
+without psychopy or a window, e.g.
+
+    python batch_schedules.py testdata/schedules.npz --nsubjects 200 --nsessions 2
+
+Every session gets its own seed (firstseed, firstseed+1, ...) and the
+schedule is exactly the one Oddball would generate with that seed. All
+schedules are written into one npz file (see schedule.saveSchedules); in
+main.py you can enter this file in the dialog to load the schedule of the
+subject instead of generating it at the start of the session.
+
+"""
+
+import argparse
+import functools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import schedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fn', help = 'the npz file to write')
+    parser.add_argument('--nsubjects', type = int, required = True)
+    parser.add_argument('--nsessions', type = int, default = 1, help = 'sessions (i.e. seeds) per subject')
+    parser.add_argument('--firstsubject', type = int, default = 1)
+    parser.add_argument('--firstseed', type = int, default = 1)
+    parser.add_argument('--ntrials', type = int, default = 300)
+    parser.add_argument('--pdeviants', type = float, default = .18)
+    parser.add_argument('--maxNConsecStan', type = int, default = 31)
+    parser.add_argument('--nfr_on2onisi_lower', type = int, default = 126)
+    parser.add_argument('--nfr_on2onisi_upper', type = int, default = 150)
+    parser.add_argument('--nFrStim', type = int, default = 6)
+    parser.add_argument('--workers', type = int, default = None, help = 'default: n of CPUs')
+    args = parser.parse_args()
+
+    params = dict(ntrials = args.ntrials,
+                  pdeviants = args.pdeviants,
+                  maxNConsecStan = args.maxNConsecStan,
+                  nfr_on2onisi_lower = args.nfr_on2onisi_lower,
+                  nfr_on2onisi_upper = args.nfr_on2onisi_upper,
+                  nFrStim = args.nFrStim)
+
+    subjects = [s for s in range(args.firstsubject, args.firstsubject+args.nsubjects)
+                for _ in range(args.nsessions)]
+    seeds = list(range(args.firstseed, args.firstseed+len(subjects)))
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers = args.workers) as executor:
+        schedules = list(executor.map(
+            functools.partial(schedule.sessionSchedule, **params), seeds,
+            chunksize = max(1, len(seeds)//64)))
+    schedule.saveSchedules(args.fn, subjects, seeds, schedules, params)
+
+    print('Wrote {} schedules of {} subjects to {} in {:.2f} s.'.format(
+        len(seeds), args.nsubjects, args.fn, time.perf_counter() - t0))
+
+
+if __name__ == '__main__':
+    main()
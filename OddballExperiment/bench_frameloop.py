@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Python 3.6
+
+Headless microbenchmark of the Python work done per frame in the trial loop
+of Oddball.runOddball: the old loop, which reads the trial dict and checks
+the stimulus status on every frame, against the loop over the compiled frame
+schedule. flip, the port and the keyboard are replaced by stand-ins that do
+nothing, so only the overhead of the loop itself is measured. Both loops
+take less than a microsecond per frame and which one is faster changes from
+run to run, i.e. the difference is noise next to a frame of 16.7 ms. Runs
+without psychopy:
+
+    python bench_frameloop.py
+
+"""
+
+import time
+
+import numpy as np
+
+import schedule
+
+NOT_STARTED, STARTED, STOPPED = 0, 1, -1 # as in psychopy.constants
+
+
+class StandInWin:
+    def callOnFlip(self, function, *args, **kwargs):
+        self.onFlip = (function, args, kwargs)
+    def flip(self):
+        pass
+
+
+class StandInStim:
+    status = NOT_STARTED
+    @property
+    def autoDraw(self):
+        return self.status == STARTED
+    @autoDraw.setter
+    def autoDraw(self, value):
+        self.status = STARTED if value else STOPPED
+
+
+class StandInPort:
+    status = None
+    def setData(self, data):
+        pass
+
+
+class StandInClock:
+    def getTime(self):
+        return -1.
+
+
+def getKeys(keyList = None):
+    return []
+
+
+def runOld(trialList, nFrStim, win, port, clock, deviant, standard):
+    """The frame loop of runOddball before the frame schedule was compiled."""
+    nFrames = 0
+    for thisTrial in trialList:
+        frameN = -1
+        on2On_isi = thisTrial['isi']
+        off2On_isi = on2On_isi-nFrStim
+        if thisTrial['standard']:
+            triggerSignal = 2
+            stim = standard
+        else:
+            triggerSignal = 1
+            stim = deviant
+        stim.status = NOT_STARTED
+        continueRoutine = True
+        while continueRoutine:
+            frameN = frameN + 1
+            if frameN >= off2On_isi and stim.status == NOT_STARTED:
+                win.callOnFlip(print, triggerSignal)
+                stim.frameNStart = frameN
+                stim.tStart = clock.getTime()
+                stim.autoDraw = True
+            if port.status == STARTED and clock.getTime() >= 0:
+                port.status = STOPPED
+                port.setData(0)
+            if getKeys(keyList=['escape']):
+                break
+            if stim.status == STARTED and frameN >= (stim.frameNStart + nFrStim):
+                stim.autoDraw = False
+                continueRoutine = False
+            win.flip()
+            nFrames += 1
+    return nFrames
+
+
+def runCompiled(frameSchedule, win, port, clock, deviant, standard):
+    """The frame loop of runOddball with the compiled frame schedule."""
+    nFrames = 0
+    stimsByType = (deviant, standard)
+    for thisN in range(len(frameSchedule)):
+        frameN, onsetFr, offsetFr, isStandard, triggerSignal = \
+            frameSchedule[thisN].tolist()
+        stim = stimsByType[isStandard]
+        while frameN <= offsetFr:
+            if frameN == onsetFr:
+                win.callOnFlip(print, triggerSignal)
+                stim.tStart = clock.getTime()
+                stim.autoDraw = True
+            elif frameN == offsetFr:
+                stim.autoDraw = False
+            if port.status == STARTED and clock.getTime() >= 0:
+                port.status = STOPPED
+                port.setData(0)
+            if getKeys(keyList=['escape']):
+                break
+            win.flip()
+            frameN += 1
+            nFrames += 1
+    return nFrames
+
+
+def main(ntrials = 300, nFrStim = 6, repeat = 5):
+
+    np.random.seed(0)
+    stims = schedule.stimsList(ntrials, .2, 31)
+    isi_list = schedule.isiList(126, 150, nFrStim, ntrials)
+    trialList = [dict(standard = i, isi = j) for i, j in zip(stims, isi_list)]
+    frameSchedule = schedule.compileFrameSchedule(stims, isi_list, nFrStim, (1, 2))
+
+    standIns = (StandInWin(), StandInPort(), StandInClock(), StandInStim(), StandInStim())
+
+    for name, run in [('old loop', lambda: runOld(trialList, nFrStim, *standIns)),
+                      ('compiled schedule', lambda: runCompiled(frameSchedule, *standIns))]:
+        tPerFrame = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            nFrames = run()
+            tPerFrame.append((time.perf_counter() - t0)/nFrames)
+        print('{:<18} {:>8} frames {:>8.3f} µs per frame'.format(
+            name, nFrames, min(tPerFrame)*1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Benchmark of the Python-side cost of Oddball.instruction, runOddball,
+reminder and TextInput.intInputRoutine without a display (see headless.py).
+For sessions with 300 and 10000 trials it reports the time spent per frame
+between two flips (mean, 99.9th percentile and worst case), the memory
+allocated during runOddball and the n of garbage collections it caused:
+
+    python bench_headless.py
+
+"""
+
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+from psychopy import data, logging
+
+import headless
+import oddball
+
+logging.console.setLevel(logging.ERROR)
+
+
+def frameStats(win, firstFlip, lastFlip):
+    """Wall-clock time in µs between the flips firstFlip to lastFlip."""
+    intervals = np.diff(win.flipWallTimes[firstFlip:lastFlip])*1e6
+    return dict(mean = intervals.mean(),
+                p999 = np.percentile(intervals, 99.9),
+                max = intervals.max())
+
+
+def timeRoutine(routine, *args):
+    """Wall-clock time of a routine in ms."""
+    t0 = time.perf_counter()
+    routine(*args)
+    return (time.perf_counter() - t0)*1000
+
+
+def benchSession(ntrials, refreshRate = 60.):
+
+    backend = headless.Backend(refreshRate = refreshRate)
+    win = backend.visual.Window()
+    thisExp = data.ExperimentHandler(dataFileName = '', savePickle = False,
+                                     saveWideText = False, autoLog = False)
+
+    myOddball = oddball.Oddball(
+        win = win, expHandler = thisExp, mydir = '', subjectnr = 0, sessionnr = '1',
+        triggerlen = 0.01, ntrials = ntrials, nfr_on2onisi_upper = 150,
+        nfr_on2onisi_lower = 126, nFrStim = 6, pdeviants = .18,
+        maxNConsecStan = 31, verticesPixStim = [(-20,-20),(-20,20),(20,20),(20,-20)],
+        trackFrIntervals = True, dataSaveClock = backend.core.Clock(),
+        seed = 1, backend = backend)
+
+    backend.event.pressKeys(['space'], delay = 2.)
+    tInstruction = timeRoutine(myOddball.instruction)
+
+    gc.collect()
+    gcBefore = gc.get_stats()[0]['collections']
+    tracemalloc.start()
+    firstFlip = win.nFlips
+    tRun = timeRoutine(myOddball.runOddball, 1, 2, -1, 0)
+    lastFlip = win.nFlips
+    _, peakMemory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nCollections = gc.get_stats()[0]['collections'] - gcBefore
+
+    backend.event.pressKeys(['space'], delay = 2.)
+    tReminder = timeRoutine(myOddball.reminder)
+
+    backend.event.pressKeys(['4', '2', 'return'], delay = 2.)
+    tInput = timeRoutine(myOddball.textInput.intInputRoutine, 'Wieviele?')
+
+    stats = frameStats(win, firstFlip, lastFlip)
+    print('\n{} trials, {} frames at {} Hz (virtual {:.0f} s) in {:.0f} ms'.format(
+        ntrials, lastFlip - firstFlip, refreshRate,
+        (lastFlip - firstFlip)/refreshRate, tRun))
+    print('  per frame [µs]: mean {mean:.1f}, 99.9th percentile {p999:.1f}, '
+          'worst case {max:.1f}'.format(**stats))
+    print('  runOddball: peak allocated {:.1f} kB, {} gen0 collections'.format(
+        peakMemory/1024, nCollections))
+    print('  instruction {:.1f} ms, reminder {:.1f} ms, intInputRoutine {:.1f} ms '
+          '(each waiting 2 s of virtual time)'.format(tInstruction, tReminder, tInput))
+
+
+if __name__ == '__main__':
+    for ntrials in [300, 10000]:
+        benchSession(ntrials)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Python 3.6
+
+Compares the time it takes to generate the stims list for the Oddball with
+the old approach (reshuffle the pairs until the constraint holds) and with
+schedule.stimsList for different ntrials and maxNConsecStan, and checks that
+the time of stimsList grows about linearly with ntrials (_fillGaps is
+O(ntrials*log(ntrials))). Runs without psychopy:
+
+    python bench_schedule.py
+
+"""
+
+import timeit
+
+import numpy as np
+
+import schedule
+
+
+def stimsListReshuffle(ntrials, pdeviants, maxNConsecStan, maxTries = 50):
+    """The old Oddball._stimsList; returns None if it had to re-shuffle more
+    than maxTries times (where the old version called core.quit())."""
+    pairsStims = int(ntrials*pdeviants)*[(1, 0)] + int((ntrials/2)*(1-(pdeviants*2)))*[(1, 1)]
+
+    h = 0
+    while True:
+        h += 1
+        np.random.shuffle(pairsStims)
+        indecesPairs = [-1]+[i for i, e in enumerate(pairsStims) if e == (1,0)]+[len(pairsStims)]
+        diffPairsIndeces = [t - s for s, t in zip(indecesPairs, indecesPairs[1:])]
+        if max(diffPairsIndeces) <= int((maxNConsecStan)/2):
+            break
+        elif h > maxTries:
+            return None
+
+    return [j for i in pairsStims for j in i]
+
+
+def maxConsecStan(stims):
+    """The longest run of standards in stims."""
+    stims = np.asarray(stims)
+    indecesDev = np.concatenate(([-1], np.flatnonzero(stims == 0), [len(stims)]))
+    return int(np.max(np.diff(indecesDev)) - 1)
+
+
+def timeIt(func, *args, repeat = 5):
+    np.random.seed(0)
+    t = min(timeit.repeat(lambda: func(*args), number = 1, repeat = repeat))
+    return t, func(*args)
+
+
+def main(pdeviants = .1):
+
+    print('{:>8} {:>15} {:>15} {:>15} {:>10}'.format(
+        'ntrials', 'maxNConsecStan', 'reshuffle [ms]', 'stimsList [ms]', 'max run'))
+
+    for ntrials in [300, 3000, 30000]:
+        for maxNConsecStan in [61, 41, 31, 25]:
+            tOld, stimsOld = timeIt(stimsListReshuffle, ntrials, pdeviants, maxNConsecStan)
+            tNew, stimsNew = timeIt(schedule.stimsList, ntrials, pdeviants, maxNConsecStan)
+
+            # the constraint must hold for every sequence stimsList returns
+            assert maxConsecStan(stimsNew) <= 2*(int(maxNConsecStan/2)-1)+1
+
+            print('{:>8} {:>15} {:>15} {:>15.3f} {:>10}'.format(
+                ntrials, maxNConsecStan,
+                'aborted' if stimsOld is None else '{:.3f}'.format(tOld*1000),
+                tNew*1000, maxConsecStan(stimsNew)))
+
+
+def checkScaling(pdeviants = .1, maxNConsecStan = 31, ntrials = (15000, 30000, 60000, 120000),
+                 maxRatio = 3.):
+    """Time stimsList for ntrials which double each time; every doubling
+    may take at most maxRatio times as long (4 would be quadratic)."""
+    print('\n{:>8} {:>15} {:>10}'.format('ntrials', 'stimsList [ms]', 'ratio'))
+    times = []
+    for n in ntrials:
+        t, _ = timeIt(schedule.stimsList, n, pdeviants, maxNConsecStan)
+        times.append(t)
+        print('{:>8} {:>15.3f} {:>10}'.format(n, t*1000,
+            '{:.2f}'.format(t/times[-2]) if len(times) > 1 else ''))
+    ratios = [t/s for s, t in zip(times, times[1:])]
+    assert max(ratios) <= maxRatio, 'stimsList does not scale linearly: '\
+        'doubling ntrials multiplied the time by {:.2f}'.format(max(ratios))
+
+
+if __name__ == '__main__':
+    main()
+    checkScaling()
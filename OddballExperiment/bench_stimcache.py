@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Benchmark of drawing an outline shape as visual.ShapeStim against drawing
+its texture from stimcache.StimCache, for shapes with an increasing n of
+vertices. Needs a window (OpenGL); the window does not wait for the vertical
+blank, so the time per frame is the time of the draw call plus the flip:
+
+    python bench_stimcache.py
+
+For every shape the median and the 99th percentile of the time per frame
+are reported. glFinish is called before every frame is timed, so the time
+also includes the work of the GPU.
+
+"""
+
+import time
+
+import numpy as np
+import pyglet.gl as GL
+
+from psychopy import visual, logging
+
+import stimcache
+
+logging.console.setLevel(logging.ERROR)
+
+
+def starVertices(nVertices, outer = 150, inner = 90):
+    """The vertices of a star with nVertices/2 points (in pixels)."""
+    angles = np.linspace(0, 2*np.pi, nVertices, endpoint = False)
+    radii = np.where(np.arange(nVertices) % 2 == 0, outer, inner)
+    return np.column_stack((radii*np.cos(angles), radii*np.sin(angles))).tolist()
+
+
+def timeFrames(win, stim, nFrames):
+    """The time per frame in µs of drawing stim and flipping."""
+    times = np.empty(nFrames)
+    for i in range(nFrames):
+        GL.glFinish()
+        t0 = time.perf_counter()
+        stim.draw()
+        win.flip()
+        GL.glFinish()
+        times[i] = time.perf_counter() - t0
+    return times*1e6
+
+
+def main(vertexCounts = (4, 16, 64, 256, 1024, 4096), nFrames = 500):
+    win = visual.Window([800, 600], units = 'pix', waitBlanking = False,
+                        allowGUI = False)
+    cache = stimcache.StimCache(win)
+
+    print('{:>8} {:>24} {:>24}'.format('vertices', 'ShapeStim [µs]', 'texture [µs]'))
+    for nVertices in vertexCounts:
+        vertices = starVertices(nVertices)
+        shape = visual.ShapeStim(win, units = 'pix', vertices = vertices,
+                                 lineWidth = 5, ori = 45.0)
+        texture = cache.get(vertices, ori = 45.0, lineWidth = 5)
+        results = []
+        for stim in [shape, texture]:
+            timeFrames(win, stim, 20) # warm up
+            times = timeFrames(win, stim, nFrames)
+            results.append('median {:>7.1f}, p99 {:>7.1f}'.format(
+                np.median(times), np.percentile(times, 99)))
+        print('{:>8} {:>24} {:>24}'.format(nVertices, *results))
+
+    win.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Measures TextInput.intInputRoutine while a subject types a response (on the
+headless backend, see headless.py): the CPU time used, the n of flips, the
+n of times the text of a TextStim was set (each of which makes psychopy lay
+out the glyphs again) and the CPU time per frame. The stand-ins neither lay
+out text nor wait for the monitor, so on a real window the cost of every
+text set and flip comes on top; the headless CPU time of the event-driven
+routine is mostly the simulated polling of the keyboard. For comparison,
+the old routine, which set the texts and flipped on every frame, is run
+with the same key presses:
+
+    python bench_textinput.py
+
+"""
+
+import re
+import time
+
+import headless
+import textinput
+
+
+class CountingStim(headless.Stim):
+    """Counts how often its text is set."""
+    nTextSet = 0
+    def __setattr__(self, name, value):
+        if name == 'text':
+            CountingStim.nTextSet += 1
+        super().__setattr__(name, value)
+
+
+def oldIntInputRoutine(self, questionText):
+    """intInputRoutine as it was before it became change-driven."""
+    inputText = ''
+    self.keys.clearEvents()
+    self.question.autoDraw = True
+    self.displayInput.autoDraw = True
+    continueRoutine = True
+    while continueRoutine:
+        theseKeys = [key[0] for key in self.keys.getKeys()]
+        for key in theseKeys:
+            if key == 'return' and len(inputText) > 0:
+                continueRoutine = False
+                break
+            elif key == 'backspace':
+                inputText = inputText[:-1]
+            elif re.match(r"num_[0-9]", key):
+                inputText += key[-1]
+            elif len(key) == 1 and key.isdigit():
+                inputText += key
+        self.question.text      = questionText
+        self.displayInput.text  = inputText
+        self.win.flip()
+    self.question.autoDraw = False
+    self.displayInput.autoDraw = False
+    return int(inputText)
+
+
+def measure(routine, refreshRate, typedKeys, interval):
+    backend = headless.Backend(refreshRate = refreshRate)
+    backend.visual.TextStim = CountingStim
+    win = backend.visual.Window()
+    textInput = textinput.TextInput(win, backend = backend)
+
+    CountingStim.nTextSet = 0
+    backend.event.pressKeys(typedKeys, delay = interval, interval = interval)
+    tVirtual = backend.now
+    tCpu = time.process_time()
+    answer = routine(textInput, 'Wieviele Stimuli der vorgegebenen Form haben Sie gezählt?')
+    tCpu = time.process_time() - tCpu
+    tVirtual = backend.now - tVirtual
+
+    print('  {:<18} answer {}, {:>4} flips, {:>5} texts set, CPU {:.1f} ms '
+          '({:.2f} ms per s of typing, {:.1f} µs per frame)'.format(
+              routine.__name__, answer, win.nFlips, CountingStim.nTextSet,
+              tCpu*1000, tCpu*1000/tVirtual, tCpu*1e6/win.nFlips))
+
+
+def main():
+    # 4 s of typing: '1', '2', '3', backspace, '4', return
+    typedKeys = ['1', '2', '3', 'backspace', '4', 'return']
+    for refreshRate in [60, 144, 240]:
+        print('{} Hz:'.format(refreshRate))
+        for routine in [oldIntInputRoutine, textinput.TextInput.intInputRoutine]:
+            measure(routine, refreshRate, typedKeys, interval = .6)
+
+
+if __name__ == '__main__':
+    main()
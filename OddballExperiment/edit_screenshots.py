@@ -1,62 +1,71 @@
+"""
+Crops screenshots (remove empty room around the stimulus) and puts them in a
+black frame.
 
-from PIL import Image
-import os
-
-
-def openImg(fps = ['stimuli1.png', 'stimuli2.png', 'stimuli3.png'], dir = 'testdata'):
-    
-    imgList = []
-    for i, fp in enumerate(fps):
-        imgList.append(Image.open(dir + os.sep + fp))
-    
-    return(imgList)
-
-
-def cropImg(imgs, cropW = 500, cropH = 300):
-    
-    # crop the images (remove empty room around the stimulus)
-    
-    
-    for i, img in enumerate(imgs):
-        
-        w, h = img.size
-        
-        imgs[i] = img.crop(box = (cropW, cropH, w-cropW, h-cropH)) # The box is (x, y, width, height)
-    
-    return(imgs)
-
-
-def frameImg(imgs):
-    
-    for i, img in enumerate(imgs):
-        # create a black image 10% bigger than the old one
-        biggerSize = (round(img.size[0]*1.1), round(img.size[1]*1.1))
-        blackImg = Image.new('RGB', biggerSize)
-        
-        # paste the img in the bigger, black img
-        blackImg.paste(img, ((biggerSize[0]-img.size[0])//2,
-                             (biggerSize[1]-img.size[1])//2))
-        
-        imgs[i] = blackImg
-    
-    return(imgs)
-    
+Every image which matches a glob is cropped to its content and framed on a
+pool of processes (the screenshots of Oddball.drawStimForScreenshot are
+cropped and framed already):
 
+    python edit_screenshots.py "testdata/screenshots/*.png" --outdir testdata/cropped
 
-def saveImg(imgs):
-    
-    for i, img in enumerate(imgs):
-        img.save(fp = 'testdata/stimuli_cropped{}.png'.format(i))
-        
-
-
-imgs_raw = openImg()
-
-imgs_crop = cropImg(imgs_raw, cropW = 600)
-
-imgs_frame = frameImg(imgs_crop)
-
-saveImg(imgs_frame)
+Each process opens, crops, frames and writes one image at a time, so only
+as many images as there are processes are in memory at once.
+"""
 
+import argparse
+import functools
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
+from PIL import Image
 
+import screenshots
+
+
+def editFile(fn, outdir, margin = 10, tolerance = 0):
+    """Crop the image fn to its content (plus margin pixels), frame it and
+    write it to outdir as <name>_cropped.png. Returns the n of bytes of the
+    image read."""
+    img = np.asarray(Image.open(fn).convert('RGB'))
+    cropped, = screenshots.cropToContent([img], margin = margin, tolerance = tolerance)
+    name = os.path.splitext(os.path.basename(fn))[0]
+    Image.fromarray(screenshots.addFrame(cropped)).save(
+        os.path.join(outdir, name + '_cropped.png'))
+    return img.nbytes
+
+
+def editFiles(pattern, outdir, margin = 10, tolerance = 0, workers = None):
+    """editFile for every file matching the glob pattern on a pool of
+    processes. Prints the throughput and returns the n of images."""
+    fns = sorted(glob.glob(pattern))
+    os.makedirs(outdir, exist_ok = True)
+    t0 = time.perf_counter()
+    nBytes = 0
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        # only the file names go to the processes and only the sizes come
+        # back, the images stay in the process which edits them
+        for n in executor.map(functools.partial(editFile, outdir = outdir, margin = margin,
+                                                tolerance = tolerance),
+                              fns, chunksize = max(1, len(fns)//256)):
+            nBytes += n
+    tTotal = time.perf_counter() - t0
+    print('{} images in {:.2f} s: {:.1f} images/s, {:.1f} MB/s (decoded)'.format(
+        len(fns), tTotal, len(fns)/tTotal, nBytes/tTotal/1e6))
+    return len(fns)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pattern', help = 'a glob of the images to edit')
+    parser.add_argument('--outdir', default = 'testdata/cropped')
+    parser.add_argument('--margin', type = int, default = 10, help = 'pixels around the content')
+    parser.add_argument('--tolerance', type = int, default = 0,
+                        help = 'max difference to the colour of the top left pixel that still counts as background')
+    parser.add_argument('--workers', type = int, default = None, help = 'default: n of CPUs')
+    args = parser.parse_args()
+
+    editFiles(args.pattern, args.outdir, args.margin, args.tolerance, args.workers)
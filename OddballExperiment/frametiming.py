@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+"""
+
+import numpy as np
+
+
+class FlipRecorder:
+
+    def __init__(self, frameDur, size = 1024):
+        """Stores the timestamps of the last size flips in a preallocated ring
+        buffer and detects dropped frames per trial from them.
+
+        Call record with the timestamp win.flip() returns after every flip
+        and trialTiming at the end of every trial; size must be larger than
+        the number of flips in a trial. frameDur is the expected duration of
+        a frame in seconds.
+        """
+        self.frameDur  = frameDur
+        self.flipTimes = np.zeros(size)
+        self.nFlips    = 0 # the index the next flip will get
+
+        # session summary
+        self.nTrials        = 0
+        self.nBadTrials     = 0 # trials with at least one dropped frame
+        self.nDroppedFrames = 0
+        self.maxInterval    = 0.
+
+    def record(self, flipTime):
+        self.flipTimes[self.nFlips % len(self.flipTimes)] = flipTime
+        self.nFlips += 1
+
+    def trialTiming(self, firstFlip, onsetFlip, offsetFlip):
+        """Return the time of the flip onsetFlip, the n of frames between
+        onsetFlip and offsetFlip (i.e. the achieved duration of the stimulus)
+        and the n of frames dropped between firstFlip and onsetFlip (i.e.
+        during the isi). The arguments are indeces of flips, i.e. values of
+        nFlips before the flip was recorded.
+        """
+        assert self.nFlips - firstFlip <= len(self.flipTimes), 'The ring '\
+            'buffer of the FlipRecorder is too small for a trial.'
+        times = self.flipTimes.take(np.arange(firstFlip, offsetFlip+1), mode = 'wrap')
+        intervals = np.diff(times)
+        nFrames = np.maximum(np.rint(intervals/self.frameDur).astype(np.int64), 1)
+        nDropped = nFrames - 1
+
+        nIsiIntervals = onsetFlip - firstFlip
+        nDroppedIsi = int(nDropped[:nIsiIntervals].sum())
+        nFrStimAchieved = int(nFrames[nIsiIntervals:].sum())
+
+        self.nTrials += 1
+        self.nBadTrials += int(nDropped.any())
+        self.nDroppedFrames += int(nDropped.sum())
+        if len(intervals):
+            self.maxInterval = max(self.maxInterval, float(intervals.max()))
+
+        return float(times[nIsiIntervals]), nFrStimAchieved, nDroppedIsi
+
+    def summary(self):
+        """The dropped frames of all trials passed to trialTiming so far."""
+        return dict(nTrials = self.nTrials,
+                    nBadTrials = self.nBadTrials,
+                    nDroppedFrames = self.nDroppedFrames,
+                    maxFrameInterval = self.maxInterval)
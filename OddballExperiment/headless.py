@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Stand-ins for the parts of psychopy.visual, psychopy.event and psychopy.core
+which Oddball and TextInput use, so that they can run without a display:
+
+    backend = headless.Backend(refreshRate = 144)
+    win = backend.visual.Window()
+    myOddball = oddball.Oddball(win, ..., backend = backend)
+    backend.event.pressKeys(['space'], delay = .5)
+    myOddball.instruction()
+
+Time is virtual: flip advances the clock to the next refresh of the
+simulated monitor, getKeys advances it by pollInterval (so loops which poll
+the keyboard without flipping still make progress) and core.wait by the
+time waited. Global keys are dispatched on flip and getKeys. Besides that
+flip does nothing but call the functions of callOnFlip and draw the stimuli
+with autoDraw (which are no-ops), and it stores the wall-clock time of
+every flip, so the Python-side cost of a frame loop can be measured (see
+bench_headless.py).
+
+"""
+
+import math
+import time
+
+import numpy as np
+
+
+class VirtualClock:
+    """Like psychopy.core.Clock, but on the virtual time of a Backend."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._timeAtLastReset = backend.now
+
+    def getTime(self):
+        return self._backend.now - self._timeAtLastReset
+
+    def reset(self, newT = 0.):
+        self._timeAtLastReset = self._backend.now + newT
+
+    def add(self, t):
+        self._timeAtLastReset += t
+
+
+class Stim:
+    """Stands in for every visual stimulus; stores the keyword arguments it
+    is constructed with as attributes."""
+
+    def __init__(self, win, **kwargs):
+        self.win = win
+        self.pos = (0, 0)
+        self.ori = 0.
+        self.text = ''
+        self.status = 0 # NOT_STARTED
+        self._autoDraw = False
+        self.__dict__.update(kwargs)
+
+    @property
+    def autoDraw(self):
+        return self._autoDraw
+
+    @autoDraw.setter
+    def autoDraw(self, value):
+        if value and not self._autoDraw:
+            self.win._toDraw.append(self)
+        elif not value and self._autoDraw:
+            self.win._toDraw.remove(self)
+        self._autoDraw = value
+        self.status = 1 if value else -1 # STARTED or STOPPED
+
+    def draw(self, win = None):
+        pass
+
+
+class Window:
+    """Stands in for psychopy.visual.Window."""
+
+    def __init__(self, backend, size = (800, 600), maxFlips = 2000000, **kwargs):
+        self._backend = backend
+        self.size = size
+        self.units = kwargs.get('units', 'pix')
+        self.monitor = kwargs.get('monitor', 'headless')
+        self._recordFrameIntervals = False
+        self.frameIntervals = [] # like psychopy, while recordFrameIntervals is True
+        self._lastFrameT = None
+        self._toDraw = []
+        self._toCall = []
+
+        # the wall-clock time of every flip, to measure the cost of frame loops
+        self.flipWallTimes = np.zeros(maxFlips)
+        self.nFlips = 0
+
+    @property
+    def recordFrameIntervals(self):
+        return self._recordFrameIntervals
+
+    @recordFrameIntervals.setter
+    def recordFrameIntervals(self, value):
+        self._recordFrameIntervals = value
+        self._lastFrameT = None # the first flip after turning it on only starts an interval
+
+    def flip(self, clearBuffer = True):
+        for stim in self._toDraw:
+            stim.draw()
+        backend = self._backend
+        nRefreshes = 1
+        if backend.dropProbability > 0:
+            while backend.rng.random_sample() < backend.dropProbability:
+                nRefreshes += 1
+        backend.now = (math.floor(backend.now/backend.frameDur + 1e-9) + nRefreshes)*backend.frameDur
+        if self._recordFrameIntervals:
+            if self._lastFrameT is not None:
+                self.frameIntervals.append(backend.now - self._lastFrameT)
+            self._lastFrameT = backend.now
+        backend.event._dispatch()
+        for function, args, kwargs in self._toCall:
+            function(*args, **kwargs)
+        self._toCall = []
+        if self.nFlips < len(self.flipWallTimes):
+            self.flipWallTimes[self.nFlips] = time.perf_counter()
+        self.nFlips += 1
+        return backend.now
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._toCall.append((function, args, kwargs))
+
+    def getActualFrameRate(self, *args, **kwargs):
+        return self._backend.refreshRate
+
+    def getMovieFrame(self, buffer = 'front'):
+        pass
+
+    def saveMovieFrames(self, fileName, *args, **kwargs):
+        pass
+
+    def saveFrameIntervals(self, fileName = None, clear = True):
+        """Like psychopy: the intervals as comma-separated values."""
+        if not fileName:
+            fileName = 'lastFrameIntervals.log'
+        if len(self.frameIntervals):
+            with open(fileName, 'w') as f:
+                f.write(str(self.frameIntervals)[1:-1])
+        if clear:
+            self.frameIntervals = []
+
+    def close(self):
+        pass
+
+
+class Visual:
+    """Stands in for psychopy.visual."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def Window(self, *args, **kwargs):
+        return Window(self._backend, *args, **kwargs)
+
+    ShapeStim = TextStim = ImageStim = BufferImageStim = Stim
+
+
+class Mouse:
+    def __init__(self, win = None, visible = True):
+        self.visible = visible
+    def setVisible(self, visible):
+        self.visible = visible
+
+
+class GlobalKeys:
+    """Stands in for psychopy.event.globalKeys (without modifiers)."""
+
+    def __init__(self):
+        self._funcs = {}
+
+    def add(self, key, func, func_args = (), func_kwargs = None, name = None, **kwargs):
+        # like psychopy, which does not replace a global key
+        if key in self._funcs:
+            raise ValueError('The global key {} is already assigned to a function; '
+                             'remove it first.'.format(key))
+        self._funcs[key] = (func, func_args, func_kwargs or {})
+
+    def remove(self, key, **kwargs):
+        self._funcs.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._funcs
+
+
+class Event:
+    """Stands in for psychopy.event; key presses are scripted with
+    pressKeys."""
+
+    def __init__(self, backend, pollInterval = .001):
+        self._backend = backend
+        self.pollInterval = pollInterval
+        self._keys = [] # (time, key), sorted by time
+        self.Mouse = Mouse
+        self.globalKeys = GlobalKeys()
+
+    def pressKeys(self, keys, delay = 0., interval = .2):
+        """Press keys one after the other, the first after delay seconds."""
+        t0 = self._backend.now + delay
+        self._keys.extend((t0 + i*interval, key) for i, key in enumerate(keys))
+        self._keys.sort()
+
+    def getKeys(self, keyList = None, timeStamped = False):
+        self._backend.now += self.pollInterval
+        self._dispatch()
+        now = self._backend.now
+        keys = []
+        remaining = []
+        for t, key in self._keys:
+            if t <= now and (keyList is None or key in keyList):
+                if timeStamped is False:
+                    keys.append(key)
+                elif timeStamped is True:
+                    keys.append([key, t])
+                else: # timeStamped is a clock
+                    keys.append([key, timeStamped.getTime() - (now - t)])
+            else:
+                remaining.append((t, key))
+        self._keys = remaining
+        return keys
+
+    def clearEvents(self, eventType = None):
+        now = self._backend.now
+        self._keys = [(t, key) for t, key in self._keys if t > now]
+
+    def _dispatch(self):
+        """Call the functions of the global keys pressed so far (like
+        pyglet does during flip and getKeys)."""
+        now = self._backend.now
+        if self.globalKeys._funcs and self._keys and self._keys[0][0] <= now:
+            remaining = []
+            for t, key in self._keys:
+                if t <= now and key in self.globalKeys:
+                    func, args, kwargs = self.globalKeys._funcs[key]
+                    func(*args, **kwargs)
+                else:
+                    remaining.append((t, key))
+            self._keys = remaining
+
+
+class Core:
+    """Stands in for psychopy.core."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.monotonicClock = VirtualClock(backend)
+
+    def Clock(self):
+        return VirtualClock(self._backend)
+
+    def getTime(self):
+        return self._backend.now
+
+    def wait(self, secs, hogCPUperiod = 0.2):
+        self._backend.now += secs
+
+    def quit(self):
+        raise SystemExit()
+
+
+# a recorded change of the port: the virtual time and the new value
+recordDtype = np.dtype([('t', np.float64), ('value', np.uint8)])
+
+
+class ParallelPort:
+    """Stands in for psychopy.parallel.ParallelPort and records every change
+    of the port with the virtual time."""
+
+    def __init__(self, backend, address = 0x0378):
+        self._backend = backend
+        self.value = 0
+        self.changes = [] # (time, value)
+
+    def setData(self, data, t = None):
+        """Set the port to data now (or at the virtual time t)."""
+        self.changes.append((self._backend.now if t is None else t, data))
+        self.value = data
+
+    def readData(self):
+        return self.value
+
+    def getRecording(self):
+        """The changes of the port as an array with dtype recordDtype."""
+        return np.array(self.changes, dtype = recordDtype)
+
+
+class Parallel:
+    """Stands in for psychopy.parallel."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def ParallelPort(self, address = 0x0378):
+        return ParallelPort(self._backend, address)
+
+
+class TriggerPort:
+    """Stands in for triggers.TriggerPort: the port is set back to 0 exactly
+    triggerlen after the pulse in virtual time."""
+
+    def __init__(self, port, triggerlen, **kwargs):
+        self.port = port
+        self.triggerlen = triggerlen
+        self.nPulses = 0
+
+    def pulse(self, signal):
+        self.port.setData(signal)
+        self.port.setData(0, t = self.port._backend.now + self.triggerlen)
+        self.nPulses += 1
+
+    def close(self):
+        pass
+
+    def getPulseWidths(self):
+        return np.full(self.nPulses, self.triggerlen)
+
+    def lastPulseWidth(self):
+        return self.triggerlen if self.nPulses else float('nan')
+
+    def pulseWidthStats(self):
+        if self.nPulses == 0:
+            return dict(n = 0)
+        width = self.triggerlen*1000
+        return dict(n = self.nPulses, mean = width, sd = 0., min = width,
+                    max = width, maxDeviation = 0.)
+
+
+class Backend:
+
+    def __init__(self, refreshRate = 60., pollInterval = .001, parallel = None,
+                 recordTriggers = False, dropProbability = 0., seed = None):
+        """A virtual monitor with refreshRate Hz and the stand-ins for
+        visual, event and core. parallel is the module whose ParallelPort is
+        used for triggers (None: no triggers are sent); with recordTriggers
+        the triggers go to a ParallelPort of the backend instead. Every flip
+        misses a refresh with dropProbability (drawn from a RandomState of
+        its own with seed, so np.random is not touched)."""
+        self.refreshRate = refreshRate
+        self.frameDur = 1./refreshRate
+        self.now = 0. # the virtual time in seconds
+        self.visual = Visual(self)
+        self.event = Event(self, pollInterval = pollInterval)
+        self.core = Core(self)
+        self.parallel = parallel
+        if recordTriggers:
+            self.parallel = Parallel(self)
+            self.TriggerPort = TriggerPort
+        self.dropProbability = dropProbability
+        self.rng = np.random.RandomState(seed)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+"""
+
+import queue
+import threading
+import time
+import weakref
+
+from psychopy import event as psychopyEvent, core as psychopyCore, logging
+
+try:
+    from psychopy.hardware import keyboard
+    havePTB = keyboard.havePTB
+except ImportError:
+    havePTB = False
+
+# the listeners without psychtoolbox of every event module; psychopy.event 
+# raises if a global key is added twice, so escape is registered once per 
+# event module and its callback sets the flag of all of them
+_escapeListeners = weakref.WeakKeyDictionary()
+
+
+def _onEscape(listeners):
+    for listener in list(listeners):
+        listener.escape = True
+
+
+class KeyListener:
+
+    def __init__(self, clock, event = None, core = None, pollInterval = .001):
+        """Collects key presses with timestamps of clock, so that frame loops
+        only have to check the flag escape instead of polling the keyboard.
+
+        With psychtoolbox, the keyboard is read on a background thread, which
+        puts every key press into a queue and sets escape when escape is
+        pressed. Without psychtoolbox, key presses are only dispatched on the
+        main thread (during win.flip and event.getKeys), so escape is
+        registered as a global key of psychopy.event whose callback sets the
+        flag (once per process for all listeners; close removes the
+        listener). event and core are the modules to use (e.g. the stand-ins
+        of a headless.Backend); None uses psychopy.
+        """
+        self.clock = clock
+        self.event = psychopyEvent if event is None else event
+        self.core = psychopyCore if core is None else core
+        self.pollInterval = pollInterval
+        self.escape = False # set as soon as escape is pressed
+        self._pending = [] # keys read by waitKeys after the one it returned
+
+        self._keyboard = None
+        if havePTB and self.event is psychopyEvent:
+            try:
+                self._keyboard = keyboard.Keyboard(clock = clock)
+            except Exception:
+                logging.warn('The keyboard could not be read with '\
+                             'psychtoolbox. Falling back to psychopy.event.')
+
+        if self._keyboard is not None:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target = self._listen, name = 'key_listener', daemon = True)
+            self._thread.start()
+        else:
+            listeners = _escapeListeners.get(self.event)
+            if listeners is None:
+                listeners = _escapeListeners[self.event] = weakref.WeakSet()
+                self.event.globalKeys.add(key = 'escape', func = _onEscape, func_args = (listeners,),
+                                          name = 'keylistener_escape')
+            listeners.add(self)
+
+    def getKeys(self, keyList = None):
+        """Return and remove all key presses so far as [name, time] (only the
+        keys in keyList if keyList is given)."""
+        if self._keyboard is None:
+            keys = [key for key in self._pending if keyList is None or key[0] in keyList]
+            self._pending = []
+            return keys + self.event.getKeys(keyList = keyList, timeStamped = self.clock)
+        keys = []
+        while True:
+            try:
+                key = self._queue.get_nowait()
+            except queue.Empty:
+                return keys
+            if keyList is None or key[0] in keyList:
+                keys.append(key)
+
+    def waitKeys(self, keyList = None):
+        """Block until one of the keys in keyList (any key if keyList is None)
+        or escape is pressed and return it as [name, time]."""
+        if keyList is not None and 'escape' not in keyList:
+            keyList = list(keyList) + ['escape']
+        while not self.escape:
+            if self._keyboard is None:
+                keys = self.getKeys(keyList = keyList)
+                if keys:
+                    self._pending = keys[1:]
+                    return keys[0]
+                # sleeps without hogging the CPU
+                self.core.wait(self.pollInterval, hogCPUperiod = 0)
+            else:
+                key = self._queue.get()
+                if keyList is None or key[0] in keyList:
+                    return key
+        return ['escape', self.clock.getTime()]
+
+    def clearEvents(self):
+        """Discard all key presses so far."""
+        if self._keyboard is None:
+            self._pending = []
+            self.event.clearEvents('keyboard')
+        else:
+            self.getKeys()
+
+    def close(self):
+        """Stop setting escape from the global key (without psychtoolbox);
+        the key stays registered for the other listeners."""
+        if self._keyboard is None:
+            _escapeListeners[self.event].discard(self)
+
+    def _listen(self):
+        while True:
+            for key in self._keyboard.getKeys(waitRelease = False):
+                if key.name == 'escape':
+                    self.escape = True
+                self._queue.put([key.name, key.rt])
+            time.sleep(self.pollInterval)
@@ -11,11 +11,24 @@ Python 3.6
 """
 
 import os
+import threading
+import time
 
-from psychopy import data, visual, logging, gui, core
+import schedule
+
+tLaunch = time.perf_counter()
+
+# the parameters of the schedule which are not entered in the dialog
+scheduleParams = dict(nfr_on2onisi_upper = 150, nfr_on2onisi_lower = 126, 
+                      nFrStim = 6, maxNConsecStan = 31)
+
+exp_dict_dlg = {'Probandennummer':'', 'Sitzung':1, 'nTrials':300, 'pDeviant':.18, 'seed':1, 
+                'scheduleFile':''} # a file written by batch_schedules.py
+
+from psychopy import logging, gui, core
 from psychopy import __version__ as psyvers
 
-import oddball
+import trialwriter
 
 # set up the directory
 _thisDir = os.path.dirname(os.path.abspath(__file__))
@@ -24,13 +37,76 @@ os.chdir(_thisDir)
 
 expClock = core.Clock()
 
+# -----------------------------------------------------------------------------
+# |          Startup in the background                                        |
+# -----------------------------------------------------------------------------
+
+# while the dialog is open, a thread imports psychopy.data (pandas, no GL) 
+# and generates the schedule for the default seed (numpy only). 
+# psychopy.visual (pyglet) and oddball stay on the main thread: pyglet must 
+# not be imported on another thread (e.g. on macOS). The thread starts after 
+# logging, gui and core are imported, so both threads never import the 
+# same module at the same time
+startupTimes = {}
+precomputed = {}
+
+def startInBackground(defaults):
+    t0 = time.perf_counter()
+    from psychopy import data
+    startupTimes['importData'] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    precomputed['schedule'] = schedule.sessionSchedule(
+        defaults['seed'], defaults['nTrials'], defaults['pDeviant'], **scheduleParams)
+    precomputed['schedule']['seed'] = defaults['seed']
+    precomputed['key'] = (defaults['seed'], defaults['nTrials'], defaults['pDeviant'])
+    startupTimes['schedule'] = time.perf_counter() - t0
+
+startupThread = threading.Thread(target = startInBackground, args = (dict(exp_dict_dlg),), 
+                                 name = 'startup', daemon = True)
+startupThread.start()
+
 # -----------------------------------------------------------------------------
 # |          Session Data Dlg                                                 |
 # -----------------------------------------------------------------------------
 
-exp_dict_dlg = {'Probandennummer':'', 'nTrials':300, 'pDeviant':.18, 'seed':1}
-infoDlg = gui.DlgFromDict(exp_dict_dlg, title='Oddball Beispiel', order = ['Probandennummer', 'nTrials', 'seed'])
+tDialog = time.perf_counter()
+infoDlg = gui.DlgFromDict(exp_dict_dlg, title='Oddball Beispiel', order = ['Probandennummer', 'Sitzung', 'nTrials', 'seed'])
 if not infoDlg.OK: core.quit() # user pressed cancel
+tOK = time.perf_counter()
+startupTimes['dialog'] = tOK - tDialog
+
+startupThread.join()
+startupTimes['waitForBackground'] = time.perf_counter() - tOK
+# the time the thread saved after OK
+startupTimes['savedByBackground'] = startupTimes['importData'] + startupTimes['schedule'] \
+    - startupTimes['waitForBackground']
+t0 = time.perf_counter()
+from psychopy import data, visual # pyglet, the stimuli, ...
+import oddball
+startupTimes['import'] = time.perf_counter() - t0
+
+# load the schedule generated in advance for this subject and session (the 
+# sessions of a subject in the file are counted from 1 in the dialog)
+trialSchedule = None
+if exp_dict_dlg['scheduleFile']:
+    assert str(exp_dict_dlg['Probandennummer']).strip().isdigit(), 'The schedules in {} '\
+        'are stored by subject; enter the Probandennummer (a number) to load '\
+        'one.'.format(exp_dict_dlg['scheduleFile'])
+    assert exp_dict_dlg['Sitzung'] >= 1, 'The Sitzung is counted from 1.'
+    trialSchedule = schedule.loadSchedule(exp_dict_dlg['scheduleFile'], 
+                                          int(exp_dict_dlg['Probandennummer']),
+                                          session = exp_dict_dlg['Sitzung'] - 1)
+    # the isis of the file are in frames and must fit nFrStim etc. of this script
+    for param, value in scheduleParams.items():
+        assert trialSchedule['params'][param] == value, 'The schedules in {} '\
+            'were generated with {} = {}, but this script uses {}.'.format(
+                exp_dict_dlg['scheduleFile'], param, trialSchedule['params'][param], value)
+    exp_dict_dlg.update({'seed': trialSchedule['seed'], 
+                         'nTrials': len(trialSchedule['standard']), 
+                         'pDeviant': trialSchedule['params']['pdeviants']})
+elif precomputed.get('key') == (exp_dict_dlg['seed'], exp_dict_dlg['nTrials'], exp_dict_dlg['pDeviant']):
+    # the same schedule Oddball would generate with this seed
+    trialSchedule = precomputed['schedule']
 
 # Add some entries
 exp_dict_dlg.update({'Version_psychopy': psyvers, 'experimentStart': data.getDateStr(format='%d_%m_%y_%H_%M_%S')})
@@ -49,6 +125,7 @@ logDat = logging.LogFile(logfilename,
 # |          Initialising Objects                                             |
 # -----------------------------------------------------------------------------
 
+t0 = time.perf_counter()
 win = visual.Window(
                     [1280*0.7, 1024*0.7], # 70% of the size of the screen in WH205
                     fullscr=True,
@@ -56,6 +133,7 @@ win = visual.Window(
                     monitor='testMonitor',
                     units='cm'
                     )
+startupTimes['window'] = time.perf_counter() - t0
 
 thisExp = data.ExperimentHandler(
                                 name= '',
@@ -64,35 +142,54 @@ thisExp = data.ExperimentHandler(
                                 runtimeInfo=None,
                                 originPath=None,
                                 dataFileName=datfilename,
-                                savePickle=True,
-                                saveWideText=True,
+                                savePickle=False, # the trials are written by trialWriter instead
+                                saveWideText=False,
                                 autoLog=True
                                 )
 
+# appends every trial to datfilename.trials.jsonl as soon as it has ended and 
+# removes it from thisExp, so a crash loses at most the last few trials
+trialWriter = trialwriter.TrialWriter(datfilename + '.trials.jsonl', thisExp, 
+                                      bufferSize = 10, keepEntries = False)
+
 nTrials = exp_dict_dlg['nTrials']
 
 # initialise an Oddball object
+t0 = time.perf_counter()
 myOddball = oddball.Oddball(
         win         = win, 
         expHandler  = thisExp, 
         mydir       = _thisDir, 
         subjectnr   = exp_dict_dlg['Probandennummer'], 
-        sessionnr   = '1', 
+        sessionnr   = str(exp_dict_dlg['Sitzung']), 
         triggerlen  = 0.01,
         ntrials             = nTrials, # number of trials
-        nfr_on2onisi_upper  = 150, # upper bound of isis in frames
-        nfr_on2onisi_lower  = 126, # lower bound of isis in frames
-        nFrStim             = 6, # length of stimulus presentation in frames
+        nfr_on2onisi_upper  = scheduleParams['nfr_on2onisi_upper'], # upper bound of isis in frames
+        nfr_on2onisi_lower  = scheduleParams['nfr_on2onisi_lower'], # lower bound of isis in frames
+        nFrStim             = scheduleParams['nFrStim'], # length of stimulus presentation in frames
         pdeviants           = exp_dict_dlg['pDeviant'], # probability of deviants
-        maxNConsecStan      = 31, # the array that determines whether a stimulus is a deviant or a standard is divided 
+        maxNConsecStan      = scheduleParams['maxNConsecStan'], # the array that determines whether a stimulus is a deviant or a standard is divided 
                             # in pairs, each containing a deviant in first place and a standard or deviant in second place
-                            # max(diffPairsIndeces) > int((maxNConsecStan)/2) the list of pairs will be reshuffled
+                            # at most int(maxNConsecStan/2)-1 pairs w/o a deviant follow each other
         verticesPixStim     = [(-20,-20),(-20,20),(20,20),(20,-20)], # the vertices of the shape in pixels
         trackFrIntervals    = True,
         dataSaveClock       = expClock,
         stopIndxForInstr    = -1, 
-        seed                = exp_dict_dlg['seed'] # make the pseudorandom sequence reproducible
+        seed                = exp_dict_dlg['seed'], # make the pseudorandom sequence reproducible
+        trialSchedule       = trialSchedule,
+        trialWriter         = trialWriter,
+        rasteriseStims      = True, # draw the stimuli from textures rendered once
+        refreshCalibrationFile = os.path.join(_thisDir, 'refresh_calibration.json') # measure the refresh rate only on the first launch
         )
+startupTimes['oddball'] = time.perf_counter() - t0
+
+# the startup time breakdown; everything but importData and the schedule 
+# (which ran during the dialog) adds to the time from OK to the instruction
+startupTimes.update({'oddball_' + part: t for part, t in myOddball.initTimes.items()})
+startupTimes['OKToInstruction'] = time.perf_counter() - tOK
+startupTimes['launchToInstruction'] = time.perf_counter() - tLaunch
+logging.exp('Startup times in s: ' + ', '.join(
+    '{} {:.3f}'.format(part, t) for part, t in startupTimes.items()))
 
 # instruction oddball
 myOddball.instruction()
@@ -106,8 +203,14 @@ myOddball.runOddball(triggerdeviant = 1, triggerstandard = 2, stopIndex = -1,
 myOddball.inputCount()
 
 # save and abort
-thisExp.saveAsWideText(datfilename + '.csv')
+thisExp.nextEntry() # the count as a row of its own
+trialWriter.writeLastEntry()
+trialWriter.close()
+trialwriter.saveAsWideText(datfilename + '.trials.jsonl', datfilename + '.csv')
 thisExp.abort()
+myOddball.keys.close()
+if myOddball.parallel_port_exists:
+    myOddball.trigger.close() # also sets the switch interval back
 win.close()
 
 
@@ -11,12 +11,19 @@ Python 3.6
 """
 
 from psychopy import data, visual, event, core, logging
-from psychopy.constants import (NOT_STARTED, STARTED, STOPPED)
 
 import numpy as np
-import csv
+import time
 
 import textinput
+import schedule
+import triggers
+import frametiming
+import keylistener
+import stimcache
+import screenshots
+import refreshcache
+import trialtable
 
 try:
     from psychopy import parallel
@@ -39,50 +46,110 @@ class Oddball:
                     pdeviants, # probability of deviants
                     maxNConsecStan, # the array that determines whether a stimulus is a deviant or a standard is divided 
                                     # in pairs, each containing a deviant in first place and a standard or deviant in second place
-                                    # max(diffPairsIndeces) > int((maxNConsecStan)/2) the list of pairs will be reshuffled
+                                    # at most int(maxNConsecStan/2)-1 pairs w/o a deviant follow each other
                     verticesPixStim, # the vertices of the shape in pixls
                     trackFrIntervals = True, # whether to track the frame intervals
                     dataSaveClock = None, # a clock for which we'll query for the timing of every trial stored alongside the data
                     stopIndxForInstr = -1,
-                    seed = None
+                    seed = None,
+                    trialSchedule = None, # a schedule generated in advance (see schedule.loadSchedule); 
+                                          # if it is given, the stims, isis and orientations are taken from it
+                    backend = None, # stand-ins for visual, event, core and parallel (e.g. headless.Backend()); 
+                                   # None uses psychopy
+                    trialWriter = None, # a trialwriter.TrialWriter to which every trial is appended 
+                                        # as soon as it has ended
+                    stimClasses = None, # more than two stimulus classes (see schedule.classSequence), the first is 
+                                       # the standard and the second the one to count; each dict may also have 
+                                       # 'ori' and 'vertices'. If it is given, pdeviants and maxNConsecStan are 
+                                       # ignored and the triggers of the classes are sent
+                    rasteriseStims = False, # whether runOddball draws the stimuli from textures rendered 
+                                            # once instead of the ShapeStims (only on a uniform background)
+                    refreshCalibrationFile = None # a json file in which the measured refresh rate is cached 
+                                                  # (see refreshcache); None measures it every time
                     ):
         
+        # the time in s spent on the parts of the construction (see main.py)
+        self.initTimes = {}
+        tPart = time.perf_counter()
+        
         np.random.seed(seed = seed) # if seed is not None, the calls to 
         # np.random will not be (pseudo-)random but produce a reproducible sequence
     
         
+        if backend is None:
+            self.visual, self.event, self.core = visual, event, core
+            parallelModule = parallel if parallel_imported else None
+        else:
+            self.visual, self.event, self.core = backend.visual, backend.event, backend.core
+            parallelModule = backend.parallel
+        
         self.win        = win
         self.thisExp    = expHandler
         self.nFrStim    = nFrStim
         self.triggerlen = triggerlen
         self.trackFrIntervals = trackFrIntervals
+        self.trialWriter = trialWriter
         
-        # check the framerate
-        framerate = win.getActualFrameRate()
-        logging.warn('The framerate is: %d' %framerate)
-        assertWarningTxt = 'The length you set for the presentation of the'\
-            ' stimulus is less than the length for which you send a trigger. '\
-            'This is not possible.'
-        assert self.triggerlen <= self.nFrStim*1/framerate, assertWarningTxt
+        # check the framerate (measured only if it has not been cached yet; 
+        # a cached rate is re-validated during the instruction)
+        self.refreshCalibration = refreshcache.RefreshCalibration(win, refreshCalibrationFile)
+        framerate = self.refreshCalibration.getFrameRate()
+        # keeps the times of the flips in runOddball to detect dropped frames
+        self.flipRecorder = frametiming.FlipRecorder(frameDur = 1/framerate)
+        self._setFrameRate(framerate)
+        self.initTimes['frameRate'], tPart = time.perf_counter() - tPart, time.perf_counter()
         
-        stims = self._stimsList(ntrials, pdeviants, maxNConsecStan)
-        self.isi_list = self._isiList(nfr_on2onisi_lower, nfr_on2onisi_upper, nFrStim, ntrials)
+        self.stimClasses = stimClasses
+        if stimClasses is not None:
+            self.stims = self._classSequence(ntrials, stimClasses)
+            self.isi_list = self._isiList(nfr_on2onisi_lower, nfr_on2onisi_upper, nFrStim, ntrials)
+        elif trialSchedule is None:
+            self.stims = self._stimsList(ntrials, pdeviants, maxNConsecStan)
+            self.isi_list = self._isiList(nfr_on2onisi_lower, nfr_on2onisi_upper, nFrStim, ntrials)
+            myOris = [0.0, 45.0] # one of the stimuli will be turned by 45 degrees
+            np.random.shuffle(myOris) # returns None!
+        else:
+            self.stims = trialSchedule['standard'].tolist()
+            self.isi_list = trialSchedule['isi']
+            myOris = [trialSchedule['deviant_ori'], 45.0-trialSchedule['deviant_ori']]
+            logging.exp('Oddball uses a schedule generated in advance with '\
+                        'seed {}.'.format(trialSchedule.get('seed')))
+        self.initTimes['schedule'], tPart = time.perf_counter() - tPart, time.perf_counter()
         
         # initialize stimuli
-        myOris = [0.0, 45.0] # one of the stimuli will be turned by 45 degrees
-        np.random.shuffle(myOris) # returns None!
-        self.deviant = visual.ShapeStim(win, units = 'pix', vertices=verticesPixStim, lineWidth=5, ori = myOris[0], name = 'oddball_deviant')
-        self.standard = visual.ShapeStim(win, units = 'pix',vertices=verticesPixStim, lineWidth=5, ori = myOris[1], name = 'oddball_standard')
+        if stimClasses is None:
+            stimSpecs = [(verticesPixStim, myOris[0], 'deviant'), (verticesPixStim, myOris[1], 'standard')]
+        else:
+            stimSpecs = [(stimClass.get('vertices', verticesPixStim), stimClass.get('ori', 0.0), stimClass['name'])
+                         for stimClass in stimClasses]
+        shapes = [self.visual.ShapeStim(win, units = 'pix', vertices=vertices, lineWidth=5, ori = ori, name = 'oddball_' + name)
+                  for vertices, ori, name in stimSpecs]
+        self.classShapes = shapes
+        if stimClasses is None:
+            self.deviant, self.standard = shapes
+        else:
+            self.standard, self.deviant = shapes[:2]
+        # the stimuli of the frame loop, index with the entries of self.stims
+        if rasteriseStims:
+            # rendered once into textures, so each frame draws a single quad (see stimcache)
+            self.stimCache = stimcache.StimCache(win, visual = self.visual)
+            self.classStims = [self.stimCache.get(vertices, ori = ori, lineWidth = 5, name = 'oddball_' + name)
+                               for vertices, ori, name in stimSpecs]
+        else:
+            self.classStims = shapes
+        self.initTimes['stimuli'], tPart = time.perf_counter() - tPart, time.perf_counter()
         
-        # create a list of dicts with isi and stimtype for every trial
-        trialList = []
-        for i,j in zip(stims, self.isi_list):
-            trialList.append(dict(standard = i, isi = j))
-        # initialize a TrialHandler object
-        self.trialHandler = data.TrialHandler(
-                    trialList= trialList,
-                    nReps = 1,
-                    method='sequential',
+        # the conditions of every trial as columns (one array each); the data 
+        # of the trials are added as columns, too
+        conditions = dict(standard = self.stims, isi = self.isi_list)
+        if stimClasses is not None:
+            classNames = np.array([stimClass['name'] for stimClass in stimClasses], dtype = object)
+            conditions = dict(standard = (np.asarray(self.stims) == 0).astype(int), 
+                              stimclass = classNames[np.asarray(self.stims)], 
+                              isi = self.isi_list)
+        # initialize the loop over the trials (like a TrialHandler)
+        self.trialHandler = trialtable.TrialTable(
+                    conditions,
                     extraInfo={'deviant_ori': self.deviant.ori}, # store which shape was the deviant
                     name='trialhandler_oddball'
                     )
@@ -91,10 +158,14 @@ class Oddball:
         # Initialise a port
         self.parallel_port_exists = False # initialized with False, so that if the parallel port 
         #   cannot be initialised, I later query this variable and avoid running code that would through error without a parallel port
-        if parallel_imported:
+        if parallelModule is not None:
             try:
-                self.port = parallel.ParallelPort(address=0x0378)
+                self.port = parallelModule.ParallelPort(address=0x0378)
                 self.parallel_port_exists = True
+                # sets the port back to 0 triggerlen after every trigger
+                TriggerPort = triggers.TriggerPort if backend is None else \
+                    getattr(backend, 'TriggerPort', triggers.TriggerPort)
+                self.trigger = TriggerPort(self.port, self.triggerlen)
             except Exception:
                 logging.warn('Es konnte kein parallel port initialisiert werden! Es werden keine Trigger gesendet.')
         
@@ -105,19 +176,22 @@ class Oddball:
             'links sehen, präsentiert wird. Die Form, die Sie unten '\
             'rechts sehen, sollen sie nicht beachten.\n'\
             '\nDrücken Sie die Leertaste, um die ersten {} Formen '\
-            'zu sehen.'.format(len(trialList) if stopIndxForInstr is -1 else stopIndxForInstr)
-        self.instructionTxt = visual.TextStim(
+            'zu sehen.'.format(self.trialHandler.nTotal if stopIndxForInstr is -1 else stopIndxForInstr)
+        self.instructionTxt = self.visual.TextStim(
             win, height =.08, units='norm', pos = (0,0.5), wrapWidth = 1.5,
             text = instrString, name = 'instruction_oddball')
         
+        # a clock for timing and a mouse to hide the mouse during the trial
+        self.dataSaveClock = self.core.Clock() if dataSaveClock is None else dataSaveClock # this clock is for storing the time of each trial
+        self.mouse = self.event.Mouse(win = self.win)
+        
+        # collects the key presses, so that the frame loops only have to 
+        # check keys.escape
+        self.keys = keylistener.KeyListener(self.dataSaveClock, event = self.event, core = self.core)
+        
         # an object to run a routine which allows entering numbers 
         # without a dlg gui, but directly on screen
-        self.textInput = textinput.TextInput(self.win)
-        
-        # clocks for timing and a mouse to hide the mouse during the trial
-        self.trialClock = core.Clock() # this clock is for the timing of triggers
-        self.dataSaveClock = core.Clock() if dataSaveClock is None else dataSaveClock # this clock is for storing the time of each trial
-        self.mouse = event.Mouse(win = self.win)
+        self.textInput = textinput.TextInput(self.win, backend = backend, keys = self.keys)
     
     def runOddball(self, triggerdeviant, triggerstandard, stopIndex, 
                    waitbeforecontinue = 2):
@@ -135,78 +209,97 @@ class Oddball:
         
         if self.trackFrIntervals: self.win.recordFrameIntervals = True
         
-        if self.parallel_port_exists and self.port.status == STARTED: # this should never equal true!
-            logging.error('port.status should not be STARTED at this point.')
-            self.port.status = STOPPED
-            self.port.setData(0) # set the trigger back to 0
-        
         # centre the stimuli in the middle
-        self.deviant.pos = self.standard.pos = (0,0)
+        for stim in self.classStims:
+            stim.pos = (0,0)
         # add the start time to the trial handler
         self.trialHandler.addData('starttime_oddball', 
                                   data.getDateStr(format='%H_%M_%S'))
     
+        # the whole session compiled to one row per trial with the frames 
+        # of onset and offset and the trigger code
+        if self.stimClasses is None:
+            triggerCodes = (triggerdeviant, triggerstandard)
+        else:
+            triggerCodes = [stimClass['trigger'] for stimClass in self.stimClasses]
+        frameSchedule = schedule.compileFrameSchedule(
+            self.stims, self.isi_list, self.nFrStim, triggerCodes)
+        stimsByType = self.classStims # index with frameSchedule['stimclass']
+        
+        # the flip times are measured with core.monotonicClock, the data 
+        # are stored with the times of dataSaveClock
+        flipClockOffset = self.dataSaveClock.getTime() - self.core.monotonicClock.getTime()
+        runFirstFlip = self.flipRecorder.nFlips
+        
         for thisTrial in self.trialHandler:
             
             # ------------------------------------------------
             # |          Prepare to start trial              |
             # ------------------------------------------------
-            frameN = -1 # the first frame in the trial has the index 0
-            on2On_isi = thisTrial['isi'] # this is the length of the trial in frames
-            off2On_isi = on2On_isi-self.nFrStim # this is the n of frames 
-                                                # between the offset of one 
-                                                # stimulus and the onset of the next stimulus
-            if thisTrial['standard']: # TrialPair['standard'] is 0 or 1 which is the same as False or True
-                triggerSignal = triggerstandard
-                stim = self.standard
-            else:
-                triggerSignal = triggerdeviant
-                stim = self.deviant
-            stim.status = NOT_STARTED
-            continueRoutine = True
+            frameN, onsetFr, offsetFr, stimClass, triggerSignal = \
+                frameSchedule[self.trialHandler.thisN].tolist()
+            stim = stimsByType[stimClass]
+            # the indeces of the flips of this trial in flipRecorder
+            trialFirstFlip = self.flipRecorder.nFlips
+            onsetFlip = trialFirstFlip + onsetFr - frameN
+            offsetFlip = trialFirstFlip + offsetFr - frameN
             
             # --------------------------------------------------
             # |             Start Trial                        |
             # --------------------------------------------------
-            while continueRoutine:
-                frameN = frameN + 1 # number of completed frames (so 0 is the first frame)
+            while frameN <= offsetFr:
                 
                 # Stimulus updates
-                if frameN >= off2On_isi and stim.status == NOT_STARTED:
+                if frameN == onsetFr:
                     if self.parallel_port_exists:
                         # callOnFlip(function, *args, **kwargs): Call a function immediately AFTER the next .flip() command.
                         self.win.callOnFlip(self._sendTrigger, triggerSignal) 
-                    stim.frameNStart = frameN # exact frame index
                     stim.tStart = self.dataSaveClock.getTime()
                     stim.autoDraw = True
-                
-                if self.parallel_port_exists and self.port.status == STARTED and self.trialClock.getTime() >= 0:
-                    self.port.status = STOPPED
-                    self.port.setData(0) # set the trigger back to 0
+                elif frameN == offsetFr:
+                    stim.autoDraw = False
                 
                 # check for quit (the Esc key)
-                if event.getKeys(keyList=['escape']):
-                    core.quit()
-                
-                if stim.status == STARTED and frameN >= (stim.frameNStart + self.nFrStim):
-                    stim.autoDraw = False
-                    continueRoutine = False
+                if self.keys.escape:
+                    self.core.quit()
                 
-                self.win.flip() # makes all changes visible
+                self.flipRecorder.record(self.win.flip()) # makes all changes visible
+                frameN += 1 # the frame of the session that is drawn next
             
             self.trialHandler.addData('tPresentation', stim.tStart)
+            # the isi starts with the last flip of the previous trial
+            tOnsetFlip, nFrStimAchieved, nDroppedIsi = self.flipRecorder.trialTiming(
+                max(trialFirstFlip-1, runFirstFlip), onsetFlip, offsetFlip)
+            self.trialHandler.addData('tOnsetFlip', tOnsetFlip + flipClockOffset)
+            self.trialHandler.addData('nFrStimAchieved', nFrStimAchieved)
+            self.trialHandler.addData('nDroppedIsi', nDroppedIsi)
+            if self.parallel_port_exists and self.trigger.nPulses > 0:
+                # the trigger of this trial has been set back to 0 during the presentation
+                self.trialHandler.addData('triggerWidth', self.trigger.lastPulseWidth())
             # indicates to the ExperimentHandler that the current trial has 
             # ended and so further addData() calls correspond to the next trial
             self.thisExp.nextEntry() 
+            if self.trialWriter is not None:
+                # only buffers the entry; it is written on a thread of its own
+                self.trialWriter.writeLastEntry()
             
             # if you want to stop the runOddball function at some index to collect responses, you can use stopIndex
             if self.trialHandler.thisN == stopIndex:
                 break
         
+        if self.trialWriter is not None:
+            self.trialWriter.flush() # the trials of this run are on disk
+        
+        logging.exp('Dropped frames in the Oddball so far: {}'.format(
+            self.flipRecorder.summary()))
+        logging.exp('Timing of the trials by class (standard): {}'.format(
+            self.trialHandler.summary(['nFrStimAchieved', 'nDroppedIsi'], by = 'standard')))
+        if self.parallel_port_exists:
+            logging.exp('Achieved trigger pulse widths in ms: {}'.format(
+                self.trigger.pulseWidthStats()))
+        
         if waitbeforecontinue > 0:
-            # I am not sure but I hope that hogCPUperiod = waitbeforecontinue 
-            # will make sure that the last trigger is set back to 0
-            core.wait(waitbeforecontinue) # if you don't wait here, the 
+            self.core.wait(waitbeforecontinue) # if you don't wait here, the 
             # presentation of the last stimulus will be directly followed by 
             # the next routine => in the case of msvr, win will be instantly closed down
         
@@ -218,6 +311,11 @@ class Oddball:
             'Bestätigen Sie Ihre Eingabe mit Enter.')
         self.thisExp.addData('subj_count_oddb', answer)
     
+    def frameTimingSummary(self):
+        """Trials, trials with dropped frames, dropped frames and the longest 
+        frame interval of all runs of runOddball so far."""
+        return self.flipRecorder.summary()
+    
     def getIsiFrList(self): 
         return self.isi_list
     
@@ -231,112 +329,99 @@ class Oddball:
         self.mouse.setVisible(False) # hide the mouse
         self.deviant.pos=(-100, -100) # in pixel
         self.standard.pos=(100, -100) # in pixel
-        if event.getKeys(['escape']):
-            core.quit()
-        event.clearEvents()
+        if self.keys.escape:
+            self.core.quit()
+        self.keys.clearEvents()
         for i in [self.instructionTxt, self.deviant, self.standard]:
             i.draw()
         self.win.flip()
         
         if captureScreenshot: self.win.getMovieFrame()
         
-        continueRoutine = True
-        while continueRoutine:
-            # check for quit (the Esc key) and space
-            if event.getKeys(['escape']):
-                core.quit()
-            elif event.getKeys(['space']):
-                continueRoutine = False
+        # while the instruction is read, keep flipping it to re-validate a 
+        # cached refresh rate (this has to be done on the main thread)
+        pressed = []
+        while self.refreshCalibration.needsValidation and not pressed and not self.keys.escape:
+            for i in [self.instructionTxt, self.deviant, self.standard]:
+                i.draw()
+            rate = self.refreshCalibration.recordFlip(self.win.flip())
+            if rate is not None and abs(rate - self.framerate) > self.refreshCalibration.tolerance:
+                # the cached rate was wrong: check the frames again with the measured one
+                self._setFrameRate(rate)
+            pressed = self.keys.getKeys(['space'])
+        
+        # wait for space (or the Esc key to quit)
+        if self.keys.escape or (not pressed and self.keys.waitKeys(['space'])[0] == 'escape'):
+            self.core.quit()
+    
+    def _setFrameRate(self, framerate):
+        # everything which depends on the duration of a frame
+        self.framerate = framerate
+        logging.warn('The framerate is: %d' %framerate)
+        assertWarningTxt = 'The length you set for the presentation of the'\
+            ' stimulus is less than the length for which you send a trigger. '\
+            'This is not possible.'
+        assert self.triggerlen <= self.nFrStim*1/framerate, assertWarningTxt
+        self.flipRecorder.frameDur = 1/framerate
     
     def reminder(self):
         self.mouse.setVisible(False) # hide the mouse
         self.deviant.pos=(0, 0) # in pixel
-        if event.getKeys(['escape']):
-            core.quit()
-        event.clearEvents()
+        if self.keys.escape:
+            self.core.quit()
+        self.keys.clearEvents()
         self.instructionTxt.text = 'Zur Erinnerung sehen Sie unten noch '\
             'einmal die Form, die Sie zählen müssen. '\
             'Mit der Leertaste beginnen Sie die zweite Hälfte.'
         for i in [self.instructionTxt, self.deviant]:
             i.draw()
         self.win.flip()
-        continueRoutine = True
-        while continueRoutine:
-            # check for quit (the Esc key) and space
-            if event.getKeys(['escape']):
-                core.quit()
-            elif event.getKeys(['space']):
-                continueRoutine = False
+        
+        # wait for space (or the Esc key to quit)
+        if self.keys.waitKeys(['space'])[0] == 'escape':
+            self.core.quit()
     
     def _sendTrigger(self, signal): # can only be called from within the class
-        self.port.status = STARTED
-        self.port.setData(signal)
-        self.trialClock.reset()
-        self.trialClock.add(self.triggerlen)
+        self.trigger.pulse(signal)
     
     def _stimsList(self, ntrials, pdeviants, maxNConsecStan):
-        #        
-        # draw indices for deviants: trials are grouped into pairs; within
-        #   these pairs, the first is always a standard to avoid that multiple 
-        #   deviants following each other (0 is deviant, 1 is standard)
-        assert ntrials%2 == 0, 'The number of deviants should be divisible by 2'
-        assert (ntrials*pdeviants).is_integer(), "ntrials*pdeviants must "\
-            "return an integer (this warning could be missleading because of "\
-            "python's imprecise representation)"
-        
-        # there are (ntrials/2)*(pdeviants*2) pairs with standards and deviants (1, 0) 
-        # and ntrials/2*(1-(pdeviants*2)) pairs w/o a deviant (1, 1)
-        pairsStims = int(ntrials*pdeviants)*[(1, 0)] + int((ntrials/2)*(1-(pdeviants*2)))*[(1, 1)]
-        
-        h =0
-        while True:
-            h +=1
-            np.random.shuffle(pairsStims) # returns None; shuffles the original list
-            indecesPairs = [-1]+[i for i, e in enumerate(pairsStims) if e == (1,0)]+[len(pairsStims)] # the list of indeces plus its ends -1 and len(pairsStims) = 150
-            diffPairsIndeces = [t - s for s, t in zip(indecesPairs, indecesPairs[1:])]
-            if max(diffPairsIndeces) <= int((maxNConsecStan)/2):
-                break
-            elif h > 50:
-                print('Had to re-shuffle too often.')
-                core.quit()
-        logging.warn('Shuffling List %s times' %(h))
-        
-        stims=[]
-        for i in pairsStims:
-            for j in i:
-                stims.append(j)
+        # trials are grouped into pairs; within these pairs, the first is 
+        #   always a standard to avoid that multiple deviants following each 
+        #   other (0 is deviant, 1 is standard); see schedule.stimsList
+        stims = schedule.stimsList(ntrials, pdeviants, maxNConsecStan)
         logging.exp('n deviants in the stims list for Oddball: ' + str(stims.count(0)))
         
         return stims
     
+    def _classSequence(self, ntrials, stimClasses):
+        # the first class is the standard; see schedule.classSequence
+        stims = schedule.classSequence(ntrials, stimClasses).tolist()
+        logging.exp('n trials of every class in the stims list for Oddball: ' + str(
+            {stimClass['name']: stims.count(c) for c, stimClass in enumerate(stimClasses)}))
+        
+        return stims
+    
     def _isiList(self, nfr_on2onisi_lower, nfr_on2onisi_upper, nFrStim, ntrials):
         
         # draw ntrials random integers from the “discrete uniform” distribution of the specified dtype in the “half-open” interval [low, high). 
-        assert nfr_on2onisi_lower > nFrStim, 'The minimum onset to onset isi must be longer than the presentation of a stimulus.'
-        framesIsi_list = np.random.randint(nfr_on2onisi_lower, nfr_on2onisi_upper+1, size = ntrials) 
+        framesIsi_list = schedule.isiList(nfr_on2onisi_lower, nfr_on2onisi_upper, nFrStim, ntrials)
         logging.exp('Mean value of the isi_list in Oddball: ' + str(np.mean(framesIsi_list)))
         
         return framesIsi_list
     
-    def drawStimForScreenshot(self):
+    def drawStimForScreenshot(self, fn = 'testdata/stimuli_cropped{}.png'):
+        """Screenshots of every stimulus (deviant and standard or the 
+        classes) and of the empty screen, cropped to the stimuli and framed 
+        in black; fn is formatted with the n of the screenshot."""
         # centre the stimuli in the middle
-        self.deviant.pos = self.standard.pos = (0,0)
-        
-        # screenshot deviant
-        self.deviant.draw()
-        self.win.flip()
-        self.win.getMovieFrame()
-        
-        # screenshot standard
-        self.standard.draw()
-        self.win.flip()
-        self.win.getMovieFrame()
-        
-        # screenshot empty
-        self.win.flip()
-        self.win.getMovieFrame()
+        for stim in self.classShapes:
+            stim.pos = (0,0)
         
-        self.saveScreenshot(fn = 'testdata/stimuli.png')
+        # drawn offscreen and kept as arrays, only the final images are written
+        frames = [screenshots.renderFrame(self.win, [stim]) for stim in self.classShapes]
+        frames.append(screenshots.renderFrame(self.win, [])) # screenshot empty
+        frames = [screenshots.addFrame(frame) for frame in screenshots.cropToContent(frames)]
+        screenshots.saveImages(frames, [fn.format(i) for i in range(len(frames))])
         
     
     def saveScreenshot(self, fn = 'testdata/oddballScreenshot.png'):
@@ -347,12 +432,11 @@ class Oddball:
     
     
     def saveTrialList(self, fn = 'testdata/oddballTrialList.csv'):
-        trialList = self.trialHandler.trialList
-        keys = trialList[0].keys()
-        with open(fn, 'w', newline='') as output_file:
-            dict_writer = csv.DictWriter(output_file, keys)
-            dict_writer.writeheader()
-            dict_writer.writerows(trialList)
+        self.trialHandler.saveAsText(fn, names = self.trialHandler.conditionNames)
     
+    def saveTrialData(self, fn = 'testdata/oddballTrialData.npz'):
+        """The conditions and the data of all trials as columns (see 
+        trialtable.loadNpz)."""
+        self.trialHandler.saveAsNpz(fn)
 
 
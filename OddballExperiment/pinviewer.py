@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Python 3.6
+
+Shows the state of the pins of a (simulated) parallel port biosemi style in
+a plot which runs in a process of its own, so the stimulus process never
+has to spin a GUI event loop.
+
+The transitions of the port are passed through a memory-mapped file: a
+counter of the transitions so far followed by a ring buffer of (time, value)
+entries; the times are time.time() of the stimulus process. PinViewer.send
+writes the entry and increments the counter; the viewer process (this file
+run as a script) reads the new entries and redraws at its own rate.
+
+"""
+
+import atexit
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+transitionDtype = np.dtype([('t', np.float64), ('value', np.uint8)])
+headerSize = 8 # the counter (int64)
+
+
+def _openBuffer(fn, size, mode):
+    counter = np.memmap(fn, dtype = np.int64, mode = mode, shape = (1,))
+    transitions = np.memmap(fn, dtype = transitionDtype, mode = mode,
+                            offset = headerSize, shape = (size,))
+    return counter, transitions
+
+
+class PinViewer:
+
+    def __init__(self, timeinterval = 10, datapoints = 600, refreshRate = 20, size = 4096):
+        """Start the viewer process, which plots the last timeinterval
+        seconds (datapoints columns) refreshRate times per second. size is
+        the n of transitions the ring buffer holds; the viewer misses
+        transitions if there are more than that between two redraws."""
+        fd, self.fn = tempfile.mkstemp(suffix = '.pins')
+        with os.fdopen(fd, 'wb') as f:
+            f.truncate(headerSize + size*transitionDtype.itemsize)
+        self.size = size
+        self._counter, self._transitions = _openBuffer(self.fn, size, 'r+')
+
+        self.process = subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), self.fn, str(size),
+            str(timeinterval), str(datapoints), str(refreshRate)])
+        # like the plot in the stimulus process did, the viewer ends with it
+        atexit.register(self.close)
+
+    def send(self, value):
+        """Tell the viewer that the port was set to value now."""
+        n = self._counter[0]
+        # the wall clock, because it is the only clock which python guarantees
+        # to be the same in the viewer process (the reference point of
+        # perf_counter and monotonic is undefined, e.g. per process)
+        self._transitions[n % self.size] = (time.time(), value)
+        self._counter[0] = n + 1 # only now the viewer reads the entry
+
+    def close(self):
+        if self.process.poll() is not None and not os.path.exists(self.fn):
+            return # already closed
+        self.process.terminate()
+        self.process.wait()
+        del self._counter, self._transitions
+        os.remove(self.fn)
+
+
+def runViewer(fn, size, timeinterval, datapoints, refreshRate):
+    """The viewer process."""
+    from matplotlib import pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    counter, transitions = _openBuffer(fn, size, 'r')
+    nRead = 0
+
+    timeperpoint = timeinterval/datapoints
+    bits = np.arange(8)[:, None]
+
+    # the times and values of the transitions; the first entry is the
+    # state before the plotted interval
+    times = np.array([-np.inf])
+    values = np.array([0], dtype = np.uint8)
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    pinplot = ax.imshow(np.zeros((8, datapoints), dtype = np.uint8), aspect = 'auto',
+                        interpolation = 'none', cmap = plt.cm.gray, vmin = 0, vmax = 1,
+                        extent = (-timeinterval, 0, 9.5, 1.5))
+    ax.set_xlabel('time [s]')
+    ax.set_ylabel('pin')
+
+    def update(frame):
+        nonlocal nRead, times, values
+
+        nWritten = int(counter[0])
+        if nWritten > nRead:
+            new = transitions.take(np.arange(max(nRead, nWritten - size), nWritten), mode = 'wrap')
+            times = np.concatenate((times, new['t']))
+            values = np.concatenate((values, new['value']))
+            nRead = nWritten
+
+        # forget the transitions before the plotted interval (but the last one)
+        now = time.time() # the clock of send
+        first = max(np.searchsorted(times, now - timeinterval) - 1, 0)
+        times, values = times[first:], values[first:]
+
+        # the value of the port at every column and its bits as rows
+        columnTimes = now - timeinterval + np.arange(datapoints)*timeperpoint
+        columnValues = values[np.searchsorted(times, columnTimes, side = 'right') - 1]
+        pinplot.set_data((columnValues[None, :] >> bits) & 1)
+        return pinplot,
+
+    animation = FuncAnimation(fig, update, interval = 1000/refreshRate, blit = True,
+                              cache_frame_data = False)
+    plt.show()
+    return animation
+
+
+if __name__ == '__main__':
+    runViewer(sys.argv[1], int(sys.argv[2]), float(sys.argv[3]),
+              int(sys.argv[4]), float(sys.argv[5]))
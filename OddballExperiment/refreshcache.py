@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Caches the measured refresh rate of the monitor on disk, so it does not have
+to be measured (seconds of flipping) every time the experiment starts:
+
+    calibration = refreshcache.RefreshCalibration(win, 'refresh_calibration.json')
+    framerate = calibration.getFrameRate() # measured only on the first launch
+
+The rate is stored per monitor, resolution and graphics driver together with
+the sd of the frame durations. A cached rate is re-validated while the
+instruction is on the screen: Oddball.instruction flips the (unchanged)
+instruction until validationFrames frame durations have been recorded with
+recordFlip, which then compares them to the cached rate and updates the
+file; Oddball then uses the measured rate. This cannot run on a thread of
+its own, because the window can only be flipped on the thread which
+created it.
+
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from psychopy import logging
+
+try:
+    from pyglet.gl import gl_info
+except Exception: # no OpenGL (e.g. headless)
+    gl_info = None
+
+
+def calibrationKey(win):
+    """monitor name|resolution|graphics driver"""
+    monitor = getattr(win.monitor, 'name', None) or str(win.monitor)
+    if gl_info is not None:
+        try:
+            driver = '{} {} {}'.format(gl_info.get_vendor(), gl_info.get_renderer(),
+                                       gl_info.get_version())
+        except Exception:
+            driver = 'unknown'
+    else:
+        driver = 'unknown'
+    return '{}|{}x{}|{}'.format(monitor, int(win.size[0]), int(win.size[1]), driver)
+
+
+def rateFromFlips(flipTimes):
+    """The refresh rate and the sd of the frame durations (s) from the times
+    of consecutive flips; frame durations more than 1.5 times the median
+    (dropped frames) are ignored."""
+    frameDurs = np.diff(flipTimes)
+    frameDurs = frameDurs[frameDurs < 1.5*np.median(frameDurs)]
+    return 1/frameDurs.mean(), frameDurs.std()
+
+
+class RefreshCalibration:
+
+    def __init__(self, win, fn = None, nFrames = 120, validationFrames = 120,
+                 tolerance = .5):
+        """fn is the json file of the cache; if it is None, nothing is
+        cached and the rate is measured with win.getActualFrameRate() like
+        before. A cached rate which deviates from the re-validation by more
+        than tolerance Hz is logged as a warning and replaced."""
+        self.win = win
+        self.fn = fn
+        self.nFrames = nFrames
+        self.validationFrames = validationFrames
+        self.tolerance = tolerance
+        self.key = calibrationKey(win)
+        self.entry = self._load().get(self.key) if fn is not None else None
+        self._flipTimes = []
+
+    @property
+    def needsValidation(self):
+        """Whether recordFlip still wants frames (only for a cached rate)."""
+        return self.fn is not None and self.entry is not None and \
+            not self.entry.get('validated', False)
+
+    def getFrameRate(self):
+        """The cached rate or, if there is none, the measured one."""
+        if self.fn is None:
+            return self.win.getActualFrameRate()
+        if self.entry is None:
+            rate, frameDurSd = self.measure()
+            self._store(rate, frameDurSd, validated = True)
+            logging.exp('Measured the refresh rate {:.3f} Hz (sd of the frame '
+                        'durations {:.3f} ms).'.format(rate, frameDurSd*1000))
+        else:
+            logging.exp('Cached refresh rate for {}: {:.3f} Hz (measured {}).'.format(
+                self.key, self.entry['rate'], self.entry['measured']))
+        return self.entry['rate']
+
+    def measure(self, nWarmUpFrames = 10):
+        """Flip nFrames times and return the rate and the sd of the frame
+        durations."""
+        for _ in range(nWarmUpFrames):
+            self.win.flip()
+        flipTimes = [self.win.flip() for _ in range(self.nFrames + 1)]
+        return rateFromFlips(flipTimes)
+
+    def recordFlip(self, t):
+        """Record the time of a flip during the instruction; after
+        validationFrames flips the cached rate is validated and the measured
+        rate is returned (None before)."""
+        self._flipTimes.append(t)
+        if len(self._flipTimes) > self.validationFrames:
+            rate, frameDurSd = rateFromFlips(self._flipTimes)
+            self._flipTimes = []
+            if abs(rate - self.entry['rate']) > self.tolerance:
+                logging.warn('The refresh rate is {:.3f} Hz, but {:.3f} Hz was '
+                             'cached for {}.'.format(rate, self.entry['rate'], self.key))
+            self._store(rate, frameDurSd, validated = True)
+            return rate
+
+    def _store(self, rate, frameDurSd, validated):
+        self.entry = dict(rate = float(rate), frameDurSd = float(frameDurSd),
+                          measured = time.strftime('%Y-%m-%d %H:%M:%S'),
+                          validated = validated)
+        cache = self._load()
+        cache[self.key] = dict(self.entry, validated = False) # re-validate on the next launch
+        tmpFn = self.fn + '.tmp'
+        with open(tmpFn, 'w') as f:
+            json.dump(cache, f, indent = 1)
+        os.replace(tmpFn, self.fn)
+
+    def _load(self):
+        try:
+            with open(self.fn) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
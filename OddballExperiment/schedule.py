@@ -0,0 +1,444 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Generation of the trial sequences for the Oddball. Nothing in here needs
+psychopy or a window, so schedules can also be generated headless.
+
+"""
+
+import json
+
+import numpy as np
+
+
+def stimsList(ntrials, pdeviants, maxNConsecStan):
+    """Return the list of stimulus types for ntrials trials (0 is deviant,
+    1 is standard).
+
+    The trials are grouped into pairs; within these pairs, the first is
+    always a standard to avoid that multiple deviants follow each other.
+    There are ntrials*pdeviants pairs with a deviant (1, 0) and the rest are
+    pairs w/o a deviant (1, 1). Between two deviant pairs (and before the
+    first and after the last one) there may be at most
+    int(maxNConsecStan/2)-1 pairs w/o a deviant.
+
+    Instead of reshuffling the pairs until this constraint holds, the
+    number of (1, 1) pairs in each gap is drawn directly (see _fillGaps):
+    every way to distribute the pairs over the gaps has the same
+    probability, i.e. the sequences are drawn uniformly from all sequences
+    which hold the constraint, like a reshuffle until the constraint holds
+    would. The random numbers come from np.random, i.e. np.random.seed makes
+    it reproducible.
+    """
+    assert ntrials%2 == 0, 'The number of deviants should be divisible by 2'
+    assert (ntrials*pdeviants).is_integer(), "ntrials*pdeviants must "\
+        "return an integer (this warning could be missleading because of "\
+        "python's imprecise representation)"
+
+    nDevPairs = int(ntrials*pdeviants)
+    nStanPairs = int((ntrials/2)*(1-(pdeviants*2)))
+    nGaps = nDevPairs + 1 # the gaps before, between and after the deviant pairs
+    maxGap = int((maxNConsecStan)/2) - 1 # max n of (1, 1) pairs in one gap
+    assert maxGap >= 0 and nStanPairs <= nGaps*maxGap, 'With these '\
+        'parameters there is no sequence in which at most maxNConsecStan '\
+        'standards follow each other.'
+
+    gaps = _fillGaps(nStanPairs, [maxGap]*nGaps)
+
+    # the index of every deviant pair is the number of pairs in front of it
+    indecesDevPairs = np.cumsum(gaps[:-1], dtype=np.int64) + np.arange(nDevPairs)
+    stims = np.ones(ntrials, dtype=np.int64)
+    stims[2*indecesDevPairs + 1] = 0
+
+    return stims.tolist()
+
+
+def _fillGaps(nItems, capacities):
+    """Put nItems items into len(capacities) gaps, at most capacities[j]
+    into gap j, and return the n of items in every gap (a list). Every
+    possible filling has the same probability.
+
+    If every gap j got x items independently with a probability proportional
+    to theta**x (0 <= x <= capacities[j]), every filling with nItems items
+    would have the probability theta**nItems / const, i.e. given the total,
+    the fillings are uniform, whatever theta is. The gaps are the leaves of a
+    binary tree and every node has the distribution of the n of items in its
+    gaps, the convolution of the distributions of its two children. From the
+    root (nItems items) down, the items of a node are split between its
+    children with a probability proportional to the product of the
+    probabilities of the two parts; this is done for all nodes of a level at
+    once. theta is chosen so that nItems is the mean (see _tilt), which keeps
+    the probabilities that matter far from the limits of floats. This is
+    O(nGaps*maxCapacity*log(nGaps)) in time and memory.
+    """
+    capacities = np.asarray(capacities, dtype=np.int64).reshape(-1)
+    nGaps = len(capacities)
+    total = int(capacities.sum())
+    assert 0 <= nItems <= total, 'The items do not fit into the gaps.'
+    if nItems == 0 or nItems == total:
+        return (capacities if nItems else 0*capacities).tolist()
+
+    # the leaves, padded to a power of two with gaps of capacity 0
+    nLeaves = 1 << int(np.ceil(np.log2(nGaps)))
+    caps = np.zeros(nLeaves, dtype=np.int64)
+    caps[:nGaps] = capacities
+    x = np.arange(caps.max() + 1)
+    logWeights = np.where(x <= caps[:, None], x*_tilt(nItems, capacities), -np.inf)
+    probs = np.exp(logWeights - logWeights.max(axis=1, keepdims=True))
+    levels = [(probs/probs.sum(axis=1, keepdims=True), caps)]
+    while len(levels[-1][1]) > 1:
+        probs, caps = levels[-1]
+        width = probs.shape[1]
+        nFFT = 1 << (2*width - 2).bit_length() # a power of two >= 2*width - 1
+        spectra = np.fft.rfft(probs, nFFT, axis=1)
+        probs = np.fft.irfft(spectra[0::2]*spectra[1::2], nFFT, axis=1)[:, :2*width - 1]
+        probs = np.maximum(probs, 0.)
+        levels.append((probs/probs.sum(axis=1, keepdims=True), caps[0::2] + caps[1::2]))
+
+    totals = np.array([nItems])
+    for probs, caps in levels[-2::-1]:
+        # n of items in the first child (s) for every node (row)
+        s = np.arange(probs.shape[1])
+        rest = totals[:, None] - s
+        valid = (s <= caps[0::2, None]) & (rest >= 0) & (rest <= caps[1::2, None])
+        weights = np.where(valid, probs[0::2]*np.take_along_axis(
+            probs[1::2], np.clip(rest, 0, probs.shape[1] - 1), axis=1), 0.)
+        # only where the probabilities of all splits are lost in rounding
+        lost = weights.sum(axis=1) <= 0
+        weights[lost] = valid[lost]
+        cumWeights = np.cumsum(weights, axis=1)
+        draws = np.random.random_sample(len(totals))*cumWeights[:, -1]
+        first = np.argmax(cumWeights > draws[:, None], axis=1)
+        totals = np.stack((first, totals - first), axis=1).reshape(-1)
+
+    return totals[:nGaps].tolist()
+
+
+def _tilt(nItems, capacities):
+    """log(theta) for _fillGaps: if gap j gets x items with a probability
+    proportional to theta**x (0 <= x <= capacities[j]), the mean of the
+    total is nItems (0 < nItems < sum(capacities)) up to half an item.
+    Bisection over the distinct capacities."""
+    caps, nGapsPerCap = np.unique(capacities, return_counts=True)
+    x = np.arange(caps.max() + 1)
+    low, high = -50., 50.
+    while True:
+        logTheta = (low + high)/2
+        logWeights = np.where(x <= caps[:, None], x*logTheta, -np.inf)
+        weights = np.exp(logWeights - logWeights.max(axis=1, keepdims=True))
+        mean = np.dot(nGapsPerCap, weights.dot(x)/weights.sum(axis=1))
+        if abs(mean - nItems) <= .5 or high - low < 1e-12:
+            return logTheta
+        if mean < nItems:
+            low = logTheta
+        else:
+            high = logTheta
+
+
+def classCounts(ntrials, classes):
+    """The n of trials of every class in a sequence of ntrials trials (see
+    classSequence)."""
+    counts = [0]
+    for stimClass in classes[1:]:
+        n = ntrials*stimClass['p']
+        assert abs(n - round(n)) < 1e-9, "ntrials*p of the class '{}' must "\
+            "be an integer".format(stimClass['name'])
+        counts.append(int(round(n)))
+    counts[0] = ntrials - sum(counts)
+    assert counts[0] >= 0, 'The probabilities of the classes add up to more than 1.'
+    return counts
+
+
+def classSequence(ntrials, classes, nLeadingStandards = 1, maxAttempts = 1000):
+    """Return the class of every trial (the index in classes) of a sequence
+    with more than two stimulus classes as a uint8 array.
+
+    classes is a list of dicts with the keys
+        'name'
+        'p'          the probability of the class (the n of its trials is
+                     exactly ntrials*p)
+        'maxRun'     max n of trials of the class in a row (default: no limit)
+        'minSpacing' min n of other trials between two trials of the class
+                     (default: 0)
+        'trigger'    the trigger code sent with the onset (see Oddball)
+    The first class is the standard; its trials fill the sequence between
+    the trials of the other (rare) classes, so its 'p' is ignored and it must
+    not have a 'minSpacing'. The first nLeadingStandards trials are standards.
+
+    The order of the rare trials is built step by step (see _rareOrder):
+    the next rare trial is drawn from the classes which can still follow,
+    together with the least n of standards which have to be in front of it
+    so that the constraints hold. If this runs into a dead end (the rare
+    trials which are left cannot be spaced any more), the order is built
+    again, at most maxAttempts times. The remaining standards are put into
+    the gaps like in stimsList, at most maxRun of the standard into one gap
+    (standards added later only make runs shorter and spacings longer). The
+    random numbers come from np.random, i.e. np.random.seed makes it
+    reproducible.
+    """
+    assert not classes[0].get('minSpacing', 0), 'The standard cannot have a minSpacing.'
+    counts = classCounts(ntrials, classes)
+    maxRuns = [stimClass.get('maxRun', ntrials) for stimClass in classes]
+    minSpacings = [stimClass.get('minSpacing', 0) for stimClass in classes]
+    nRare = ntrials - counts[0]
+    assert nLeadingStandards <= maxRuns[0] and counts[0] <= (nRare + 1)*maxRuns[0], \
+        'With these classes there is no sequence in which at most maxRun '\
+        'standards follow each other.'
+
+    for attempt in range(maxAttempts):
+        order = _rareOrder(counts, maxRuns, minSpacings, nLeadingStandards)
+        if order is not None:
+            break
+    else:
+        raise AssertionError('No sequence found in {} attempts; there are '
+            'probably too few standards to space the rare classes as required '
+            '(try lower probabilities or minSpacings).'.format(maxAttempts))
+    rare, minGaps = order
+
+    nExtra = counts[0] - sum(minGaps)
+    capacities = [maxRuns[0] - n for n in minGaps]
+    gaps = np.add(minGaps, _fillGaps(nExtra, capacities))
+    # the position of every rare trial is the n of trials in front of it
+    sequence = np.zeros(ntrials, dtype=np.uint8)
+    sequence[np.cumsum(gaps[:-1], dtype=np.int64) + np.arange(nRare)] = rare
+
+    return sequence
+
+
+def _rareOrder(counts, maxRuns, minSpacings, nLeadingStandards):
+    """Draw the order of the rare trials of classSequence one trial at a
+    time. Returns the order and the least n of standards in the gap before
+    every rare trial and after the last one (minGaps), or None if the order
+    ran into a dead end.
+
+    Every class which is left is a candidate for the next trial, if its
+    minSpacing and maxRun can be reached with standards in the gaps since
+    its last trial (at most maxRun of the standard per gap, see
+    _standardsNeeded), if the standards suffice and if the classes which
+    can never follow themselves (a minSpacing longer than maxRun of the
+    standard) can still be separated by the trials which are left. A
+    candidate is drawn with a probability proportional to the n of its
+    trials which are left.
+    """
+    nClasses = len(counts)
+    maxGap = maxRuns[0]
+    left = [0] + list(counts[1:])
+    # a class with a minSpacing longer than a gap needs another rare trial in between
+    needsSeparator = [c > 0 and minSpacings[c] > maxGap for c in range(nClasses)]
+    rare = []
+    minGaps = [nLeadingStandards]
+    cumGaps = [0, nLeadingStandards] # cumGaps[i] is sum(minGaps[:i])
+    lastIndex = [None]*nClasses # the index in rare of the last trial of every class
+    nRare = sum(left)
+
+    for b in range(nRare):
+        nLeft = nRare - b - 1 # the n of rare trials left after this one
+        candidates = []
+        for c in range(1, nClasses):
+            if not left[c]:
+                continue
+            added = _standardsNeeded(c, rare, minGaps, cumGaps, lastIndex[c], maxRuns[c],
+                                     minSpacings[c], maxGap)
+            if added is None or cumGaps[-1] + sum(added.values()) > counts[0]:
+                continue
+            if any(needsSeparator[d] and left[d] - (d == c) > nLeft - (left[d] - (d == c)) + (d != c)
+                   for d in range(1, nClasses)):
+                continue
+            candidates.append((c, added))
+        if not candidates:
+            return None
+
+        weights = np.array([left[c] for c, _ in candidates], dtype=np.float64)
+        i = min(np.searchsorted(np.cumsum(weights), np.random.random_sample()*weights.sum(),
+                                side='right'), len(candidates) - 1)
+        c, added = candidates[i]
+        for k, n in added.items():
+            minGaps[k] += n
+        for k in range(min(added, default = b + 1), b + 1):
+            cumGaps[k + 1] = cumGaps[k] + minGaps[k]
+        rare.append(c)
+        minGaps.append(0)
+        cumGaps.append(cumGaps[-1])
+        lastIndex[c] = b
+        left[c] -= 1
+
+    return rare, minGaps
+
+
+def _standardsNeeded(c, rare, minGaps, cumGaps, last, maxRun, minSpacing, maxGap):
+    """The standards (dict gap -> n) which have to be added to minGaps so
+    that a trial of class c can follow the rare trials rare, or None if
+    that is impossible. cumGaps are the prefix sums of minGaps (cumGaps[i]
+    is sum(minGaps[:i])) and last is the index of the last trial of c in
+    rare.
+
+    The missing spacing goes into the gap right before the new trial and,
+    when that is full, into the gaps before it; this needs the least
+    standards, because later windows (spacings and runs) also contain the
+    later gaps.
+    """
+    b = len(rare)
+    added = {}
+    if last is not None and minSpacing:
+        missing = minSpacing - (b - last - 1) - (cumGaps[b + 1] - cumGaps[last + 1])
+        k = b
+        while missing > 0 and k > last:
+            n = min(missing, maxGap - minGaps[k])
+            if n > 0:
+                added[k] = n
+                missing -= n
+            k -= 1
+        if missing > 0:
+            return None
+    if minGaps[b] + added.get(b, 0) == 0:
+        # the length of the run of c which the new trial would end
+        run = 1
+        i = b - 1
+        while i >= 0 and rare[i] == c and (i == b - 1 or minGaps[i + 1] == 0):
+            run += 1
+            i -= 1
+        if run > maxRun:
+            if maxGap < 1:
+                return None
+            added[b] = 1
+    return added
+
+
+def checkClassSequence(sequence, classes, nLeadingStandards = 1):
+    """Check that sequence (see classSequence) has the right n of trials of
+    every class and holds all constraints. Returns a list of the violations
+    (empty if there are none)."""
+    sequence = np.asarray(sequence, dtype=np.int64)
+    ntrials = len(sequence)
+    violations = []
+
+    counts = np.bincount(sequence, minlength=len(classes))
+    expected = classCounts(ntrials, classes)
+    if len(counts) > len(classes) or not np.array_equal(counts, expected):
+        violations.append('counts {} instead of {}'.format(counts.tolist(), expected))
+
+    # the runs of trials of the same class
+    runStarts = np.flatnonzero(np.diff(sequence, prepend=-1) != 0)
+    runLengths = np.diff(np.append(runStarts, ntrials))
+    runClasses = sequence[runStarts]
+
+    for c, stimClass in enumerate(classes):
+        maxRun = runLengths[runClasses == c].max(initial=0)
+        if maxRun > stimClass.get('maxRun', ntrials):
+            violations.append("a run of {} trials of '{}'".format(maxRun, stimClass['name']))
+        if c > 0 and stimClass.get('minSpacing', 0) > 0:
+            positions = np.flatnonzero(sequence == c)
+            minSpacing = (np.diff(positions) - 1).min(initial=ntrials)
+            if minSpacing < stimClass['minSpacing']:
+                violations.append("only {} trials between two trials of '{}'".format(
+                    minSpacing, stimClass['name']))
+
+    if np.any(sequence[:nLeadingStandards] != 0):
+        violations.append('a rare trial among the first {} trials'.format(nLeadingStandards))
+
+    return violations
+
+
+def isiList(nfr_on2onisi_lower, nfr_on2onisi_upper, nFrStim, ntrials):
+    """Return ntrials onset to onset isis in frames, drawn from the discrete
+    uniform distribution on [nfr_on2onisi_lower, nfr_on2onisi_upper].
+    """
+    assert nfr_on2onisi_lower > nFrStim, 'The minimum onset to onset isi must be longer than the presentation of a stimulus.'
+    return np.random.randint(nfr_on2onisi_lower, nfr_on2onisi_upper+1, size = ntrials)
+
+
+# one row per trial; the frames are counted from the first frame of the session
+frameScheduleDtype = np.dtype([
+    ('start',    np.int64), # first frame of the trial
+    ('onset',    np.int64), # first frame on which the stimulus is drawn
+    ('offset',   np.int64), # first frame on which the stimulus is removed again (last frame of the trial)
+    ('stimclass', np.uint8), # the class of the stimulus (of stimsList: 1 is standard, 0 is deviant)
+    ('trigger',  np.uint8)  # the trigger code sent with the onset
+    ])
+
+
+def compileFrameSchedule(stims, isi_list, nFrStim, triggers):
+    """Compile the stims and the onset to onset isis (in frames) of a session
+    into a structured array with dtype frameScheduleDtype. triggers[c] is
+    the trigger code of the stimulus class c (i.e. (triggerdeviant,
+    triggerstandard) for the stims of stimsList).
+
+    A trial starts with off2On_isi = isi-nFrStim empty frames, then the
+    stimulus is drawn for nFrStim frames and the trial ends with the frame
+    on which the stimulus is removed, so a trial has isi+1 frames.
+    """
+    stims = np.asarray(stims, dtype=np.uint8)
+    isi_list = np.asarray(isi_list, dtype=np.int64)
+    assert len(stims) == len(isi_list), 'There must be one isi for every stimulus.'
+
+    frameSchedule = np.empty(len(stims), dtype=frameScheduleDtype)
+    frameSchedule['start'][0:1] = 0
+    frameSchedule['start'][1:] = np.cumsum(isi_list[:-1] + 1)
+    frameSchedule['offset'] = frameSchedule['start'] + isi_list
+    frameSchedule['onset'] = frameSchedule['offset'] - nFrStim
+    frameSchedule['stimclass'] = stims
+    frameSchedule['trigger'] = np.asarray(triggers, dtype=np.uint8)[stims]
+
+    return frameSchedule
+
+
+def sessionSchedule(seed, ntrials, pdeviants, maxNConsecStan,
+                    nfr_on2onisi_lower, nfr_on2onisi_upper, nFrStim):
+    """Return the schedule Oddball generates when it is constructed with
+    these parameters, i.e. the same draws from np.random in the same order:
+    a dict with the arrays 'standard' and 'isi' and the 'deviant_ori'.
+    """
+    np.random.seed(seed = seed)
+    stims = stimsList(ntrials, pdeviants, maxNConsecStan)
+    isi_list = isiList(nfr_on2onisi_lower, nfr_on2onisi_upper, nFrStim, ntrials)
+    myOris = [0.0, 45.0]
+    np.random.shuffle(myOris)
+    return dict(standard = np.asarray(stims, dtype=np.uint8),
+                isi = np.asarray(isi_list, dtype=np.uint16),
+                deviant_ori = myOris[0])
+
+
+def saveSchedules(fn, subjects, seeds, schedules, params):
+    """Write the schedules of many sessions into one npz file.
+
+    The trials of all sessions are concatenated column by column
+    ('standard', 'isi'); the trials of session i are the rows
+    offsets[i]:offsets[i+1]. subjects, seeds and deviant_ori have one entry
+    per session and params is stored as json.
+    """
+    lengths = [len(s['standard']) for s in schedules]
+    offsets = np.zeros(len(schedules)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    np.savez(fn,
+             subject = np.asarray(subjects, dtype=np.int64),
+             seed = np.asarray(seeds, dtype=np.int64),
+             offsets = offsets,
+             deviant_ori = np.asarray([s['deviant_ori'] for s in schedules]),
+             standard = np.concatenate([s['standard'] for s in schedules]),
+             isi = np.concatenate([s['isi'] for s in schedules]),
+             params = json.dumps(params))
+
+
+def loadSchedule(fn, subject, session = 0):
+    """Load the schedule of one session of a subject from a file written by
+    saveSchedules. Returns a dict like sessionSchedule plus 'seed' and the
+    'params' the schedules were generated with.
+    """
+    with np.load(fn) as schedules:
+        indeces = np.flatnonzero(schedules['subject'] == subject)
+        assert session < len(indeces), 'There is no session {} for subject '\
+            '{} in {}.'.format(session, subject, fn)
+        i = indeces[session]
+        start, stop = schedules['offsets'][i:i+2]
+        return dict(standard = schedules['standard'][start:stop],
+                    isi = schedules['isi'][start:stop],
+                    deviant_ori = float(schedules['deviant_ori'][i]),
+                    seed = int(schedules['seed'][i]),
+                    params = json.loads(str(schedules['params'])))
@@ -74,7 +74,7 @@ myOddball = oddball.Oddball(
         pdeviants           = exp_dict_dlg['pDeviant'], # probability of deviants
         maxNConsecStan      = 31, # the array that determines whether a stimulus is a deviant or a standard is divided 
                             # in pairs, each containing a deviant in first place and a standard or deviant in second place
-                            # max(diffPairsIndeces) > int((maxNConsecStan)/2) the list of pairs will be reshuffled
+                            # at most int(maxNConsecStan/2)-1 pairs w/o a deviant follow each other
         verticesPixStim     = [(-20,-20),(-20,20),(20,20),(20,-20)], # the vertices of the shape in pixels
         trackFrIntervals    = True,
         dataSaveClock       = expClock,
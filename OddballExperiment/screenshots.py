@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Screenshots of stimuli without a round trip over the disk: the stimuli are
+drawn into the back buffer (which is never flipped, so nothing appears on
+the screen), the buffer is read into a NumPy array, cropped to the content
+and framed with array operations, and only the final images are encoded,
+on a pool of threads:
+
+    frames = [screenshots.renderFrame(win, [stim]) for stim in stims]
+    frames = [screenshots.addFrame(f) for f in screenshots.cropToContent(frames)]
+    screenshots.saveImages(frames, ['testdata/stim{}.png'.format(i) for i in range(len(frames))])
+
+Except for renderFrame, the functions only need NumPy and PIL.
+
+"""
+
+import ctypes
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+def grabBackBuffer(win):
+    """The back buffer of win as an RGB uint8 array (rows from top to bottom)."""
+    from pyglet import gl as GL # only here, so the other functions work without a window
+
+    if win.useFBO:
+        GL.glReadBuffer(GL.GL_COLOR_ATTACHMENT0_EXT)
+    else:
+        GL.glReadBuffer(GL.GL_BACK)
+    w, h = (int(i) for i in win.size)
+    rgba = np.empty((h, w, 4), dtype=np.uint8)
+    GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+    GL.glReadPixels(0, 0, w, h, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE,
+                    rgba.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte)))
+    # OpenGL counts the rows from the bottom
+    return np.ascontiguousarray(rgba[::-1, :, :3])
+
+
+def renderFrame(win, stims):
+    """Draw stims offscreen and return the result as an RGB array."""
+    win.clearBuffer()
+    for stim in stims:
+        stim.draw()
+    frame = grabBackBuffer(win)
+    win.clearBuffer()
+    return frame
+
+
+def contentBox(frame, background = None, tolerance = 0):
+    """The box (left, top, right, bottom) around all pixels of frame which
+    differ from the background colour by more than tolerance in any channel
+    (None if there are none). The background defaults to the colour of the
+    top left pixel."""
+    if background is None:
+        background = frame[0, 0]
+    if tolerance == 0:
+        content = frame != np.asarray(background, dtype=frame.dtype)
+    else:
+        content = np.abs(frame.astype(np.int16) - np.asarray(background, dtype=np.int16)) > tolerance
+    if content.ndim == 3:
+        content = content.any(axis=2)
+    rows = np.flatnonzero(content.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(content.any(axis=0))
+    return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+
+
+def unionBox(boxes):
+    """The box around all boxes (which may be None)."""
+    boxes = np.array([box for box in boxes if box is not None])
+    if len(boxes) == 0:
+        return None
+    return (int(boxes[:, 0].min()), int(boxes[:, 1].min()),
+            int(boxes[:, 2].max()), int(boxes[:, 3].max()))
+
+
+def cropToContent(frames, margin = 10, background = None, tolerance = 0):
+    """Crop all frames to the same box around the content of all of them
+    (plus margin pixels), so a set of screenshots (e.g. also an empty one)
+    keeps the same size and position. Returns views of the frames."""
+    box = unionBox(contentBox(frame, background, tolerance) for frame in frames)
+    if box is None:
+        return list(frames)
+    h, w = frames[0].shape[:2]
+    left, top = max(box[0] - margin, 0), max(box[1] - margin, 0)
+    right, bottom = min(box[2] + margin, w), min(box[3] + margin, h)
+    return [frame[top:bottom, left:right] for frame in frames]
+
+
+def addFrame(img, border = .1, colour = 0):
+    """Put img in the middle of an image border bigger than it, filled with
+    colour (black by default)."""
+    h, w = img.shape[:2]
+    biggerH, biggerW = round(h*(1 + border)), round(w*(1 + border))
+    framed = np.full((biggerH, biggerW) + img.shape[2:], colour, dtype=img.dtype)
+    top, left = (biggerH - h)//2, (biggerW - w)//2
+    framed[top:top+h, left:left+w] = img
+    return framed
+
+
+def saveImages(imgs, fns, workers = 4):
+    """Encode and write the arrays imgs to the files fns on a pool of
+    threads (PIL releases the GIL while compressing)."""
+    def save(img, fn):
+        Image.fromarray(img).save(fn)
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        # list() to raise the exceptions of the threads here
+        list(executor.map(save, imgs, fns))
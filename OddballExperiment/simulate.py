@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Simulates whole sessions of the Oddball faster than real time: the same
+steps as main.py (instruction, runOddball, inputCount and the data saving
+with trialwriter) run on a virtual window and clock (headless.py) which
+jumps from one refresh to the next instead of waiting for it, and the key
+presses of the subject are scripted. Every session writes what a real run
+writes, i.e. the csv file, the frame intervals and, instead of the pins of
+the parallel port, a csv file of every change of the port with its virtual
+time:
+
+    python simulate.py --sessions 2000 --outdir testdata/simulated
+
+The sessions run on a pool of processes (one seed per session). Each
+session is checked against its schedule: one row and one trigger per trial
+with the code of its class, the trigger at the time of the onset flip and
+(without dropped frames) no dropped frame. The digest of every session
+(over everything but the wall-clock columns of the csv, the triggers and
+the frame intervals) can be saved and compared later, which turns the
+simulation into a regression test of the frame loop and the data saving:
+
+    python simulate.py --sessions 2000 --save-digests testdata/digests.json
+    python simulate.py --sessions 2000 --check-digests testdata/digests.json
+
+"""
+
+import argparse
+import csv
+import functools
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from psychopy import data, logging
+
+import headless
+import oddball
+import schedule
+import trialwriter
+
+# the parameters of main.py
+scheduleParams = dict(nfr_on2onisi_upper = 150, nfr_on2onisi_lower = 126,
+                      nFrStim = 6, maxNConsecStan = 31)
+triggerdeviant, triggerstandard = 1, 2
+
+# columns of the csv with the date or the machine, which differ between runs
+wallClockColumns = ('experimentStart', 'starttime_oddball', 'Version_psychopy')
+
+
+def simulateSession(seed, outdir, ntrials = 300, pDeviant = .18, refreshRate = 60.,
+                    dropProbability = 0., count = None, keep = True):
+    """Run a session with seed and write its files to outdir. count is the
+    answer typed in at the end (default: the n of deviants). Returns a
+    summary dict with the list of the errors found and the digest; without
+    keep the files are removed afterwards."""
+    backend = headless.Backend(refreshRate = refreshRate, recordTriggers = True,
+                               dropProbability = dropProbability, seed = seed)
+    win = backend.visual.Window(units = 'cm', monitor = 'testMonitor')
+    expClock = backend.core.Clock()
+
+    exp_dict = {'Probandennummer': seed, 'nTrials': ntrials, 'pDeviant': pDeviant,
+                'seed': seed, 'scheduleFile': '', 'Version_psychopy': 'simulated',
+                'experimentStart': 'simulated'}
+    datfilename = os.path.join(outdir, 'VP{}_simulated'.format(seed))
+    if os.path.exists(datfilename + '.trials.jsonl'):
+        os.remove(datfilename + '.trials.jsonl') # TrialWriter appends
+    thisExp = data.ExperimentHandler(name = '', version = '', extraInfo = exp_dict,
+                                     runtimeInfo = None, originPath = None,
+                                     dataFileName = datfilename, savePickle = False,
+                                     saveWideText = False, autoLog = False)
+    trialWriter = trialwriter.TrialWriter(datfilename + '.trials.jsonl', thisExp,
+                                          bufferSize = 10, keepEntries = False)
+
+    tStart = time.perf_counter()
+    myOddball = oddball.Oddball(
+        win = win, expHandler = thisExp, mydir = outdir, subjectnr = seed, sessionnr = '1',
+        triggerlen = 0.01, ntrials = ntrials, pdeviants = pDeviant,
+        verticesPixStim = [(-20,-20),(-20,20),(20,20),(20,-20)],
+        trackFrIntervals = True, dataSaveClock = expClock, stopIndxForInstr = -1,
+        seed = seed, trialWriter = trialWriter, backend = backend, **scheduleParams)
+    nDeviants = int(np.count_nonzero(np.asarray(myOddball.stims) == 0))
+    if count is None:
+        count = nDeviants
+
+    # the subject reads the instruction for 5 s, ...
+    backend.event.pressKeys(['space'], delay = 5.)
+    myOddball.instruction()
+    myOddball.runOddball(triggerdeviant = triggerdeviant, triggerstandard = triggerstandard,
+                         stopIndex = -1, waitbeforecontinue = 3)
+    # ... and types in the count after 2 s
+    backend.event.pressKeys(list(str(count)) + ['return'], delay = 2.)
+    myOddball.inputCount()
+
+    thisExp.nextEntry()
+    trialWriter.writeLastEntry()
+    trialWriter.close()
+    trialwriter.saveAsWideText(datfilename + '.trials.jsonl', datfilename + '.csv')
+    thisExp.abort()
+    myOddball.trigger.close()
+    win.saveFrameIntervals(datfilename + '_frameIntervals.log')
+    recording = myOddball.port.getRecording()
+    np.savetxt(datfilename + '_triggers.csv', recording, delimiter = ',', header = 't,value',
+               comments = '', fmt = ['%.6f', '%d'])
+    wallTime = time.perf_counter() - tStart
+
+    errors = checkSession(datfilename, myOddball, recording, count,
+                          checkDroppedFrames = dropProbability == 0)
+    summary = dict(seed = seed, ntrials = ntrials, nDeviants = nDeviants,
+                   nTriggers = int(np.count_nonzero(recording['value'])),
+                   nDropped = myOddball.frameTimingSummary()['nDroppedFrames'],
+                   sessionDuration = backend.now, wallTime = wallTime,
+                   digest = sessionDigest(datfilename), errors = errors)
+    if not keep:
+        for suffix in ['.trials.jsonl', '.csv', '_frameIntervals.log', '_triggers.csv']:
+            if os.path.exists(datfilename + suffix):
+                os.remove(datfilename + suffix)
+    return summary
+
+
+def checkSession(datfilename, myOddball, recording, count, checkDroppedFrames = True):
+    """The list of the deviations of the files of a session from its
+    schedule."""
+    errors = []
+    with open(datfilename + '.csv', newline = '', encoding = 'utf-8') as f:
+        rows = list(csv.DictReader(f))
+    trials = [row for row in rows if row.get('tPresentation')]
+    stims = np.asarray(myOddball.stims)
+    if len(trials) != len(stims):
+        errors.append('{} trials in the csv, {} in the schedule'.format(len(trials), len(stims)))
+        return errors
+    if [int(float(row['standard'])) for row in trials] != stims.tolist():
+        errors.append('the classes in the csv differ from the schedule')
+    if rows[-1].get('subj_count_oddb') != str(count):
+        errors.append('the count is {!r} instead of {}'.format(rows[-1].get('subj_count_oddb'), count))
+
+    onsets = recording[recording['value'] != 0]
+    offsets = recording[recording['value'] == 0]
+    expectedCodes = np.where(stims == 1, triggerstandard, triggerdeviant)
+    if len(onsets) != len(stims):
+        errors.append('{} triggers for {} trials'.format(len(onsets), len(stims)))
+    else:
+        if not np.array_equal(onsets['value'], expectedCodes):
+            errors.append('the trigger codes differ from the classes')
+        tOnsetFlip = np.array([float(row['tOnsetFlip']) for row in trials])
+        if np.abs(onsets['t'] - tOnsetFlip).max() > 1e-6:
+            errors.append('triggers not at the onset flip (max {:.3f} ms off)'.format(
+                np.abs(onsets['t'] - tOnsetFlip).max()*1000))
+        if len(offsets) != len(onsets) or \
+                np.abs(offsets['t'] - onsets['t'] - myOddball.triggerlen).max() > 1e-6:
+            errors.append('the triggers are not {} s long'.format(myOddball.triggerlen))
+    if checkDroppedFrames:
+        nDropped = sum(int(row['nDroppedIsi']) for row in trials) + \
+            sum(int(row['nFrStimAchieved']) != myOddball.nFrStim for row in trials)
+        if nDropped:
+            errors.append('{} trials with dropped frames'.format(nDropped))
+    return errors
+
+
+def sessionDigest(datfilename):
+    """sha1 of the csv (without wallClockColumns), the triggers and the
+    frame intervals of a session."""
+    digest = hashlib.sha1()
+    with open(datfilename + '.csv', newline = '', encoding = 'utf-8') as f:
+        for row in csv.DictReader(f):
+            for column in wallClockColumns:
+                row.pop(column, None)
+            digest.update(json.dumps(row, sort_keys = True).encode())
+    for suffix in ['_triggers.csv', '_frameIntervals.log']:
+        if os.path.exists(datfilename + suffix):
+            with open(datfilename + suffix, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def simulateSessions(seeds, outdir, workers = None, **kwargs):
+    """simulateSession for every seed on a pool of processes; returns the
+    summaries in the order of the seeds."""
+    os.makedirs(outdir, exist_ok = True)
+    with ProcessPoolExecutor(max_workers = workers, initializer = _quiet) as executor:
+        return list(executor.map(functools.partial(simulateSession, outdir = outdir, **kwargs),
+                                 seeds, chunksize = max(1, len(seeds)//256)))
+
+
+def _quiet():
+    logging.console.setLevel(logging.ERROR)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type = int, default = 100, help = 'n of sessions (seeds 1 to n)')
+    parser.add_argument('--firstSeed', type = int, default = 1)
+    parser.add_argument('--ntrials', type = int, default = 300)
+    parser.add_argument('--pDeviant', type = float, default = .18)
+    parser.add_argument('--refreshRate', type = float, default = 60.)
+    parser.add_argument('--dropProbability', type = float, default = 0.,
+                        help = 'probability of a dropped frame at every flip')
+    parser.add_argument('--outdir', default = 'testdata/simulated')
+    parser.add_argument('--keep', action = 'store_true', help = 'keep the files of the sessions')
+    parser.add_argument('--workers', type = int, default = None, help = 'default: n of CPUs')
+    parser.add_argument('--save-digests', dest = 'saveDigests', help = 'json file for the digests')
+    parser.add_argument('--check-digests', dest = 'checkDigests',
+                        help = 'json file with the digests of an earlier run')
+    args = parser.parse_args()
+
+    seeds = list(range(args.firstSeed, args.firstSeed + args.sessions))
+    t0 = time.perf_counter()
+    summaries = simulateSessions(seeds, args.outdir, workers = args.workers,
+                                 ntrials = args.ntrials, pDeviant = args.pDeviant,
+                                 refreshRate = args.refreshRate,
+                                 dropProbability = args.dropProbability, keep = args.keep)
+    tTotal = time.perf_counter() - t0
+
+    failed = [s for s in summaries if s['errors']]
+    for s in failed:
+        print('seed {}: {}'.format(s['seed'], '; '.join(s['errors'])))
+    digests = {str(s['seed']): s['digest'] for s in summaries}
+    if args.checkDigests:
+        with open(args.checkDigests) as f:
+            reference = json.load(f)
+        changed = [seed for seed, digest in digests.items()
+                   if seed in reference and reference[seed] != digest]
+        print('{} of {} sessions differ from {}{}'.format(
+            len(changed), len(set(digests) & set(reference)), args.checkDigests,
+            ': seeds ' + ', '.join(changed[:20]) if changed else ''))
+    if args.saveDigests:
+        with open(args.saveDigests, 'w') as f:
+            json.dump(digests, f, indent = 1)
+
+    sessionDuration = sum(s['sessionDuration'] for s in summaries)
+    print('{} sessions ({} failed) in {:.1f} s: {:.3f} s per session, {:.0f} times '
+          'faster than real time'.format(len(summaries), len(failed), tTotal,
+                                         tTotal/len(summaries), sessionDuration/tTotal))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+Pre-renders outline shapes into textures, so drawing them during a frame
+loop is a single textured quad instead of re-tessellating the vertices of a
+ShapeStim on every frame (which gets expensive for shapes with many
+vertices):
+
+    cache = stimcache.StimCache(win)
+    stim = cache.get(vertices, ori = 45.0, lineWidth = 5)
+    stim.autoDraw = True
+
+The textures are visual.BufferImageStims which capture a square around the
+centre of the window after the shape has been drawn there, so they contain
+the background colour of the window around the shape; they are only
+equivalent to the ShapeStim on a uniform background. Every combination of
+vertices, orientation, line width and size is rendered only once per window.
+
+"""
+
+import numpy as np
+
+from psychopy import visual as psychopyVisual
+
+
+class StimCache:
+
+    def __init__(self, win, visual = None):
+        """visual is the module to create the stimuli with (e.g. the
+        stand-ins of a headless.Backend); None uses psychopy.visual."""
+        self.win = win
+        self.visual = psychopyVisual if visual is None else visual
+        self._textures = {}
+
+    def get(self, vertices, ori = 0.0, lineWidth = 5, size = 1.0, name = None):
+        """Return the texture of the outline of vertices (in pixels) turned
+        by ori degrees; it is rendered when it is requested for the first
+        time. Its pos is in pixels."""
+        key = (tuple(map(tuple, vertices)), float(ori), float(lineWidth), float(size))
+        if key not in self._textures:
+            self._textures[key] = self._render(vertices, ori, lineWidth, size, name)
+        return self._textures[key]
+
+    def __len__(self):
+        return len(self._textures)
+
+    def _render(self, vertices, ori, lineWidth, size, name):
+        shape = self.visual.ShapeStim(self.win, units = 'pix', vertices = vertices,
+                                      lineWidth = lineWidth, ori = ori, size = size,
+                                      pos = (0, 0))
+        # a square around the centre in which the shape fits at any
+        # orientation, incl. the line and a margin for antialiasing
+        radius = np.hypot(*np.asarray(vertices, dtype = float).T).max()*size + lineWidth + 2
+        halfW, halfH = np.ceil(radius)/(np.asarray(self.win.size)/2)
+        # draws shape into the back buffer, captures the rect (in norm
+        # units) and clears the back buffer again
+        return self.visual.BufferImageStim(self.win, rect = (-halfW, halfH, halfW, -halfH),
+                                           stim = [shape], interpolate = True,
+                                           name = name)
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""
+@author: LKirst
+
+The modules of the experiment are imported like in the scripts, i.e. from
+the folder OddballExperiment.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
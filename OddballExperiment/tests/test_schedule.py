@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@author: LKirst
+
+Tests of schedule.py: the sequences hold their constraints.
+"""
+
+import numpy as np
+import pytest
+
+import schedule
+import verify_schedules
+
+
+# a paradigm in which the rare classes have to be placed with the
+# constraints in mind: the standards leave hardly any room and the trials of
+# A cannot follow each other without a B in between
+tightClasses = [
+    dict(name = 'standard', maxRun = 4, trigger = 2),
+    dict(name = 'A', p = .1, minSpacing = 5, trigger = 1),
+    dict(name = 'B', p = .1, trigger = 3)
+    ]
+
+
+@pytest.mark.parametrize('classes, ntrials', [
+    (verify_schedules.exampleClasses, 300),
+    (tightClasses, 100)
+    ])
+def test_classSequence_constraints(classes, ntrials):
+    counts, problems = verify_schedules.verifySeeds(range(200), ntrials, classes, 1)
+    assert problems == []
+    assert counts.tolist() == [200*n for n in schedule.classCounts(ntrials, classes)]
+
+
+def test_classSequence_tight_paradigm_exists():
+    # a valid sequence of tightClasses, i.e. classSequence must not give up
+    sequence = [0] + [1, 0, 0, 0, 0, 2, 0, 0, 0, 0]*9 + [1, 0, 0, 0, 0, 2, 0, 0, 0]
+    assert schedule.checkClassSequence(sequence, tightClasses) == []
+    np.random.seed(seed = 1)
+    assert schedule.checkClassSequence(schedule.classSequence(100, tightClasses), tightClasses) == []
+
+
+def test_classSequence_reproducible():
+    np.random.seed(seed = 7)
+    first = schedule.classSequence(100, tightClasses)
+    np.random.seed(seed = 7)
+    assert np.array_equal(first, schedule.classSequence(100, tightClasses))
+
+
+def test_classSequence_impossible():
+    classes = [dict(name = 'standard', maxRun = 3),
+               dict(name = 'A', p = .2, minSpacing = 7)]
+    with pytest.raises(AssertionError):
+        schedule.classSequence(100, classes, maxAttempts = 10)
+    # more standards than fit into the gaps between the rare trials
+    with pytest.raises(AssertionError):
+        schedule.classSequence(100, [dict(name = 'standard', maxRun = 2),
+                                     dict(name = 'A', p = .1)])
+
+
+def _fillings(nItems, capacities):
+    """All fillings of the gaps (see schedule._fillGaps)."""
+    if not capacities:
+        return [()] if nItems == 0 else []
+    return [(x,) + rest for x in range(min(capacities[0], nItems) + 1)
+            for rest in _fillings(nItems - x, capacities[1:])]
+
+
+@pytest.mark.parametrize('nItems, capacities', [
+    (3, [2, 2, 2]),
+    (4, [1, 3, 0, 2]),
+    (5, [5, 1, 2]),
+    (2, [2])
+    ])
+def test_fillGaps_uniform(nItems, capacities):
+    fillings = _fillings(nItems, capacities)
+    np.random.seed(seed = 3)
+    ndraws = 3000*len(fillings)
+    frequencies = dict.fromkeys(fillings, 0)
+    for _ in range(ndraws):
+        gaps = tuple(schedule._fillGaps(nItems, capacities))
+        assert gaps in frequencies
+        frequencies[gaps] += 1
+    p = 1/len(fillings)
+    sd = np.sqrt(p*(1 - p)/ndraws)
+    for gaps, n in frequencies.items():
+        assert abs(n/ndraws - p) <= 5*sd, gaps
+
+
+def test_stimsList_constraints():
+    for seed in range(100):
+        np.random.seed(seed = seed)
+        stims = schedule.stimsList(300, .18, 8)
+        assert len(stims) == 300 and stims.count(0) == 54
+        # no two deviants after each other, at most 8 standards in a row
+        sequence = 1 - np.asarray(stims)
+        assert schedule.checkClassSequence(sequence, [
+            dict(name = 'standard', maxRun = 8),
+            dict(name = 'deviant', p = .18, maxRun = 1, minSpacing = 1)], 0) == []
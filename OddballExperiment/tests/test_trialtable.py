@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+@author: LKirst
+
+Tests of trialtable.py: the types of the columns, the masks and the export.
+"""
+
+import csv
+
+import numpy as np
+
+import trialtable
+
+
+class StandInExperimentHandler:
+    """Records what a loop passes on to the ExperimentHandler."""
+
+    def __init__(self):
+        self.data = []
+        self.endedLoops = []
+
+    def addData(self, name, value):
+        self.data.append((name, value))
+
+    def loopEnded(self, loop):
+        self.endedLoops.append(loop)
+
+
+def runTable(nTrials = 4):
+    table = trialtable.TrialTable(dict(standard = [1, 0, 1, 1][:nTrials],
+                                       isi = [130, 140, 150, 126][:nTrials]), name = 'trials')
+    exp = StandInExperimentHandler()
+    table.setExp(exp)
+    return table, exp
+
+
+def test_loop_like_TrialHandler():
+    table, exp = runTable()
+    trials = [dict(trial) for trial in table]
+    assert trials == [dict(standard = 1, isi = 130), dict(standard = 0, isi = 140),
+                      dict(standard = 1, isi = 150), dict(standard = 1, isi = 126)]
+    assert table.finished and exp.endedLoops == [table]
+    assert table.thisTrial == trials[-1] # stays the last trial
+    assert table.trialList == trials
+
+
+def test_column_promotion_and_masks():
+    table, exp = runTable()
+    for thisTrial in table:
+        if table.thisN == 0:
+            table.addData('rt', 1) # an int first ...
+        elif table.thisN == 2:
+            table.addData('rt', .5) # ... then a float
+            table.addData('key', 'space')
+        table.addData('correct', table.thisN != 1)
+    table.addData('count', 3) # after the loop: the last trial
+
+    assert table['rt'].dtype == np.float64
+    assert np.array_equal(table.filled('rt'), [True, False, True, False])
+    assert table['rt'][0] == 1. and table['rt'][2] == .5 and np.isnan(table['rt'][1])
+    assert table['key'].dtype == object and table['key'].tolist() == [None, None, 'space', None]
+    assert table['correct'].dtype == bool and table.filled('correct').all()
+    assert table.filled('count').tolist() == [False, False, False, True]
+    # an int in a bool column makes it an object column
+    table.addData('correct', 2)
+    assert table['correct'].dtype == object and table['correct'][3] == 2
+    # everything was passed on to the ExperimentHandler
+    assert ('key', 'space') in exp.data and ('count', 3) in exp.data
+
+
+def test_summary():
+    table, exp = runTable()
+    for thisTrial in table:
+        table.addData('rt', .1*(table.thisN + 1))
+    summary = table.summary(by = 'standard')
+    assert summary[0]['rt']['n'] == 1 and np.isclose(summary[0]['rt']['mean'], .2)
+    assert summary[1]['rt']['n'] == 3 and np.isclose(summary[1]['rt']['max'], .4)
+    assert list(table.summary()) == ['rt']
+
+
+def test_saveAsText(tmp_path):
+    table, exp = runTable(3)
+    for thisTrial in table:
+        if table.thisN != 1:
+            table.addData('rt', .25*table.thisN)
+            table.addData('key', 'a,b' if table.thisN else 'space')
+    fn = str(tmp_path/'trials.csv')
+    table.saveAsText(fn, delim = ';')
+    with open(fn, encoding = 'utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines == ['standard;isi;rt;key', '1;130;0.0;space', '0;140;;', '1;150;0.5;a,b']
+    table.saveAsText(fn, names = ['isi'])
+    with open(fn, encoding = 'utf-8') as f:
+        assert f.read().splitlines() == ['isi', '130', '140', '150']
+
+
+def test_saveAsText_quotes_delim(tmp_path):
+    table, exp = runTable(3)
+    for thisTrial in table:
+        table.addData('key', 'a,b' if table.thisN == 2 else 'space')
+    fn = str(tmp_path/'trials.csv')
+    table.saveAsText(fn)
+    with open(fn, encoding = 'utf-8') as f:
+        assert f.read().splitlines() == ['standard,isi,key', '1,130,space', '0,140,space',
+                                         '1,150,"a,b"']
+    with open(fn, newline = '', encoding = 'utf-8') as f:
+        assert [row[2] for row in csv.reader(f)] == ['key', 'space', 'space', 'a,b']
+
+
+def test_npz_round_trip(tmp_path):
+    table, exp = runTable()
+    for thisTrial in table:
+        if thisTrial['standard']:
+            table.addData('nDroppedIsi', table.thisN)
+    fn = str(tmp_path/'trials.npz')
+    table.saveAsNpz(fn)
+    columns = trialtable.loadNpz(fn)
+    assert sorted(columns) == ['isi', 'nDroppedIsi', 'standard']
+    assert columns['nDroppedIsi'].dtype == np.int64
+    assert columns['nDroppedIsi'].tolist() == [0, None, 2, 3]
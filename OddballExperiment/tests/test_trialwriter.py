@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+@author: LKirst
+
+Tests of trialwriter.py: what is left of a session after a crash and the
+CSV rebuilt from it.
+"""
+
+import csv
+import os
+import subprocess
+import sys
+import textwrap
+
+import trialwriter
+
+oddballDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StandInExperimentHandler:
+    """The parts of psychopy.data.ExperimentHandler TrialWriter uses: the
+    entries are dicts with the data first, then the loop, then the
+    extraInfo (like nextEntry makes them)."""
+
+    def __init__(self, extraInfo):
+        self.extraInfo = extraInfo
+        self.entries = []
+        self.dataNames = []
+        self.thisN = -1
+
+    def _getAllParamNames(self):
+        return ['trials.thisN', 'standard']
+
+    def addTrial(self, **data):
+        for name in data:
+            if name not in self.dataNames:
+                self.dataNames.append(name)
+        self.thisN += 1
+        self.entries.append(dict(data, **{'trials.thisN': self.thisN,
+                                          'standard': self.thisN % 2}, **self.extraInfo))
+
+
+def runSession(fn, nTrials, ending):
+    """Write nTrials trials (bufferSize 10) in a process of its own which
+    then ends with ending ('crash': killed, 'exception' or 'close')."""
+    script = textwrap.dedent('''
+        import os, sys
+        sys.path.insert(0, {oddballDir!r})
+        sys.path.insert(0, {testsDir!r})
+        import trialwriter
+        from test_trialwriter import StandInExperimentHandler
+        thisExp = StandInExperimentHandler(dict(subject = 1))
+        writer = trialwriter.TrialWriter({fn!r}, thisExp, bufferSize = 10, keepEntries = False)
+        for i in range({nTrials}):
+            thisExp.addTrial(rt = i/10)
+            writer.writeLastEntry()
+        if {ending!r} == 'crash':
+            writer.flush() # all trials so far are on disk ...
+            thisExp.addTrial(rt = -1.)
+            writer.writeLastEntry() # ... but not this one
+            os._exit(1)
+        elif {ending!r} == 'exception':
+            raise RuntimeError('the experiment crashed')
+        writer.close()
+        ''').format(oddballDir = oddballDir, testsDir = os.path.dirname(os.path.abspath(__file__)),
+                    fn = str(fn), nTrials = nTrials, ending = ending)
+    return subprocess.run([sys.executable, '-c', script], stderr = subprocess.PIPE).returncode
+
+
+def test_trials_before_a_crash_are_kept(tmp_path):
+    fn = tmp_path/'VP1.trials.jsonl'
+    assert runSession(fn, 25, 'crash') == 1
+    trials = trialwriter.readTrials(str(fn))
+    assert [trial['trials.thisN'] for trial in trials] == list(range(25))
+
+
+def test_buffered_trials_are_written_on_an_exception(tmp_path):
+    fn = tmp_path/'VP1.trials.jsonl'
+    assert runSession(fn, 25, 'exception') == 1
+    assert len(trialwriter.readTrials(str(fn))) == 25
+
+
+def test_a_cut_off_line_is_skipped(tmp_path, caplog):
+    fn = tmp_path/'VP1.trials.jsonl'
+    assert runSession(fn, 12, 'close') == 0
+    with open(str(fn), 'a', encoding = 'utf-8') as f:
+        f.write('{"rt": 1.2, "trials.th') # the crash hit in the middle of a line
+    assert len(trialwriter.readTrials(str(fn))) == 12
+    assert 'Line 14 of' in caplog.text # the first line has the columns
+
+
+def test_csv_columns_like_saveAsWideText(tmp_path):
+    fn = str(tmp_path/'VP1.trials.jsonl')
+    thisExp = StandInExperimentHandler(dict(subject = 1, session = 2))
+    writer = trialwriter.TrialWriter(fn, thisExp, bufferSize = 2)
+    for i in range(3):
+        thisExp.addTrial(rt = i/10)
+        writer.writeLastEntry()
+    thisExp.addTrial(rt = .5, count = 12) # a column of the data which comes late
+    writer.writeLastEntry()
+    writer.close()
+
+    assert trialwriter.saveAsWideText(fn) == 4
+    with open(str(tmp_path/'VP1.csv'), newline = '', encoding = 'utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['trials.thisN', 'standard', 'rt', 'count', 'subject', 'session']
+    assert rows[1] == ['0', '0', '0.0', '', '1', '2']
+    assert rows[4] == ['3', '1', '0.5', '12', '1', '2']
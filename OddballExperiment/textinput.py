@@ -10,13 +10,22 @@ Python 3.6
 import re
 from psychopy import visual, event, core, logging
 
+import keylistener
+
 class TextInput:
     
-    def __init__(self, win):
-        self.question       = visual.TextStim(
+    def __init__(self, win, backend = None, keys = None):
+        # backend: stand-ins for visual, event and core (e.g. headless.Backend()); None uses psychopy
+        # keys: the keylistener.KeyListener to read the keys from; None creates one
+        if backend is None:
+            self.visual, self.event, self.core = visual, event, core
+        else:
+            self.visual, self.event, self.core = backend.visual, backend.event, backend.core
+        self.keys = keylistener.KeyListener(self.core.Clock(), event = self.event, core = self.core) if keys is None else keys
+        self.question       = self.visual.TextStim(
             win, anchorHoriz='left', units = 'norm', height = .08, 
             pos = (-.5, .5), name = 'question', autoLog = False)
-        self.displayInput   = visual.TextStim(
+        self.displayInput   = self.visual.TextStim(
             win, anchorHoriz='left', units = 'norm', height = .08, 
             pos = (-.5, -.1), name = 'inputText', autoLog = False)
         self.win = win
@@ -26,23 +35,29 @@ class TextInput:
         theseKeys = ''
         inputText = ''
         
-        if event.getKeys(['escape']):
-            core.quit()
-        event.clearEvents() # delete all responses in the buffer
+        if self.keys.escape:
+            self.core.quit()
+        self.keys.clearEvents() # delete all responses in the buffer
         
+        # the text is only laid out again when the input changes
+        self.question.text      = questionText
+        self.displayInput.text  = inputText
         self.question.autoDraw = True
         self.displayInput.autoDraw = True
+        self.win.flip()
         
         continueRoutine = True
         while continueRoutine:
             
-            theseKeys = event.getKeys()
+            # wait for the next key press (and take the ones pressed with it)
+            theseKeys = [self.keys.waitKeys()[0]] + [key[0] for key in self.keys.getKeys()]
+            previousText = inputText
             n = len(theseKeys)
             i = 0
             
             while i < n:
                 if theseKeys[i] == 'escape':
-                    core.quit()
+                    self.core.quit()
                 elif theseKeys[i] == 'return':
                     if len(inputText)>0: # only allow return once something has been entered
                         # pressing RETURN means time to stop
@@ -62,10 +77,9 @@ class TextInput:
                         inputText += theseKeys[i]
                     i += 1
             
-            self.question.text      = questionText
-            self.displayInput.text  = inputText
-            
-            self.win.flip()
+            if inputText != previousText:
+                self.displayInput.text = inputText
+                self.win.flip()
         
         self.question.autoDraw = False
         self.displayInput.autoDraw = False
@@ -80,23 +94,29 @@ class TextInput:
         inputText = ''
         shift_flag = False
         
-        if event.getKeys(['escape']):
-            core.quit()
-        event.clearEvents() # delete all responses in the buffer
+        if self.keys.escape:
+            self.core.quit()
+        self.keys.clearEvents() # delete all responses in the buffer
         
+        # the text is only laid out again when the input changes
+        self.question.text      = questionText
+        self.displayInput.text  = inputText
         self.question.autoDraw = True
         self.displayInput.autoDraw = True
+        self.win.flip()
         
         continueRoutine = True
         while continueRoutine:
             
-            theseKeys = event.getKeys()
+            # wait for the next key press (and take the ones pressed with it)
+            theseKeys = [self.keys.waitKeys()[0]] + [key[0] for key in self.keys.getKeys()]
+            previousText = inputText
             n = len(theseKeys)
             i = 0
             
             while i < n:
                 if theseKeys[i] == 'escape':
-                    core.quit()
+                    self.core.quit()
                 elif theseKeys[i] == 'return':
                     if len(inputText)>0: # return only has an effect if something has been entered
                         continueRoutine = False
@@ -121,9 +141,9 @@ class TextInput:
                             inputText += theseKeys[i]
                     i += 1
             
-            self.question.text      = questionText
-            self.displayInput.text  = inputText
-            self.win.flip()
+            if inputText != previousText:
+                self.displayInput.text = inputText
+                self.win.flip()
         
         self.question.autoDraw = False
         self.displayInput.autoDraw = False
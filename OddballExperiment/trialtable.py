@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+A loop over trials like data.TrialHandler (sequential, one repetition), but
+the conditions and the data are stored in columns, one typed NumPy array
+per column, instead of a list of dicts:
+
+    table = trialtable.TrialTable(dict(standard = stims, isi = isis), name = 'trials')
+    thisExp.addLoop(table)
+    for thisTrial in table:
+        ...
+        table.addData('tPresentation', t)
+        thisExp.nextEntry()
+    table.summary(by = 'standard')
+    table.saveAsText('testdata/trials.csv')
+
+A data column is allocated for all trials the first time addData is called
+with its name, so every further addData is a single assignment. Integers,
+floats and bools get numeric columns (promoted to float if a float turns
+up), everything else an object column; which trials have a value is kept
+in a mask per column. The columns can be written without building rows:
+as text (CSV) or as an .npz file of the arrays themselves.
+
+For ExperimentHandler.addLoop the table has what the ExperimentHandler reads
+from a loop (name, thisN, thisTrialN, thisRepN, thisIndex, thisTrial as a
+dict, setExp/getExp and loopEnded when the loop is finished), and addData
+passes the value on to the ExperimentHandler like TrialHandler does, so the
+csv of the ExperimentHandler does not change.
+
+"""
+
+import csv
+
+import numpy as np
+
+
+class TrialTable:
+
+    def __init__(self, conditions, name = '', extraInfo = None):
+        """conditions: dict column name -> sequence with one value per
+        trial, in the order of presentation."""
+        self.name = name
+        self.extraInfo = extraInfo
+        self.conditionNames = list(conditions)
+        self._columns = {} # name -> array of nTotal values
+        self._filled = {} # name -> bool array, which trials have a value
+        for column, values in conditions.items():
+            self._columns[column] = np.asarray(values)
+            if self._columns[column].dtype.kind in 'US':
+                self._columns[column] = self._columns[column].astype(object)
+            self._filled[column] = np.ones(len(self._columns[column]), dtype = bool)
+        lengths = {len(values) for values in self._columns.values()}
+        assert len(lengths) == 1, 'All conditions need one value per trial.'
+        self.nTotal = lengths.pop()
+        # the conditions as Python values for thisTrial
+        self._conditionLists = {column: self._columns[column].tolist()
+                                for column in self.conditionNames}
+
+        self.thisN = -1
+        self.thisTrialN = -1
+        self.thisRepN = 0
+        self.thisIndex = 0
+        self.thisTrial = None
+        self.finished = False
+        self._exp = None
+
+    # the loop (like TrialHandler)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.thisN += 1
+        self.thisTrialN = self.thisN
+        if self.thisN >= self.nTotal:
+            self.finished = True # thisTrial stays the last trial, like in TrialHandler
+            if self._exp is not None:
+                self._exp.loopEnded(self)
+            raise StopIteration
+        self.thisIndex = self.thisN
+        self.thisTrial = {column: values[self.thisN]
+                          for column, values in self._conditionLists.items()}
+        return self.thisTrial
+
+    next = __next__
+
+    def setExp(self, exp):
+        self._exp = exp
+
+    def getExp(self):
+        return self._exp
+
+    def addData(self, name, value):
+        """Store value in the column name for the current trial (the first
+        one before the loop has started, the last one after it has ended)
+        and pass it on to the ExperimentHandler."""
+        trial = min(max(self.thisN, 0), self.nTotal - 1)
+        column = self._columns.get(name)
+        if column is None:
+            column = self._newColumn(name, value)
+        elif not _fits(column, value):
+            column = self._promote(name, value)
+        column[trial] = value
+        self._filled[name][trial] = True
+        if self._exp is not None:
+            self._exp.addData(name, value)
+
+    def _newColumn(self, name, value):
+        if isinstance(value, (bool, np.bool_)):
+            column = np.zeros(self.nTotal, dtype = bool)
+        elif isinstance(value, (int, np.integer)):
+            column = np.zeros(self.nTotal, dtype = np.int64)
+        elif isinstance(value, (float, np.floating)):
+            column = np.full(self.nTotal, np.nan)
+        else:
+            column = np.full(self.nTotal, None, dtype = object)
+        self._columns[name] = column
+        self._filled[name] = np.zeros(self.nTotal, dtype = bool)
+        return column
+
+    def _promote(self, name, value):
+        """Replace the column name with one that can also hold value."""
+        column = self._columns[name]
+        if column.dtype.kind in 'biu' and isinstance(value, (float, np.floating)):
+            promoted = column.astype(np.float64)
+            promoted[~self._filled[name]] = np.nan
+        else:
+            promoted = column.astype(object)
+            promoted[~self._filled[name]] = None
+        self._columns[name] = promoted
+        return promoted
+
+    # the columns
+
+    @property
+    def columnNames(self):
+        return list(self._columns)
+
+    def __getitem__(self, name):
+        """The array of the column name (not a copy); trials without a value
+        hold 0, nan or None, see filled."""
+        return self._columns[name]
+
+    def filled(self, name):
+        """Which trials have a value in the column name."""
+        return self._filled[name]
+
+    @property
+    def trialList(self):
+        """The conditions as a list of dicts (like TrialHandler.trialList)."""
+        columns = [self._columns[column].tolist() for column in self.conditionNames]
+        return [dict(zip(self.conditionNames, values)) for values in zip(*columns)]
+
+    def summary(self, names = None, by = None):
+        """n, mean, sd, min and max of the numeric columns names (default:
+        all data columns) over the trials with a value; with by (the name
+        of a condition) one such dict per value of that column."""
+        if names is None:
+            names = [column for column in self._columns if column not in self.conditionNames]
+        names = [column for column in names if self._columns[column].dtype.kind in 'biuf']
+        if by is None:
+            return {column: _describe(self._columns[column][self._filled[column]])
+                    for column in names}
+        groups = self._columns[by]
+        return {group.item() if hasattr(group, 'item') else group:
+                    {column: _describe(self._columns[column][self._filled[column] & (groups == group)])
+                     for column in names}
+                for group in np.unique(groups)}
+
+    # export
+
+    def saveAsText(self, fn, delim = ',', names = None):
+        """Write the columns names (default: all) as a table with one row
+        per trial; trials without a value are empty. The columns are
+        formatted as a whole, not row by row; csv quotes the values which
+        contain delim."""
+        if names is None:
+            names = self.columnNames
+        formatted = []
+        for column in names:
+            values = self._columns[column]
+            if values.dtype.kind == 'b':
+                text = np.where(values, 'True', 'False')
+            elif values.dtype.kind == 'O':
+                text = np.array([str(value) for value in values], dtype = object)
+            else:
+                text = values.astype(str)
+            formatted.append(np.where(self._filled[column], text, ''))
+        with open(fn, 'w', newline = '', encoding = 'utf-8') as f:
+            writer = csv.writer(f, delimiter = delim, lineterminator = '\n')
+            writer.writerow(names)
+            writer.writerows(zip(*formatted) if formatted else [[]]*self.nTotal)
+
+    def saveAsNpz(self, fn):
+        """Write every column and its mask (<name>__filled) as arrays to an
+        .npz file; the arrays are written as they are."""
+        arrays = dict(self._columns)
+        arrays.update({column + '__filled': filled for column, filled in self._filled.items()})
+        np.savez(fn, **arrays)
+
+
+def loadNpz(fn):
+    """The columns of a file written by saveAsNpz as a dict of arrays, with
+    the trials without a value masked."""
+    with np.load(fn, allow_pickle = True) as arrays:
+        return {column: np.ma.masked_array(arrays[column], mask = ~arrays[column + '__filled'])
+                for column in arrays.files if not column.endswith('__filled')}
+
+
+def _fits(column, value):
+    kind = column.dtype.kind
+    if kind == 'O':
+        return True
+    if kind == 'f':
+        return isinstance(value, (int, float, np.integer, np.floating)) and \
+            not isinstance(value, (bool, np.bool_))
+    if kind == 'b':
+        return isinstance(value, (bool, np.bool_))
+    return isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_))
+
+
+def _describe(values):
+    if len(values) == 0:
+        return dict(n = 0)
+    values = values.astype(np.float64)
+    return dict(n = len(values), mean = float(values.mean()), sd = float(values.std()),
+                min = float(values.min()), max = float(values.max()))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Python 3.6
+
+Writes the data of every trial to disk while the experiment runs, so a crash
+loses at most the last few trials instead of the whole session, and the
+ExperimentHandler does not have to keep every trial in memory.
+
+The trials are appended to a stream of JSON lines (one object per trial,
+<datfilename>.trials.jsonl). The frame loop only hands the entry of the
+ExperimentHandler over to TrialWriter.addEntry; every bufferSize trials the
+rows are written, flushed and fsynced on a background thread. A line which
+was cut off by a crash is skipped when the stream is read.
+
+Whenever a trial has columns the ones before did not have, a line
+{"__columns__": {"loops": [...], "data": [...], "extraInfo": [...]}} is
+written in front of it: the names of the columns of the loops (their
+parameters and conditions), of the data and of the extraInfo of the
+ExperimentHandler, in the order thisExp.saveAsWideText puts them. So the
+wide-text CSV is rebuilt with the columns in that order from a complete or
+partial stream with
+
+    python trialwriter.py testdata/VP1_2020_Jun_01_1200.trials.jsonl
+
+"""
+
+import atexit
+import csv
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+
+import numpy as np
+
+# the key of the lines with the names of the columns
+COLUMNS_KEY = '__columns__'
+
+
+def _toJson(value):
+    """Convert the numpy types psychopy stores in the data to Python."""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return str(value)
+
+
+class TrialWriter:
+
+    def __init__(self, fn, expHandler = None, bufferSize = 10, keepEntries = True):
+        """Append the trials to the file fn. expHandler is the
+        ExperimentHandler whose entries writeLastEntry writes; if keepEntries
+        is False, they are removed from it once they have been handed over,
+        so memory stays bounded however long the session is."""
+        self.fn = fn
+        self.thisExp = expHandler
+        self.bufferSize = bufferSize
+        self.keepEntries = keepEntries
+        self.nEntries = 0 # n of entries handed over so far
+        self._buffer = []
+        self._columns = None # the columns of thisExp written so far
+
+        self._file = open(fn, 'a', encoding = 'utf-8')
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target = self._write, name = 'trial_writer', daemon = True)
+        self._thread.start()
+        # a crash which is an exception still gets the buffered trials to disk
+        atexit.register(self.close)
+
+    def addEntry(self, entry):
+        """Append the dict entry; it is written with the next bufferSize
+        trials. Does not touch the disk."""
+        self._buffer.append(dict(entry))
+        self.nEntries += 1
+        if len(self._buffer) >= self.bufferSize:
+            self._handOver()
+
+    def writeLastEntry(self):
+        """Append the entry thisExp.nextEntry() has just finished."""
+        columns = dict(loops = self.thisExp._getAllParamNames(),
+                       data = list(self.thisExp.dataNames),
+                       extraInfo = list(self.thisExp.extraInfo) if isinstance(
+                           self.thisExp.extraInfo, dict) else [])
+        if columns != self._columns:
+            self._columns = columns
+            self._buffer.append({COLUMNS_KEY: columns})
+        self.addEntry(self.thisExp.entries[-1])
+        if not self.keepEntries:
+            del self.thisExp.entries[:]
+
+    def flush(self):
+        """Write all trials so far and wait until they are on disk."""
+        self._handOver()
+        self._queue.join()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def _handOver(self):
+        if self._buffer:
+            self._queue.put(self._buffer)
+            self._buffer = []
+
+    def _write(self):
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                self._queue.task_done()
+                return
+            self._file.write(''.join(json.dumps(row, default = _toJson) + '\n' for row in rows))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._queue.task_done()
+
+
+def readTrials(fn):
+    """The trials of the stream fn as a list of dicts; a last line which was
+    cut off is skipped."""
+    return _readStream(fn)[0]
+
+
+def _readStream(fn):
+    """The trials of the stream fn and its last column line (None if it
+    has none)."""
+    trials, columns = [], None
+    with open(fn, encoding = 'utf-8') as f:
+        for lineN, line in enumerate(f):
+            try:
+                row = json.loads(line)
+            except ValueError:
+                logging.warning('Line {} of {} is incomplete and was skipped.'.format(lineN + 1, fn))
+                continue
+            if COLUMNS_KEY in row:
+                columns = row[COLUMNS_KEY]
+            else:
+                trials.append(row)
+    return trials, columns
+
+
+def saveAsWideText(fn, csvFn = None, delim = ','):
+    """Rebuild the wide-text CSV (one row per trial, one column per key)
+    from the stream fn; csvFn defaults to fn with .csv instead of
+    .trials.jsonl. Returns the n of trials."""
+    if csvFn is None:
+        csvFn = fn[:-len('.trials.jsonl')] if fn.endswith('.trials.jsonl') else os.path.splitext(fn)[0]
+        csvFn += '.csv'
+    trials, columnGroups = _readStream(fn)
+
+    # like thisExp.saveAsWideText: the loops, the data, then the extraInfo;
+    # columns which are not in the groups (or a stream without them) in the
+    # order they first occur
+    columns = {}
+    if columnGroups is not None:
+        for group in ['loops', 'data', 'extraInfo']:
+            columns.update(dict.fromkeys(columnGroups[group]))
+    for trial in trials:
+        columns.update(dict.fromkeys(trial))
+
+    with open(csvFn, 'w', newline = '', encoding = 'utf-8') as f:
+        writer = csv.DictWriter(f, list(columns), delimiter = delim)
+        writer.writeheader()
+        writer.writerows(trials)
+    return len(trials)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in [2, 3]:
+        sys.exit('usage: python trialwriter.py <stream.trials.jsonl> [<out.csv>]')
+    n = saveAsWideText(*sys.argv[1:])
+    print('{} trials written.'.format(n))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Psychpy v2020.1.3
+Python 3.6
+
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+from psychopy import logging
+
+
+class TriggerPort:
+
+    def __init__(self, port, triggerlen, maxPulses = 100000, spinTime = 0.002):
+        """Sends trigger pulses on port (a psychopy.parallel.ParallelPort or a
+        utils_parallel_simulated.ParallelPort) and sets the port back to 0
+        after triggerlen seconds.
+
+        The reset is done on a thread of its own, which sleeps until spinTime
+        seconds before the end of the pulse and then spins on
+        time.perf_counter, so the length of the pulse does not depend on the
+        frames of the window. The achieved width of every pulse is stored
+        (of the last maxPulses pulses, in a ring buffer), see
+        getPulseWidths, lastPulseWidth and pulseWidthStats.
+
+        While the port is open, the switch interval of the interpreter is
+        shortened to spinTime/4 (see sys.setswitchinterval); close sets it
+        back.
+        """
+        self.port       = port
+        self.triggerlen = triggerlen
+        self.spinTime   = spinTime
+
+        self.pulseWidths = np.zeros(maxPulses)
+        self.nPulses     = 0
+
+        self._tOn     = None # the time of the onset of the pulse which is on
+        self._pulseOn = threading.Event()
+        self._lock    = threading.Lock()
+        self._closed  = False
+
+        # the reset thread needs the GIL as soon as the pulse ends; with the
+        # default switch interval of 5 ms, the main thread could keep it too long
+        self._switchInterval = sys.getswitchinterval()
+        if self._switchInterval > spinTime/4:
+            sys.setswitchinterval(spinTime/4)
+
+        self._thread = threading.Thread(target = self._resetLoop, name = 'trigger_reset', daemon = True)
+        self._thread.start()
+
+    def pulse(self, signal):
+        """Set the port to signal; it is set back to 0 after triggerlen."""
+        with self._lock:
+            if self._tOn is not None:
+                logging.error('A trigger was sent before the last one was set back to 0.')
+            self.port.setData(signal)
+            self._tOn = time.perf_counter()
+            self._pulseOn.set()
+
+    def close(self):
+        """Stop the reset thread (a pulse which is still on is finished first)
+        and set the switch interval back."""
+        self._closed = True
+        self._pulseOn.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switchInterval)
+
+    def getPulseWidths(self):
+        """The achieved widths of the pulses so far (at most the last
+        maxPulses) in seconds, in the order they were sent."""
+        size = len(self.pulseWidths)
+        if self.nPulses <= size:
+            return self.pulseWidths[:self.nPulses]
+        return np.roll(self.pulseWidths, -(self.nPulses % size))
+
+    def lastPulseWidth(self):
+        """The achieved width of the last pulse which has been set back to 0
+        in seconds (nan if there is none)."""
+        if self.nPulses == 0:
+            return float('nan')
+        return float(self.pulseWidths[(self.nPulses - 1) % len(self.pulseWidths)])
+
+    def pulseWidthStats(self):
+        """Mean, standard deviation, min and max of the achieved pulse widths
+        and their deviation from triggerlen (all in ms)."""
+        widths = self.getPulseWidths()*1000
+        if len(widths) == 0:
+            return dict(n = 0)
+        return dict(n = len(widths),
+                    mean = float(widths.mean()),
+                    sd = float(widths.std()),
+                    min = float(widths.min()),
+                    max = float(widths.max()),
+                    maxDeviation = float(np.abs(widths - self.triggerlen*1000).max()))
+
+    def _resetLoop(self):
+        _raiseThreadPriority()
+        while True:
+            self._pulseOn.wait()
+            tOn = self._tOn
+            if tOn is not None:
+                tOff = tOn + self.triggerlen
+                tSleep = tOff - self.spinTime - time.perf_counter()
+                if tSleep > 0:
+                    time.sleep(tSleep)
+                while time.perf_counter() < tOff:
+                    pass
+            with self._lock:
+                if tOn is not None and self._tOn == tOn: # no new pulse in the meantime
+                    self.port.setData(0) # set the trigger back to 0
+                    width = time.perf_counter() - tOn
+                    self.pulseWidths[self.nPulses % len(self.pulseWidths)] = width
+                    self.nPulses += 1
+                    self._tOn = None
+                if self._tOn is None:
+                    self._pulseOn.clear()
+                    if self._closed:
+                        break
+
+
+def _raiseThreadPriority():
+    """Give the calling thread a higher priority (only on Windows, elsewhere
+    this needs root privileges)."""
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            THREAD_PRIORITY_TIME_CRITICAL = 15
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_TIME_CRITICAL)
+        except Exception:
+            logging.warn('Could not raise the priority of the trigger thread.')
@@ -12,14 +12,19 @@ Python 3.6
 
 from builtins import object
 
-from matplotlib import pyplot as plt
 import numpy as np
 
 from psychopy import logging, core
 
+import pinviewer
+
+# a recorded change of the port: the time (psychopy.core.getTime) and the new value
+recordDtype = np.dtype([('t', np.float64), ('value', np.uint8)])
+
 class ParallelPort(object):
     
-    def __init__(self, address, showplot = False):
+    def __init__(self, address, showplot = False, record = False, 
+                 recordSize = 2**20, recordFile = None):
         """This is a constructor to simulate a parallel port. Normally, this method would 
         set the memory address of your parallel port,
         to be used in subsequent calls to this object
@@ -29,33 +34,35 @@ class ParallelPort(object):
             LPT1 = 0x0378 or 0x03BC
             LPT2 = 0x0278 or 0x0378
             LPT3 = 0x0278
+        
+        If record is True, every change of the port is stored as (time, value)
+        in a preallocated ring buffer of recordSize entries (see getRecording 
+        and toEvents) instead of being logged. If recordFile is given, the 
+        buffer is a memory-mapped file, which can be read later with 
+        np.memmap(recordFile, dtype = recordDtype, mode = 'r').
         """
         logging.critical("A parallel port is being simulated. No actual triggers are sent!")
         
         self.status = None
         self.showplot = showplot
-        self.pinsstate_current  = np.zeros(  (8, 1),          dtype = np.uint8)
-        
-        ### track the parallel port status biosemi style in a plot
-        
+        self.value = 0 # the byte currently set on the data pins
+        
+        self.record = record
+        if self.record:
+            if recordFile is None:
+                self.recording = np.zeros(recordSize, dtype = recordDtype)
+            else:
+                self.recording = np.memmap(recordFile, dtype = recordDtype, 
+                                           mode = 'w+', shape = (recordSize,))
+            # views on the fields, so that setData only has to do two assignments
+            self._recordT = self.recording['t']
+            self._recordValue = self.recording['value']
+            self.nChanges = 0 # the n of changes recorded so far (including overwritten ones)
+        
+        # track the parallel port status biosemi style in a plot, which 
+        # runs in a process of its own
         if self.showplot:
-            
-            self.timeinterval   = 10 # in seconds
-            self.datapoints     = 600 # how many data points will be in the timeinterval
-            self.timeperpoint   = self.timeinterval/self.datapoints # how much time per point in interval
-            self.lastindex      = 0
-            
-            # np.uint8 is an unigned integer and allows unpacking into binary-valued output arrays => the state of my pins
-            self.pinsstate_interval = np.random.randint(0,2, (8, self.datapoints), dtype=np.uint8)
-                
-            self.fig = plt.figure()
-            self.ax  = self.fig.add_subplot(111)
-            
-            self.fig.canvas.draw()   # note that the first draw comes before setting data
-            
-            self.pinplot = self.ax.imshow(self.pinsstate_interval, aspect = 'auto', interpolation="None", cmap=plt.cm.gray)
-            
-            self.timer = core.Clock()
+            self.viewer = pinviewer.PinViewer()
     
     def setData(self, data):
         """Set the data to be presented on the parallel port (one ubyte).
@@ -75,10 +82,12 @@ class ParallelPort(object):
             parallel.setData( int("00000101", 2) )  # pins 2 and 4 high
         """
         
-        logging.data('parallel port set to %d' %data)
+        if self.record:
+            self._recordChange(data)
+        else:
+            logging.data('parallel port set to %d' %data)
         
-        self._updateState(data = data)
-        if self.showplot: self.updateFig()
+        self._updateState(data)
     
     def setPin(self, pinNumber, state):
         """Set a desired pin to be high(1) or low(0).
@@ -89,70 +98,63 @@ class ParallelPort(object):
             parallel.setPin(3, 0)  # sets pin 3 low
         """
         
-        logging.data('parallel port pin %d set to %d' %(pinNumber, state))
+        if state:
+            data = self.value | (1 << (pinNumber-2))
+        else:
+            data = self.value & ~(1 << (pinNumber-2))
         
-        self._updateState(pinNumber = pinNumber, state = state)
-        if self.showplot: self.updateFig()
+        if self.record:
+            self._recordChange(data)
+        else:
+            logging.data('parallel port pin %d set to %d' %(pinNumber, state))
+        
+        self._updateState(data)
     
     def readData(self):
         """Return the value currently set on the data pins (2-9)
         """
-        raise NotImplementedError("I haven't implemented this method for simulation yet.")
+        return self.value
     
     def readPin(self, pinNumber):
         """Determine whether a desired (input) pin is high(1) or low(0).
 
-        Pins 2-13 and 15 are currently read here
+        Pins 2-13 and 15 are currently read here (only the data pins 2-9 
+        can be high in the simulation)
         """
-        return self.pinsstate_current[pinNumber-2,0]
+        return (self.value >> (pinNumber-2)) & 1 if 2 <= pinNumber <= 9 else 0
     
-    def updateFig(self):
-        """
-        'Blitting' is a old technique in computer graphics. 
-        The general gist is to take an existing bit map (in our case a mostly rasterized figure) and 
-        then 'blit' one more artist on top. Thus, by managing a saved 'clean' bitmap, we can only 
-        re-draw the few artists that are changing at each frame and possibly save significant amounts of time. 
-        """
-        
-        self.pinplot.set_data(self.pinsstate_interval)
-        
-        self.ax.draw_artist(self.pinplot) # redraw just the points (not the axis ticks, labels, etc)
-        
-        self.fig.canvas.blit(self.ax.bbox) # fill in the axes rectangle
-        
-        plt.pause(0.000001)
-        #plt.pause calls canvas.draw(), as can be read here:
-        #http://bastibe.de/2013-05-30-speeding-up-matplotlib.html
-        #however with Qt4 (and TkAgg??) this is needed. It seems,using a different backend, 
-        #one can avoid plt.pause() and gain even more speed.
+    def getRecording(self):
+        """Return the recorded changes of the port in chronological order 
+        (only the last recordSize ones, if there were more)."""
+        assert self.record, 'The port has to be constructed with record = True.'
+        size = len(self.recording)
+        if self.nChanges <= size:
+            return np.array(self.recording[:self.nChanges])
+        return np.roll(self.recording, -(self.nChanges % size))
     
-    def _updateState(self, data = None, pinNumber = None, state = None):
-        
-        if self.showplot:
-            
-            t = self.timer.getTime()
-            if t >= 0:
-                self.timer.reset()
-                self.timer.add(self.timeinterval)
-                t = - self.timeinterval
-                
-                self.pinsstate_interval.fill(0)
-            
-            index           = (self.timeinterval+t)//self.timeperpoint # remember: t is negative!
-            updateinterval  = np.arange(self.lastindex, index, dtype=np.uint8)
-            lenupdint       = len(updateinterval)
-            
-            # self.pinsstate_current hasn't been updated yet! This is just writing to the array what has happened so far.
-            self.pinsstate_interval[:, updateinterval] = np.repeat(self.pinsstate_current, lenupdint, axis = 1) 
-            
-            self.lastindex = index
-        
-        if data is not None:
-            self.pinsstate_current = np.unpackbits( # unpackbits turns an integer into an array its base two representation
-                                                np.array([data], dtype=np.uint8)
-                                       ).reshape((8, 1)) # we have to reshape to insert the values in pinsstate_interval
-        elif pinNumber is not None:
-            self.pinsstate_current[pinNumber-2, 0] = state
-        
+    def toEvents(self, sfreq, tZero = None, first_samp = 0):
+        """Return the recording as an MNE-style events array: one row 
+        [sample, previous value, value] for every change of the port to a 
+        value other than 0, like mne.find_events on the Status channel.
         
-
+        tZero is the time of sample first_samp (default: the first recorded 
+        change).
+        """
+        recording = self.getRecording()
+        if tZero is None:
+            tZero = recording['t'][0] if len(recording) else 0.
+        values = recording['value'].astype(np.int64)
+        previous = np.concatenate(([0], values[:-1]))
+        onsets = (values != 0) & (values != previous)
+        samples = np.rint((recording['t'][onsets] - tZero)*sfreq).astype(np.int64) + first_samp
+        return np.column_stack((samples, previous[onsets], values[onsets]))
+    
+    def _recordChange(self, data):
+        i = self.nChanges % len(self._recordT)
+        self._recordT[i] = core.getTime()
+        self._recordValue[i] = data
+        self.nChanges += 1
+    
+    def _updateState(self, data):
+        self.value = data
+        if self.showplot: self.viewer.send(data)
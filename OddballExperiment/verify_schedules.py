@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+@author: LKirst
+
+Python 3.6
+
+Generate many sequences with more than two stimulus classes (see
+schedule.classSequence) in parallel and check every one of them with
+schedule.checkClassSequence, e.g.
+
+    python verify_schedules.py --nsequences 100000 --ntrials 300
+    python verify_schedules.py --classes myparadigm.json
+
+The classes are read from a json file with the list of dicts which is passed
+to Oddball as stimClasses; without --classes an example paradigm with a
+deviant and a novel stimulus is checked. Sequence i is generated with the
+seed firstseed+i, i.e. like Oddball with that seed. Reports the sequences
+which could not be generated or violate a constraint, the proportions of the
+classes and the time per sequence.
+
+"""
+
+import argparse
+import functools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import schedule
+
+exampleClasses = [
+    dict(name = 'standard', maxRun = 12, trigger = 2, ori = 0.0),
+    dict(name = 'deviant', p = .1, maxRun = 1, minSpacing = 2, trigger = 1, ori = 45.0),
+    dict(name = 'novel', p = .05, maxRun = 1, minSpacing = 5, trigger = 3, ori = 22.5)
+    ]
+
+
+def verifySeeds(seeds, ntrials, classes, nLeadingStandards):
+    """Generate and check the sequences of seeds. Returns the n of trials
+    of every class and a list of (seed, problem) for the sequences which
+    could not be generated or violate a constraint."""
+    counts = np.zeros(len(classes), dtype=np.int64)
+    problems = []
+    for seed in seeds:
+        np.random.seed(seed = seed)
+        try:
+            sequence = schedule.classSequence(ntrials, classes, nLeadingStandards)
+        except AssertionError as e:
+            problems.append((seed, 'not generated: {}'.format(e)))
+            continue
+        counts += np.bincount(sequence, minlength=len(classes))[:len(classes)]
+        for violation in schedule.checkClassSequence(sequence, classes, nLeadingStandards):
+            problems.append((seed, violation))
+    return counts, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__,
+        formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', help = 'a json file with the classes (default: an example)')
+    parser.add_argument('--nsequences', type = int, default = 10000)
+    parser.add_argument('--ntrials', type = int, default = 300)
+    parser.add_argument('--nLeadingStandards', type = int, default = 1)
+    parser.add_argument('--firstseed', type = int, default = 1)
+    parser.add_argument('--workers', type = int, default = None, help = 'default: n of CPUs')
+    args = parser.parse_args()
+
+    if args.classes is None:
+        classes = exampleClasses
+    else:
+        with open(args.classes) as f:
+            classes = json.load(f)
+
+    seeds = range(args.firstseed, args.firstseed + args.nsequences)
+    chunks = [seeds[i:i+1000] for i in range(0, len(seeds), 1000)]
+
+    t0 = time.perf_counter()
+    counts = np.zeros(len(classes), dtype=np.int64)
+    problems = []
+    with ProcessPoolExecutor(max_workers = args.workers) as executor:
+        for chunkCounts, chunkProblems in executor.map(
+                functools.partial(verifySeeds, ntrials = args.ntrials, classes = classes,
+                                  nLeadingStandards = args.nLeadingStandards), chunks):
+            counts += chunkCounts
+            problems.extend(chunkProblems)
+    tTotal = time.perf_counter() - t0
+
+    for seed, problem in problems[:20]:
+        print('seed {}: {}'.format(seed, problem))
+    print('{} of {} sequences of {} trials have problems ({:.1f} µs per sequence '
+          'incl. checking).'.format(len({seed for seed, _ in problems}), args.nsequences,
+                                    args.ntrials, tTotal/args.nsequences*1e6))
+    proportions = counts/max(counts.sum(), 1)
+    print('proportions: ' + ', '.join('{} {:.4f}'.format(stimClass['name'], p)
+                                      for stimClass, p in zip(classes, proportions)))
+
+
+if __name__ == '__main__':
+    main()